@@ -1,13 +1,19 @@
 import os
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional,List,Dict,Any
+from typing import Optional,List,Dict,Any,Callable,Iterable
+from requests.adapters import HTTPAdapter
 from src.common.models import VideoConfig, DownloadConfig 
 from src.common.param_helps.client_help import inputHelp
 from src.common.logger import get_logger
 from src.service.config_manager import UnifiedConfigManager 
 
+DEFAULT_TIMEOUT = (5, 30)   # (连接, 读取)超时(秒)
+DEFAULT_BULK_WORKERS = 16   # 批量操作的并发请求数,同时也是连接池大小
+QUERY_CHUNK_SIZE = 1000     # 批量查询/操作时每个请求的任务数
+
 class ClientAPI:
     def __init__(self,config_path: str = None,**overrides):
         self.logger = get_logger("ClientApi")
@@ -24,6 +30,9 @@ class ClientAPI:
             - audio_quality: 音频质量 (int)
             - codec: 编解码器 (str)
             - audio_only: 仅音频模式 (bool)
+            - fallback: 降级阶梯 (str)
+            - max_bitrate: 码率预算 (str)
+            - max_bytes: 体积预算 (str)
         """
         _template = {
             "server_url": "http://127.0.0.1:5000",
@@ -32,6 +41,9 @@ class ClientAPI:
             "codec": "H264",
             "threads": "4",
             "video_quality": "360P",
+            "fallback": "lower,codec,higher",
+            "max_bitrate": None,
+            "max_bytes": None,
             'log_level': 'INFO',
             'cache_dir': "cache",   
             'download_dir': "download",
@@ -43,15 +55,42 @@ class ClientAPI:
         self.config = self.config_manager.apply_overrides(overrides)
         #print(self.config)
         self.base_url = self.config['server_url']
+        # 所有请求复用同一个连接池(keep-alive),批量操作的并发请求各占一个连接
+        self.timeout = DEFAULT_TIMEOUT
+        self.bulk_workers = DEFAULT_BULK_WORKERS
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.bulk_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self) -> None:
+        """关闭连接池"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _bulk(self, func: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """用有界线程池并发执行func,结果与items顺序一致"""
+        items = list(items)
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.bulk_workers, len(items))) as pool:
+            return list(pool.map(func, items))
 
     def create_download_task(
         self,
         input_url: str,
         video_config: VideoConfig,
-        download_config: DownloadConfig
+        download_config: DownloadConfig,
+        pages: Optional[str] = None
     ) -> Optional[str]:
         """
         创建下载任务
+        pages: 分P选择(all / 1-5,8),为空时只下载第一P
         返回: 任务ID或None
         """
         try:
@@ -59,13 +98,15 @@ class ClientAPI:
             
             server_url = self.base_url
             
-            response = requests.post(
+            response = self.session.post(
                 f"{server_url}/download",
                 json={
                     "input": input_url,
                     "video_config": vars(video_config),
-                    "download_config": vars(download_config)
-                }
+                    "download_config": vars(download_config),
+                    "pages": pages
+                },
+                timeout=self.timeout
             )
             response.raise_for_status()
             
@@ -80,21 +121,137 @@ class ClientAPI:
             self.logger.error(f"下载异常: {str(e)}")
             return None
 
-    def get_task_list(self) -> List[Dict]:
+    def create_download_tasks(
+        self,
+        items: List[Any],
+        video_config: VideoConfig,
+        download_config: DownloadConfig,
+        pages: Optional[str] = None
+    ) -> Optional[List[Optional[str]]]:
         """
-        获取任务列表(原list_tasks)
-        返回: 任务字典列表
+        批量创建下载任务
+        items: 输入字符串,或带有input及覆盖项(pages/priority/video_config/download_config)的字典
+        返回: 与items一一对应的任务ID(被拒绝的条目为None),请求失败时返回None
         """
         try:
-            response = requests.get(f"{self.base_url}/tasks")
+            response = self.session.post(
+                f"{self.base_url}/download/batch",
+                json={
+                    "items": items,
+                    "video_config": vars(video_config),
+                    "download_config": vars(download_config),
+                    "pages": pages
+                },
+                timeout=self.timeout
+            )
             response.raise_for_status()
             result = response.json()
+            task_ids = []
+            for item, item_result in zip(items, result["results"]):
+                if "error" in item_result:
+                    self.logger.error(f"任务{item}添加失败: {item_result['error']}")
+                task_ids.append(item_result.get("task_id"))
+            return task_ids
+        except Exception as e:
+            self.logger.error(f"批量下载异常: {str(e)}")
+            return None
 
+    def create_expansion_task(
+        self,
+        source_type: str,
+        source_id: str,
+        video_config: VideoConfig,
+        download_config: DownloadConfig,
+        mid: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        创建批量来源展开任务(收藏夹/合集/UP主投稿)
+        返回: 展开任务ID或None
+        """
+        try:
+            self.logger.info(f"开始展开: {source_type}:{source_id}")
+            response = self.session.post(
+                f"{self.base_url}/expand",
+                json={
+                    "source_type": source_type,
+                    "source_id": source_id,
+                    "mid": mid,
+                    "video_config": vars(video_config),
+                    "download_config": vars(download_config)
+                },
+                timeout=self.timeout
+            )
+            result = response.json()
             if result["status"] == "success":
-                return result.get("tasks", [])
-            else:
-                self.logger.error("获取任务列表失败")
-                return []
+                return result["job_id"]
+            self.logger.error(f"展开失败: {result.get('message')}")
+            return None
+        except Exception as e:
+            self.logger.error(f"展开异常: {str(e)}")
+            return None
+
+    def create_subscription(
+        self,
+        source_type: str,
+        source_id: str,
+        video_config: VideoConfig,
+        download_config: DownloadConfig,
+        mid: Optional[str] = None,
+        interval: int = 3600,
+        backfill: bool = False
+    ) -> Optional[str]:
+        """
+        订阅来源(收藏夹/合集/UP主投稿),服务器定期同步新增的视频
+        返回: 订阅ID或None
+        """
+        try:
+            self.logger.info(f"开始订阅: {source_type}:{source_id}")
+            response = self.session.post(
+                f"{self.base_url}/subscriptions",
+                json={
+                    "source_type": source_type,
+                    "source_id": source_id,
+                    "mid": mid,
+                    "interval": interval,
+                    "backfill": backfill,
+                    "video_config": vars(video_config),
+                    "download_config": vars(download_config)
+                },
+                timeout=self.timeout
+            )
+            result = response.json()
+            if result["status"] == "success":
+                return result["sub_id"]
+            self.logger.error(f"订阅失败: {result.get('message')}")
+            return None
+        except Exception as e:
+            self.logger.error(f"订阅异常: {str(e)}")
+            return None
+
+    def get_task_list(self, **filters) -> List[Dict]:
+        """
+        获取任务列表(原list_tasks)
+        filters: 服务器端过滤参数(status/bvid/created_after/created_before/fields)
+        返回: 任务字典列表
+        """
+        try:
+            tasks, cursor = [], None
+            while True:
+                # 服务器分页返回,按next_cursor取完全部任务
+                params = {"limit": 1000, **filters}
+                if cursor:
+                    params["cursor"] = cursor
+                response = self.session.get(f"{self.base_url}/tasks", params=params, timeout=self.timeout)
+                response.raise_for_status()
+                result = response.json()
+
+                if result["status"] != "success":
+                    self.logger.error("获取任务列表失败")
+                    return tasks
+                tasks.extend(result.get("tasks", []))
+                cursor = result.get("next_cursor")
+                if not cursor:
+                    return tasks
                 
         except Exception as e:
             self.logger.error(f"获取任务列表异常: {str(e)}")
@@ -103,7 +260,7 @@ class ClientAPI:
     def get_task_status(self, task_id: str) -> Optional[Dict]:
         """获取单个任务状态"""
         try:
-            response = requests.get(f"{self.base_url}/tasks/{task_id}")
+            response = self.session.get(f"{self.base_url}/tasks/{task_id}", timeout=self.timeout)
             response.raise_for_status()
             return response.json().get("task")
         except Exception as e:
@@ -113,13 +270,59 @@ class ClientAPI:
     def manage_task(self, task_id: str, action: str) -> bool:
         """通用任务管理方法"""
         try:
-            response = requests.post(
-                f"{self.base_url}/tasks/{task_id}/{action}"
+            response = self.session.post(
+                f"{self.base_url}/tasks/{task_id}/{action}",
+                timeout=self.timeout
             )
             return response.json().get("status") == "success"
         except Exception as e:
             self.logger.error(f"操作{action}失败: {str(e)}")
             return False
+
+    def get_task_statuses(self, task_ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+        """
+        批量获取任务状态: 按QUERY_CHUNK_SIZE分块通过POST /tasks/query并发查询
+        返回: 任务ID到任务字典的映射,不存在或查询失败的任务为None
+        """
+        def query(chunk: List[str]) -> Dict[str, Optional[Dict]]:
+            payload = {"task_ids": chunk}
+            if fields:
+                payload["fields"] = list(dict.fromkeys(["task_id", *fields]))
+            try:
+                response = self.session.post(f"{self.base_url}/tasks/query", json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                return {task["task_id"]: task for task in response.json().get("tasks", [])}
+            except Exception as e:
+                self.logger.error(f"批量获取任务状态失败: {str(e)}")
+                return {}
+
+        tasks: Dict[str, Optional[Dict]] = {}
+        chunks = [task_ids[i:i + QUERY_CHUNK_SIZE] for i in range(0, len(task_ids), QUERY_CHUNK_SIZE)]
+        for result in self._bulk(query, chunks):
+            tasks.update(result)
+        return {task_id: tasks.get(task_id) for task_id in task_ids}
+
+    def manage_tasks(self, task_ids: List[str], action: str) -> Dict[str, bool]:
+        """
+        批量暂停/恢复/取消: 按QUERY_CHUNK_SIZE分块通过POST /tasks/batch并发提交
+        返回: 各任务是否操作成功
+        """
+        def manage(chunk: List[str]) -> Dict[str, bool]:
+            try:
+                response = self.session.post(f"{self.base_url}/tasks/batch",
+                                             json={"action": action, "task_ids": chunk}, timeout=self.timeout)
+                response.raise_for_status()
+                return response.json().get("results", {})
+            except Exception as e:
+                self.logger.error(f"批量操作{action}失败: {str(e)}")
+                return {}
+
+        results: Dict[str, bool] = {}
+        chunks = [task_ids[i:i + QUERY_CHUNK_SIZE] for i in range(0, len(task_ids), QUERY_CHUNK_SIZE)]
+        for result in self._bulk(manage, chunks):
+            results.update(result)
+        return {task_id: bool(results.get(task_id)) for task_id in task_ids}
+
     def pause_task(self, task_id: str) -> bool:
         return self.manage_task(task_id, "pause")
 
@@ -128,7 +331,39 @@ class ClientAPI:
 
     def cancel_task(self, task_id: str) -> bool:
         return self.manage_task(task_id, "cancel")
+
+    def pause_tasks(self, task_ids: List[str]) -> Dict[str, bool]:
+        return self.manage_tasks(task_ids, "pause")
+
+    def resume_tasks(self, task_ids: List[str]) -> Dict[str, bool]:
+        return self.manage_tasks(task_ids, "resume")
+
+    def cancel_tasks(self, task_ids: List[str]) -> Dict[str, bool]:
+        return self.manage_tasks(task_ids, "cancel")
     
+    def get_server_config(self) -> Optional[Dict]:
+        """获取服务器运行时可调整的配置"""
+        try:
+            response = self.session.get(f"{self.base_url}/config", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json().get("config")
+        except Exception as e:
+            self.logger.error(f"获取服务器配置失败: {str(e)}")
+            return None
+
+    def update_server_config(self, changes: Dict[str, Any]) -> Optional[Dict]:
+        """调整服务器配置(立即生效),返回调整后的配置,失败时返回None"""
+        try:
+            response = self.session.patch(f"{self.base_url}/config", json=changes, timeout=self.timeout)
+            if response.status_code == 400:
+                self.logger.error(f"调整服务器配置失败: {response.json().get('message')}")
+                return None
+            response.raise_for_status()
+            return response.json().get("config")
+        except Exception as e:
+            self.logger.error(f"调整服务器配置失败: {str(e)}")
+            return None
+
     @staticmethod
     def _parse_log_level(level_str: str) -> int:
         level_map = {
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+from src.common.utils import extract_bvid
+from src.common.logger import get_logger
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_SUBMIT_RETRIES = 3
+DEFAULT_SUBMIT_CONCURRENCY = 4  # 同时提交中的批次数
+JOURNAL_SUFFIX = '.import.json'
+_HEAD_BYTES = 4096  # 用文件开头的内容判断日志是否属于同一个文件
+
+@dataclass
+class ImportResult:
+    """批量导入的统计"""
+    submitted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    rejected: int = 0       # 服务器拒绝的条目
+    resumed_from: int = 0   # 本次从文件的哪个字节偏移继续
+    completed: bool = False
+
+def iter_links(file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    逐行读取链接文件(按缓冲块读取,不把整个文件载入内存),跳过空行与注释
+    Yields:
+        (该行结束处的字节偏移, 去除空白后的行)
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        offset = start
+        for raw in file:
+            offset += len(raw)
+            if end is not None and offset > end:
+                return
+            line = raw.decode('utf-8', errors='replace').strip()
+            if line and not line.startswith('#'):
+                yield offset, line
+
+class BulkImporter:
+    """
+    流式批量导入
+    逐行提取BV号并去重,按批提交,最多concurrency个批次同时提交;
+    按文件顺序确认提交结果并把连续提交到的文件偏移写入日志文件,
+    中断后重新运行会从上次提交到的位置继续(偏移之后已提交的批次记录在日志的done中,不会重复提交)
+    """
+
+    def __init__(self, submit: Callable[[List[str]], List[Optional[str]]],
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 retries: int = DEFAULT_SUBMIT_RETRIES,
+                 concurrency: int = DEFAULT_SUBMIT_CONCURRENCY):
+        """
+        Args:
+            submit: 提交一批BV号,按顺序返回任务ID(被服务器拒绝的条目为None);
+                    连接出错时返回已提交部分的结果,未返回的条目会重试。会在多个线程中同时调用
+        """
+        self.logger = get_logger(__name__)
+        self.submit = submit
+        self.batch_size = batch_size
+        self.retries = retries
+        self.concurrency = max(1, concurrency)
+
+    @staticmethod
+    def journal_path(file_path: str) -> str:
+        return file_path + JOURNAL_SUFFIX
+
+    @staticmethod
+    def _file_head(file_path: str) -> str:
+        with open(file_path, 'rb') as file:
+            return hashlib.sha1(file.read(_HEAD_BYTES)).hexdigest()
+
+    def _load_cursor(self, file_path: str) -> Tuple[int, List[List[int]]]:
+        """读取日志中的偏移与偏移之后已提交的区间,文件已被替换或截断时从头开始"""
+        try:
+            with open(self.journal_path(file_path), 'r', encoding='utf-8') as file:
+                journal = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return 0, []
+        if journal.get('head') != self._file_head(file_path) or journal.get('offset', 0) > os.path.getsize(file_path):
+            self.logger.warning("链接文件已变化,忽略导入日志,从头开始导入")
+            return 0, []
+        return int(journal['offset']), journal.get('done', [])
+
+    def _save_cursor(self, file_path: str, offset: int, submitted: int, done: List[List[int]] = ()) -> None:
+        journal_path = self.journal_path(file_path)
+        temp_path = journal_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({"offset": offset, "submitted": submitted, "head": self._file_head(file_path),
+                       "done": [list(span) for span in done if span[1] > offset]}, file)
+        os.replace(temp_path, journal_path)
+
+    def _submit_batch(self, bvids: List[str]) -> Tuple[List[Optional[str]], bool]:
+        """
+        提交一批(在线程池中执行),连接出错时重试未提交的部分
+        Returns:
+            (已提交条目的任务ID, 是否全部提交)
+        """
+        task_ids: List[Optional[str]] = []
+        attempt = 0
+        while len(task_ids) < len(bvids):
+            results = self.submit(bvids[len(task_ids):]) or []
+            task_ids.extend(results)
+            if len(task_ids) >= len(bvids):
+                break
+            if results:
+                attempt = 0
+            elif attempt >= self.retries:
+                return task_ids, False
+            else:
+                delay = 2 ** attempt
+                attempt += 1
+                self.logger.warning(f"提交失败,{delay}秒后重试")
+                time.sleep(delay)
+        return task_ids, True
+
+    def run(self, file_path: str) -> ImportResult:
+        """导入链接文件,提交失败时保存进度并返回"""
+        start, done = self._load_cursor(file_path)
+        result = ImportResult(resumed_from=start)
+        seen = set()
+        if start:
+            # 重建已提交部分的去重集合,只在本地扫描不会重复提交
+            self.logger.info(f"从导入日志恢复,跳过前{start}字节")
+            for _, line in iter_links(file_path, end=start):
+                bvid = extract_bvid(line)
+                if bvid:
+                    seen.add(bvid)
+
+        def submitted_before(offset: int) -> bool:
+            # 上次中断时已提交的后续批次(first, last]
+            return any(first < offset <= last for first, last in done)
+
+        committed = start   # 按文件顺序连续确认提交到的偏移
+        failed = False
+        inflight: "deque[Tuple[int, List[Tuple[int, str]], Future]]" = deque()
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+
+        def settle() -> None:
+            """按提交顺序确认最早的一批"""
+            nonlocal committed, failed
+            first, batch, future = inflight.popleft()
+            task_ids, complete = future.result()
+            for (offset, bvid), task_id in zip(batch, task_ids):
+                if task_id is None:
+                    result.rejected += 1
+                    self.logger.warning(f"服务器拒绝了{bvid}")
+                else:
+                    result.submitted += 1
+            if failed:
+                # 之前的批次提交失败,本批已提交的部分记录下来,重新运行时跳过
+                if task_ids:
+                    done.append([first, batch[len(task_ids) - 1][0]])
+                return
+            if task_ids:
+                committed = batch[len(task_ids) - 1][0]
+            if complete:
+                self._save_cursor(file_path, committed, result.submitted, done)
+                self.logger.info(f"已提交{result.submitted}个任务")
+            else:
+                failed = True
+
+        batch: List[Tuple[int, str]] = []
+        boundary = start  # 当前批次第一行之前的偏移
+
+        def dispatch() -> None:
+            nonlocal batch, boundary
+            if batch:
+                inflight.append((boundary, batch, pool.submit(self._submit_batch, [b for _, b in batch])))
+                boundary, batch = batch[-1][0], []
+            while inflight and (len(inflight) >= self.concurrency or inflight[0][2].done()):
+                settle()
+
+        try:
+            for offset, line in iter_links(file_path, start=start):
+                bvid = extract_bvid(line)
+                if bvid is None:
+                    result.invalid += 1
+                    self.logger.warning(f"无法识别的链接: {line}")
+                    continue
+                if bvid in seen:
+                    result.duplicates += 1
+                    continue
+                seen.add(bvid)
+                if submitted_before(offset):
+                    continue
+                batch.append((offset, bvid))
+                if len(batch) >= self.batch_size:
+                    dispatch()
+                    if failed:
+                        break
+            if not failed:
+                dispatch()
+            while inflight:
+                settle()
+        finally:
+            pool.shutdown(wait=True)
+
+        if failed:
+            self._save_cursor(file_path, committed, result.submitted, done)
+            self.logger.error("提交失败,已保存导入进度,重新运行即可继续")
+            return result
+
+        result.completed = True
+        try:
+            os.remove(self.journal_path(file_path))
+        except FileNotFoundError:
+            pass
+        return result
@@ -1,4 +1,3 @@
-import logging
 import click
 import os
 from rich.console import Console,Group
@@ -12,14 +11,21 @@ from pathlib import Path
 from src.common.param_helps.client_help import *
 from src.common.param_helps.shared_help import *
 from src.common.utils import check_ffmpeg,extract_bvid,find_project_root
-from src.common.models import VideoConfig, DownloadConfig
+# 只有个别命令使用的模块(rich.live/rich.progress、watch)在命令内导入,保持list/status等命令启动迅速
+from src.common.models import VideoConfig, DownloadConfig, TaskStatus
 from src.common.logger import configure_logging,get_logger
 from client.api import ClientAPI 
+from src.client.bulk_import import BulkImporter, DEFAULT_BATCH_SIZE, iter_links
+from src.client.fetch import RangeFetcher, FileChangedError, DEFAULT_CONNECTIONS
 
 console = Console()
-PROJECT_ROOT = find_project_root()
-DEFAULT_LOG_DIR = PROJECT_ROOT / "logs" / "client"
-DEFAULT_CONFIG_PATH = PROJECT_ROOT / "configs" / "client" / "default_config.yaml"
+
+def _default_log_dir() -> Path:
+    return find_project_root() / "logs" / "client"
+
+def _default_config_path() -> Path:
+    return find_project_root() / "configs" / "client" / "default_config.yaml"
+
 @click.group()
 def cli():
     """B站视频下载工具"""
@@ -34,13 +40,27 @@ def cli():
 @click.option('--cache-dir', default=None, help=cacheDirHelp)
 @click.option('--log-dir',default=None,help=logDirHelp)
 @click.option('--audio-only',default=None,help=audioOnlyHelp)
-@click.option('--server-url', default=None, help=f'服务器地址')
+@click.option('--server-url', default=None, help='服务器地址')
 @click.option('--threads',default=None,help=threadsHelp)
-def download(config, input, video_quality, audio_quality, codec, download_dir, cache_dir, audio_only, server_url, threads, log_level, log_dir):   
+@click.option('--pages',default=None,help=pagesHelp)
+@click.option('--fallback',default=None,help=fallbackHelp)
+@click.option('--max-bitrate',default=None,help=maxBitrateHelp)
+@click.option('--max-bytes',default=None,help=maxBytesHelp)
+@click.option('--favorite',default=None,help=favoriteHelp)
+@click.option('--season',default=None,help=seasonHelp)
+@click.option('--uploader',default=None,help=uploaderHelp)
+@click.option('--mid',default=None,help=midHelp)
+@click.option('--subscribe',is_flag=True,default=False,help=subscribeHelp)
+@click.option('--interval',default=3600,type=int,help=intervalHelp)
+@click.option('--backfill',is_flag=True,default=False,help=backfillHelp)
+@click.option('--batch-size',default=DEFAULT_BATCH_SIZE,type=int,help=batchSizeHelp)
+@click.option('--progressive',is_flag=True,default=False,help=progressiveHelp)
+@click.option('--local',is_flag=True,default=False,help=localHelp)
+def download(config, input, video_quality, audio_quality, codec, download_dir, cache_dir, audio_only, server_url, threads, log_level, log_dir, pages, fallback, max_bitrate, max_bytes, favorite, season, uploader, mid, subscribe, interval, backfill, batch_size, progressive, local):   
     """下载视频"""
     # 初始化基础日志配置
     configure_logging(
-        log_path=DEFAULT_LOG_DIR / "bdown.log",
+        log_path=_default_log_dir() / "bdown.log",
         log_level=log_level,
         rotate_size=10
     )
@@ -50,7 +70,7 @@ def download(config, input, video_quality, audio_quality, codec, download_dir, c
     check_ffmpeg()
 
     api = ClientAPI(
-        config_path=config or DEFAULT_CONFIG_PATH,
+        config_path=config or _default_config_path(),
         server_url=server_url,
         threads=threads,
         download_dir=download_dir,
@@ -59,7 +79,10 @@ def download(config, input, video_quality, audio_quality, codec, download_dir, c
         video_quality=video_quality,
         audio_quality=audio_quality,
         codec=codec,
-        audio_only=audio_only
+        audio_only=audio_only,
+        fallback=fallback,
+        max_bitrate=max_bitrate,
+        max_bytes=max_bytes
     )
 
     # 使用api.config获取最终配置
@@ -67,14 +90,18 @@ def download(config, input, video_quality, audio_quality, codec, download_dir, c
         download_dir=api.config['download_dir'],
         cache_dir=api.config['cache_dir'],
         threads=api.config['threads'],
-        server_url=api.config['server_url']  
+        server_url=api.config['server_url'],
+        progressive=progressive
     )
 
     video_config = VideoConfig(
         video_quality=api.config['video_quality'],
         audio_quality=api.config['audio_quality'],
         codec=api.config['codec'],
-        audio_only=api.config['audio_only']
+        audio_only=api.config['audio_only'],
+        fallback=api.config['fallback'],
+        max_bitrate=api.config['max_bitrate'],
+        max_bytes=api.config['max_bytes']
     )
 
     #假如配置文件中有设置日志路径，则保存到指定的路径
@@ -86,53 +113,144 @@ def download(config, input, video_quality, audio_quality, codec, download_dir, c
     )
     
 
-    download_url_list = []
+    #批量来源由服务器分页展开
+    sources = [(source_type, source_id) for source_type, source_id in
+               (('favorite', favorite), ('season', season), ('uploader', uploader)) if source_id]
+    if local:
+        if subscribe:
+            logger.error("--local 不支持订阅，订阅需要服务器定时同步")
+            return
+        _run_local(input, sources, video_config, download_config, pages, mid, logger)
+        return
+    if sources and subscribe:
+        for source_type, source_id in sources:
+            sub_id = api.create_subscription(source_type, source_id, video_config, download_config,
+                                             mid=mid, interval=interval, backfill=backfill)
+            if sub_id:
+                logger.info(f"订阅已添加: {source_type}:{source_id} 订阅ID: {sub_id}")
+            else:
+                logger.error(f"订阅添加失败: {source_type}:{source_id}")
+        logger.info(f"服务器每{interval}秒同步一次，新视频会自动加入下载队列")
+        return
+    if sources:
+        for source_type, source_id in sources:
+            job_id = api.create_expansion_task(source_type, source_id, video_config, download_config, mid=mid)
+            if job_id:
+                logger.info(f"展开任务已添加: {source_type}:{source_id} 任务ID: {job_id}")
+            else:
+                logger.error(f"展开任务添加失败: {source_type}:{source_id}")
+        logger.info("视频会在服务器获取到每一页后陆续加入下载队列，使用 'poetry run btool-download list' 查看")
+        return
+
     if os.path.isfile(input):
+        logger.info('批量下载模式！')
+        logger.info(f"读取文件:{input}!")
+
+        def submit(bvids):
+            return api.create_download_tasks(bvids, video_config, download_config, pages=pages)
+
         try:
-            logger.info(f'批量下载模式！')
-            logger.info(f"读取文件:{input}!")
-            with open(input, 'r', encoding='utf-8') as file:
-                for line in file:
-                    line = line.strip()
-                    if line and (not line.startswith('#')):
-                        # 排除注释和空行
-                        logger.debug(f"已经添加链接{line}到下载列表中")
-                        download_url_list.append(line)
+            result = BulkImporter(submit, batch_size=batch_size).run(input)
         except Exception as e:
             logger.error(f"读取文件失败: {str(e)}")
             return
-    else:
-        download_url_list.append(input) 
+        logger.info(f"已添加{result.submitted}个任务，跳过重复{result.duplicates}个，无法识别{result.invalid}个，被拒绝{result.rejected}个")
+        if not result.completed:
+            logger.warning(f"导入未完成，重新运行相同命令会从中断处继续(进度保存在{BulkImporter.journal_path(input)})")
+        logger.info("使用 'poetry run btool-download list' 查看任务")
+        return
 
-    success_count = 0
-    download_url_count = len(download_url_list)
-    logging.debug(f"共有{download_url_count}个链接需要下载")
-    
     try:
-        for link in download_url_list:
-            logger.debug(f"从{link}中提取BV号")
-            bvid = extract_bvid(link)
-            logger.info(f"BV号:{bvid}")
-            if bvid == None:
-                logger.error("请提供下载链接/下载链接格式不正确")
-                logger.info(inputHelp)
-                continue
-            task_id = api.create_download_task(
-                                    input_url=bvid,
-                                    video_config=video_config,
-                                    download_config=download_config
-                                )
-            if task_id:
-                if download_url_count >= 1:
-                    success_count += 1
-                    logger.info(f"任务已添加[{success_count}/{download_url_count}]任务ID: {task_id}")
-                else:
-                    logger.info(f"任务添加失败")
+        logger.debug(f"从{input}中提取BV号")
+        bvid = extract_bvid(input)
+        logger.info(f"BV号:{bvid}")
+        if bvid == None:
+            logger.error("请提供下载链接/下载链接格式不正确")
+            logger.info(inputHelp)
+            return
+        task_id = api.create_download_task(
+                                input_url=bvid,
+                                video_config=video_config,
+                                download_config=download_config,
+                                pages=pages
+                            )
+        if task_id:
+            logger.info(f"任务已添加 任务ID: {task_id}")
+            if progressive:
+                logger.info(f"开始下载后可边下边播: {api.base_url}/tasks/{task_id}/stream/video "
+                            f"(音频: {api.base_url}/tasks/{task_id}/stream/audio)")
+        else:
+            logger.info("任务添加失败")
         logger.info("使用 'poetry run btool-download status <task_id>' 查看任务状态")
             
     except Exception as e:
         logger.error(f"程序发生未知异常: {str(e)}")
 
+def _run_local(input, sources, video_config, download_config, pages, mid, logger):
+    """--local: 在当前进程中下载，全部结束后输出每个任务的结果，有任务失败时返回非0"""
+    import asyncio
+    from src.client.local_runner import LocalRunner
+
+    runner = LocalRunner()
+    for source_type, source_id in sources:
+        runner.add_source(source_type, source_id, video_config, download_config, mid=mid)
+    if not sources:
+        if os.path.isfile(input):
+            logger.info(f"读取文件:{input}!")
+            links = [line for _, line in iter_links(input)]
+            bvids = [bvid for bvid in map(extract_bvid, links) if bvid]
+            if len(bvids) < len(links):
+                logger.warning(f"无法识别{len(links) - len(bvids)}个链接")
+        else:
+            bvids = [bvid for bvid in (extract_bvid(input),) if bvid]
+        if not bvids:
+            logger.error("请提供下载链接/下载链接格式不正确")
+            logger.info(inputHelp)
+            return
+        runner.add_tasks(bvids, video_config, download_config, pages=pages)
+
+    logger.info("本地下载模式，全部任务结束后退出")
+    interrupted = False
+    try:
+        tasks = asyncio.run(runner.run())
+    except KeyboardInterrupt:
+        interrupted = True
+        tasks = runner.results()
+    console.print(_local_summary(tasks, runner.jobs))
+    if interrupted:
+        console.print("[yellow]已中断，已下载的部分保留在缓存目录中，重新运行相同命令会继续下载[/]")
+    if interrupted or any(task.status != TaskStatus.COMPLETED for task in tasks) \
+            or any(job.status == TaskStatus.FAILED for job in runner.jobs):
+        raise SystemExit(1)
+
+def _local_summary(tasks, jobs) -> Table:
+    """--local结束后的任务结果表"""
+    completed = sum(1 for task in tasks if task.status == TaskStatus.COMPLETED)
+    table = Table(title="本地下载结果", title_style="bold cyan", caption_style="dim",
+                  caption=f"完成 {completed}/{len(tasks)}", show_lines=False)
+    table.add_column("ID", style="cyan", width=8, no_wrap=True)
+    table.add_column("视频", no_wrap=True)
+    table.add_column("状态", no_wrap=True)
+    table.add_column("耗时", justify="right", no_wrap=True)
+    table.add_column("大小", justify="right", no_wrap=True)
+    table.add_column("输出/错误", overflow="fold")
+    styles = {TaskStatus.COMPLETED: "green", TaskStatus.FAILED: "red", TaskStatus.CANCELLED: "dim"}
+    for job in jobs:
+        if job.status == TaskStatus.FAILED:
+            table.add_row(job.job_id[:8], f"{job.source_type}:{job.source_id}", Text("展开失败", style="red"),
+                          "-", "-", Text(job.error_message or "", style="red"))
+    for task in tasks:
+        name = f"{task.input} P{task.page_index + 1}" if task.parent_id else task.input
+        elapsed = f"{(task.completed_at - task.started_at).total_seconds():.1f}s" \
+            if task.started_at and task.completed_at else "-"
+        size = os.path.getsize(task.output_path) if task.output_path and os.path.exists(task.output_path) \
+            else task.estimated_bytes
+        detail = (task.output_path or "") if task.status == TaskStatus.COMPLETED else \
+            Text(task.error_message or "", style="red")
+        table.add_row(task.task_id[:8], name, Text(task.status.value, style=styles.get(task.status, "yellow")),
+                      elapsed, _format_bytes(size) if size else "-", detail)
+    return table
+
 @cli.command()
 @click.option('--server-url', default=None, help="指定服务器地址")
 def list(server_url):
@@ -215,102 +333,236 @@ def list(server_url):
     except Exception as e:
         console.print(f"[bold red]错误:[/bold red] {str(e)}", style="red")
 
+def _format_bytes(size: float) -> str:
+    """字节数转换为易读的大小"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.1f}{unit}" if unit != 'B' else f"{int(size)}B"
+        size /= 1024
+
+def _stage_name(stage: str) -> str:
+    """阶段(TaskStatus枚举名)的显示名称"""
+    return TaskStatus[stage].value if stage in TaskStatus.__members__ else stage
+
+def _timing_lines(task: dict) -> list:
+    """任务详情中的阶段耗时与传输统计"""
+    lines = []
+    durations = task.get('durations') or {}
+    if durations:
+        lines.append(Text.assemble(("阶段耗时: ", "dim"), ("  ".join(
+            f"{_stage_name(stage)} {seconds:.1f}s" for stage, seconds in durations.items()), "dim cyan")))
+    stages = task.get('stages') or []
+    if stages and stages[-1].get('ended_at') is None:
+        lines.append(Text.assemble(("当前阶段: ", "dim"),
+                                   (f"{_stage_name(stages[-1]['stage'])} (开始于{stages[-1]['started_at']})", "dim cyan")))
+    for kind, stats in (task.get('transfers') or {}).items():
+        label = "视频流" if kind == 'video' else "音频流"
+        lines.append(Text.assemble((f"{label}: ", "dim"), (
+            f"{_format_bytes(stats.get('bytes', 0))} 用时{stats.get('duration', 0):.1f}s "
+            f"平均{_format_bytes(stats.get('avg_bps', 0))}/s 峰值{_format_bytes(stats.get('peak_bps', 0))}/s "
+            f"重试{stats.get('retries', 0)}次", "dim cyan")))
+    if task.get('cdn_host'):
+        lines.append(Text.assemble(("CDN主机: ", "dim"), (task['cdn_host'], "dim cyan")))
+    if task.get('retries'):
+        lines.append(Text(f"重试次数: {task['retries']}", style="yellow"))
+    return lines
+
+def _status_panel(task: dict) -> Panel:
+    """任务详情面板"""
+    # 状态映射表
+    status_map = {
+        "running": ("green", "▶ 运行中"),
+        "paused": ("yellow", "⏸ 暂停"), 
+        "completed": ("cyan", "✓ 完成"),
+        "failed": ("red", "✗ 失败")
+    }
+    color, status_text = status_map.get(
+        task['status'].lower(), 
+        ("white", "未知状态")
+    )
+
+    error_msg = task.get('error_message')
+    display_text = "无" if error_msg is None else str(error_msg)
+
+    return Panel(
+        Group(
+            Text(f"任务ID: {task['task_id']}", style=Style(color="cyan", bold=True)),
+            Text(f"输入链接: {task['input']}", style=Style(color="magenta")),
+            Text(f"状态: {status_text}", style=Style(color=color, bold=True)),
+            Text(f"进度: {task['progress']}%", style=Style(color="blue")),
+            Text.assemble(
+                ("开始时间: ", "dim"),
+                (task.get('started_at') or 'N/A', "dim cyan")
+            ),
+            Text.assemble(
+                ("完成时间: ", "dim"),
+                (task.get('completed_at') or 'N/A', "dim cyan")
+            ),
+            Text(f"错误信息: {display_text}", style="green" if error_msg is None else "red"),
+            *_timing_lines(task)
+        ),
+        title="任务详情",
+        border_style=color,
+        width=80
+    )
+
 @cli.command()
-@click.argument('task_id')
+@click.argument('task_ids', nargs=-1, required=True)
 @click.option('--server-url', default=None, help="指定服务器地址")
-def status(task_id, server_url):
-    """查看任务详细状态"""
+def status(task_ids, server_url):
+    """查看任务详细状态(可同时指定多个任务)"""
     try:
         api = ClientAPI(server_url=server_url) if server_url else ClientAPI()
-        task = api.get_task_status(task_id)
-        
-        if not task:
-            console.print("[red]任务不存在或获取失败[/red]")
-            return
-
-        # 状态映射表
-        status_map = {
-            "running": ("green", "▶ 运行中"),
-            "paused": ("yellow", "⏸ 暂停"), 
-            "completed": ("cyan", "✓ 完成"),
-            "failed": ("red", "✗ 失败")
-        }
-        color, status_text = status_map.get(
-            task['status'].lower(), 
-            ("white", "未知状态")
-        )
+        if len(task_ids) == 1:
+            tasks = {task_ids[0]: api.get_task_status(task_ids[0])}
+        else:
+            tasks = api.get_task_statuses([*task_ids])
 
-        error_msg = task.get('error_message')
-        display_text = "无" if error_msg is None else str(error_msg)
-
-        panel = Panel(
-            Group(
-                Text(f"任务ID: {task['task_id']}", style=Style(color="cyan", bold=True)),
-                Text(f"输入链接: {task['input']}", style=Style(color="magenta")),
-                Text(f"状态: {status_text}", style=Style(color=color, bold=True)),
-                Text(f"进度: {task['progress']}%", style=Style(color="blue")),
-                Text.assemble(
-                    ("开始时间: ", "dim"),
-                    (task.get('started_at', 'N/A'), "dim cyan")
-                ),
-                Text.assemble(
-                    ("完成时间: ", "dim"),
-                    (task.get('completed_at', 'N/A'), "dim cyan")
-                ),
-                Text(f"错误信息: {display_text}", style="green" if error_msg is None else "red")
-            ),
-            title="任务详情",
-            border_style=color,
-            width=80
-        )
-        console.print(panel)
+        for task_id, task in tasks.items():
+            if not task:
+                console.print(f"[red]任务{task_id}不存在或获取失败[/red]")
+                continue
+            console.print(_status_panel(task))
         
     except Exception as e:
         console.print(f"[bold red]错误:[/] {str(e)}")
 
+@cli.command()
+@click.option('--server-url', default=None, help="指定服务器地址")
+@click.option('--fps', default=4, type=int, help=fpsHelp)
+def watch(server_url, fps):
+    """实时查看任务: 保持一个事件流连接,增量刷新"""
+    from rich.live import Live
+    from src.client.watch import TaskBoard, TaskWatcher
+    api = ClientAPI(server_url=server_url) if server_url else ClientAPI()
+    board = TaskBoard(title=f"B站视频下载任务  {api.base_url}")
+    watcher = TaskWatcher(api, board)
+    watcher.start()
+    try:
+        with Live(board, console=console, refresh_per_second=max(1, fps), screen=True):
+            while watcher.is_alive():
+                watcher.join(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        api.close()
+
 ACTION_NAMES = {
     "pause": "暂停",
     "resume": "恢复",
     "cancel": "取消"
 }
 
-def _manage_task(action: str, task_id: str, server_url: str):
-    """任务管理通用函数"""
+def _manage_task(action: str, task_ids: tuple, status_filter: str, server_url: str):
+    """任务管理通用函数,多个任务并发操作"""
     try:
         api = ClientAPI(server_url=server_url) if server_url else ClientAPI()
-        result = getattr(api, f"{action}_task")(task_id)  # 动态调用对应方法
-        
-        if result:
-            console.print(f"[green]✓ 成功{ACTION_NAMES[action]}任务 {task_id}[/]")
-        else:
-            console.print(f"[yellow]⚠ 操作未生效，可能任务已完成或不存在[/]")
-            
+        task_ids = [*task_ids]  # 模块中的list是命令,不能用于转换
+        if status_filter:
+            task_ids += [task['task_id'] for task in api.get_task_list(status=status_filter, fields='task_id')]
+        if not task_ids:
+            console.print("[yellow]⚠ 没有需要操作的任务[/]")
+            return
+        if len(task_ids) == 1:
+            result = getattr(api, f"{action}_task")(task_ids[0])  # 动态调用对应方法
+            if result:
+                console.print(f"[green]✓ 成功{ACTION_NAMES[action]}任务 {task_ids[0]}[/]")
+            else:
+                console.print("[yellow]⚠ 操作未生效，可能任务已完成或不存在[/]")
+            return
+
+        results = api.manage_tasks(task_ids, action)
+        succeeded = sum(results.values())
+        console.print(f"[green]✓ 成功{ACTION_NAMES[action]}{succeeded}个任务[/]")
+        if succeeded < len(task_ids):
+            console.print(f"[yellow]⚠ {len(task_ids) - succeeded}个任务操作未生效，可能任务已完成或不存在[/]")
+
     except Exception as e:
         console.print(f"[red]✗ 操作失败: {str(e)}[/]")
 
 # pause命令
 @cli.command()
-@click.argument('task_id')
+@click.argument('task_ids', nargs=-1)
+@click.option('--status', 'status_filter', default=None, help=statusFilterHelp)
 @click.option('--server-url', default=None)
-def pause(task_id, server_url):
+def pause(task_ids, status_filter, server_url):
     """暂停指定任务"""
-    _manage_task("pause", task_id, server_url)
+    _manage_task("pause", task_ids, status_filter, server_url)
 
 # resume命令 
 @cli.command()
-@click.argument('task_id')
+@click.argument('task_ids', nargs=-1)
+@click.option('--status', 'status_filter', default=None, help=statusFilterHelp)
 @click.option('--server-url', default=None)
-def resume(task_id, server_url):
+def resume(task_ids, status_filter, server_url):
     """恢复指定任务"""
-    _manage_task("resume", task_id, server_url)
+    _manage_task("resume", task_ids, status_filter, server_url)
 
 # cancel命令
 @cli.command()
-@click.argument('task_id')
+@click.argument('task_ids', nargs=-1)
+@click.option('--status', 'status_filter', default=None, help=statusFilterHelp)
 @click.option('--server-url', default=None)
-def cancel(task_id, server_url):
+def cancel(task_ids, status_filter, server_url):
     """取消指定任务"""
-    _manage_task("cancel", task_id, server_url)
+    _manage_task("cancel", task_ids, status_filter, server_url)
+
+# config命令
+@cli.command()
+@click.argument('settings', nargs=-1)
+@click.option('--server-url', default=None, help="指定服务器地址")
+def config(settings, server_url):
+    """查看或调整服务器配置(如 config max_concurrent_downloads=8 bandwidth_limit=20M)，立即生效"""
+    api = ClientAPI(server_url=server_url) if server_url else ClientAPI()
+    changes = {}
+    for setting in settings:
+        key, sep, value = setting.partition('=')
+        if not sep or not key:
+            console.print(f"[red]格式应为 配置项=值: {setting}[/red]")
+            return
+        changes[key.strip()] = value.strip()
+    current = api.update_server_config(changes) if changes else api.get_server_config()
+    if current is None:
+        console.print(f"[red]{'调整' if changes else '获取'}服务器配置失败[/red]")
+        return
+    table = Table(title="服务器配置", title_style="bold cyan", caption=f"服务器地址: {api.base_url}",
+                  caption_style="dim")
+    table.add_column("配置项", style="cyan")
+    table.add_column("当前值", justify="right")
+    for key, value in current.items():
+        style = "bold green" if key in changes else ""
+        table.add_row(key, Text(str(value), style=style))
+    console.print(table)
+
+# fetch命令
+@cli.command()
+@click.argument('task_id')
+@click.option('--output', default=None, help=fetchOutputHelp)
+@click.option('--connections', default=DEFAULT_CONNECTIONS, type=int, help=connectionsHelp)
+@click.option('--server-url', default=None)
+def fetch(task_id, output, connections, server_url):
+    """从服务器下载已完成任务的文件"""
+    from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
+    api = ClientAPI(server_url=server_url) if server_url else ClientAPI()
+    with Progress("[cyan]{task.description}", BarColumn(), DownloadColumn(), TransferSpeedColumn(),
+                  TimeRemainingColumn(), console=console) as progress:
+        bar = progress.add_task(task_id[:8], total=None)
+        fetcher = RangeFetcher(connections=connections,
+                               progress_callback=lambda done, total: progress.update(bar, completed=done, total=total))
+        try:
+            result = fetcher.fetch(f"{api.base_url}/tasks/{task_id}/file", output)
+        except FileChangedError:
+            console.print("[yellow]服务器上的文件已变化，已删除未完成的部分，请重新运行[/]")
+            return
+        except KeyboardInterrupt:
+            console.print("[yellow]已中断，重新运行相同命令会从中断处继续[/]")
+            return
+        except Exception as e:
+            console.print(f"[red]✗ 下载失败: {str(e)}[/]")
+            return
+    resumed = f"，续传{result.resumed_bytes}字节" if result.resumed_bytes else ""
+    console.print(f"[green]✓ 已保存到 {result.path}（{result.size}字节{resumed}）[/]")
 
 if __name__ == "__main__":
     cli()
\ No newline at end of file
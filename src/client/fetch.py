@@ -0,0 +1,215 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import unquote
+import requests
+from src.common.logger import get_logger
+
+DEFAULT_CONNECTIONS = 4
+MIN_PART_SIZE = 4 * 1024 * 1024   # 每个分段至少4MB,小文件不拆分
+CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = '.part'
+STATE_SUFFIX = '.part.json'
+STATE_SAVE_INTERVAL = 1.0         # 分段进度保存间隔(秒)
+DEFAULT_PART_RETRIES = 3
+
+class FileChangedError(Exception):
+    """服务器上的文件已变化(If-Range不匹配),已下载的分段作废"""
+
+@dataclass
+class FetchResult:
+    path: str
+    size: int
+    resumed_bytes: int = 0  # 从上次中断处续传的字节数
+
+def _parse_filename(content_disposition: str) -> Optional[str]:
+    """从Content-Disposition中解析文件名,优先使用RFC 5987编码的filename*"""
+    match = re.search(r"filename\*=(?:UTF-8|utf-8)''([^;]+)", content_disposition or '')
+    if match:
+        return unquote(match.group(1))
+    match = re.search(r'filename="?([^";]+)"?', content_disposition or '')
+    return match.group(1) if match else None
+
+class RangeFetcher:
+    """
+    分段并行下载服务器上的文件
+    文件先写入<输出文件>.part,各分段的进度保存在<输出文件>.part.json,
+    中断后重新运行会从各分段已下载的位置继续;服务器上的文件变化(ETag不同)时重新下载
+    """
+
+    def __init__(self, connections: int = DEFAULT_CONNECTIONS, timeout: float = 30,
+                 retries: int = DEFAULT_PART_RETRIES,
+                 progress_callback: Optional[Callable[[int, int], None]] = None):
+        """
+        Args:
+            progress_callback: 进度回调,参数为(已下载字节数, 文件总字节数)
+        """
+        self.logger = get_logger(__name__)
+        self.connections = max(1, connections)
+        self.timeout = timeout
+        self.retries = retries
+        self.progress_callback = progress_callback
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._cancelled = threading.Event()  # 一个分段失败或用户中断时,其余分段尽快停止
+        self._done = 0
+        self._size = 0
+
+    def probe(self, url: str) -> Tuple[int, Optional[str], Optional[str], bool]:
+        """
+        请求第一个字节获取文件信息
+        Returns:
+            (文件大小, ETag, 文件名, 是否支持Range)
+        """
+        with requests.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=self.timeout) as response:
+            if response.status_code not in (200, 206):
+                try:
+                    message = response.json().get('message')
+                except ValueError:
+                    message = response.reason
+                raise RuntimeError(f"获取文件失败({response.status_code}): {message}")
+            if response.status_code == 206:
+                size = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+            else:
+                size = int(response.headers.get('Content-Length', 0))
+            return (size, response.headers.get('ETag'),
+                    _parse_filename(response.headers.get('Content-Disposition')),
+                    response.status_code == 206)
+
+    def _split(self, size: int) -> List[List[int]]:
+        """按连接数拆分为[起点, 终点(含), 下一个待下载字节]"""
+        count = max(1, min(self.connections, size // MIN_PART_SIZE))
+        step = -(-size // count)
+        return [[start, min(start + step, size) - 1, start] for start in range(0, size, step)]
+
+    def _load_state(self, state_path: str, part_path: str, size: int, etag: Optional[str]) -> Optional[List[List[int]]]:
+        try:
+            with open(state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if (state.get('size') != size or state.get('etag') != etag or not etag
+                or not os.path.exists(part_path) or os.path.getsize(part_path) != size):
+            self.logger.warning("服务器上的文件已变化,重新下载")
+            return None
+        return state['parts']
+
+    def _save_state(self, state_path: str, size: int, etag: Optional[str], parts: List[List[int]]) -> None:
+        with self._lock:
+            data = json.dumps({"size": size, "etag": etag, "parts": parts})
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(data)
+        os.replace(tmp_path, state_path)
+
+    def _advance(self, part: List[int], written: int) -> None:
+        with self._lock:
+            part[2] += written
+            self._done += written
+            done = self._done
+        if self.progress_callback:
+            self.progress_callback(done, self._size)
+
+    def _fetch_part(self, url: str, part_path: str, etag: Optional[str], part: List[int],
+                    save: Callable[[], None]) -> None:
+        """下载一个分段,连接出错时从已下载的位置重试"""
+        session = requests.Session()
+        for attempt in range(self.retries + 1):
+            if part[2] > part[1]:
+                return
+            headers = {'Range': f'bytes={part[2]}-{part[1]}'}
+            if etag:
+                headers['If-Range'] = etag
+            try:
+                with session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 200:
+                        raise FileChangedError("服务器上的文件已变化")
+                    response.raise_for_status()
+                    with open(part_path, 'r+b') as file:
+                        file.seek(part[2])
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            if self._cancelled.is_set():
+                                return
+                            file.write(chunk)
+                            self._advance(part, len(chunk))
+                            save()
+                if part[2] > part[1]:
+                    return
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                self.logger.warning(f"分段{part[0]}-{part[1]}下载中断({str(e)}),第{attempt + 1}次重试")
+                time.sleep(2 ** attempt)
+        raise RuntimeError(f"分段{part[0]}-{part[1]}未下载完整")
+
+    def fetch(self, url: str, output: Optional[str] = None) -> FetchResult:
+        """
+        下载文件
+        Args:
+            output: 输出文件或目录,默认使用服务器提供的文件名保存到当前目录
+        """
+        size, etag, filename, ranges = self.probe(url)
+        if not output or os.path.isdir(output):
+            output = os.path.join(output or '.', filename or url.rstrip('/').split('/')[-2])
+        part_path, state_path = output + PART_SUFFIX, output + STATE_SUFFIX
+        self._size = size
+
+        parts = self._load_state(state_path, part_path, size, etag) if ranges else None
+        if parts is None:
+            parts = self._split(size) if ranges and size else [[0, size - 1, 0]]
+            with open(part_path, 'wb') as file:
+                file.truncate(size)
+        self._done = resumed = sum(part[2] - part[0] for part in parts)
+        if resumed:
+            self.logger.info(f"从上次中断处继续,已下载{resumed}/{size}字节")
+
+        last_save = [0.0]
+        def save(force: bool = False):
+            # 各分段线程共用,同一时间只有一个线程写进度文件
+            if not ranges or (not force and time.monotonic() - last_save[0] < STATE_SAVE_INTERVAL):
+                return
+            if not self._save_lock.acquire(blocking=force):
+                return
+            try:
+                last_save[0] = time.monotonic()
+                self._save_state(state_path, size, etag, parts)
+            finally:
+                self._save_lock.release()
+
+        try:
+            if ranges:
+                self._cancelled.clear()
+                pool = ThreadPoolExecutor(max_workers=len(parts))
+                try:
+                    for future in [pool.submit(self._fetch_part, url, part_path, etag, part, save) for part in parts]:
+                        future.result()
+                except BaseException:
+                    self._cancelled.set()
+                    raise
+                finally:
+                    pool.shutdown(wait=True)
+            else:
+                # 服务器不支持Range时单连接顺序下载,无法续传
+                with requests.get(url, stream=True, timeout=self.timeout) as response, open(part_path, 'wb') as file:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        file.write(chunk)
+                        self._advance(parts[0], len(chunk))
+        except FileChangedError:
+            for path in (state_path, part_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        except BaseException:
+            save(force=True)
+            raise
+
+        os.replace(part_path, output)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return FetchResult(path=output, size=size, resumed_bytes=resumed)
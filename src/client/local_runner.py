@@ -0,0 +1,85 @@
+import asyncio
+from typing import Iterable, List, Optional
+from src.common.models import DownloadTask, ExpansionJob, VideoConfig, DownloadConfig
+from src.common.logger import get_logger
+from src.service.task_manager import TaskManager, TERMINAL_STATUSES
+
+WAIT_INTERVAL = 1.0  # 等待任务状态变化的超时(秒),超时后重新检查是否全部结束
+
+class LocalRunner:
+    """
+    进程内下载(--local): 不经过服务器,在当前进程中创建TaskManager与DownloadService,
+    在一个事件循环中把一批任务执行到全部结束;整批任务共用解析缓存与下载连接池
+    """
+
+    def __init__(self, max_concurrent_downloads: Optional[int] = None):
+        # 只有--local用到下载服务,导入放在这里,不拖慢其它命令的启动
+        from bilibili_api import select_client
+        from src.server.download_service import DownloadService
+        from src.server.source_expander import SourceExpander, SOURCE_TYPES
+
+        select_client("aiohttp")
+        self.logger = get_logger(__name__)
+        self.task_manager = TaskManager()
+        if max_concurrent_downloads:
+            self.task_manager.set_max_concurrent_downloads(max_concurrent_downloads)
+        self.download_service = DownloadService(self.task_manager)
+        self.source_expander = SourceExpander(self.task_manager)
+        self.source_types = SOURCE_TYPES
+        self.jobs: List[ExpansionJob] = []
+
+    def add_tasks(self, bvids: Iterable[str], video_config: VideoConfig, download_config: DownloadConfig,
+                  pages: Optional[str] = None) -> List[str]:
+        """添加下载任务(重复的BV号只添加一次),返回任务ID"""
+        tasks, seen = [], set()
+        for bvid in bvids:
+            if bvid in seen:
+                continue
+            seen.add(bvid)
+            tasks.append(DownloadTask(input=bvid, video_config=video_config,
+                                      download_config=download_config, pages=pages))
+        return self.task_manager.add_tasks(tasks)
+
+    def add_source(self, source_type: str, source_id: str, video_config: VideoConfig,
+                   download_config: DownloadConfig, mid: Optional[str] = None) -> ExpansionJob:
+        """添加批量来源(收藏夹/合集/UP主投稿),运行时逐页展开并加入下载队列"""
+        if source_type not in self.source_types:
+            raise ValueError(f"未知的来源类型: {source_type},可选: {self.source_types}")
+        job = ExpansionJob(source_type=source_type, source_id=source_id, video_config=video_config,
+                           download_config=download_config, mid=mid)
+        self.jobs.append(job)
+        return job
+
+    def _finished(self) -> bool:
+        return all(task.status in TERMINAL_STATUSES for task in self.task_manager.list_tasks())
+
+    async def run(self) -> List[DownloadTask]:
+        """
+        执行到所有任务结束(来源全部展开且任务全部完成/失败/取消)
+        中断(Ctrl+C)时停止下载,已下载的部分保留在缓存目录中,下次运行相同命令会续传
+        Returns:
+            实际下载的任务(多P任务返回其分P子任务)
+        """
+        scheduler = asyncio.create_task(self.download_service.run())
+        expansions = [asyncio.create_task(self.source_expander.expand(job)) for job in self.jobs]
+        events = self.task_manager.events
+        try:
+            while True:
+                last_id = events.last_id
+                if all(expansion.done() for expansion in expansions) and self._finished():
+                    break
+                if scheduler.done():
+                    # 调度循环异常退出时不再等待
+                    scheduler.result()
+                    raise RuntimeError("下载调度已停止")
+                await events.wait_async(last_id, WAIT_INTERVAL)
+        finally:
+            for expansion in expansions:
+                expansion.cancel()
+            await self.download_service.shutdown()
+            await asyncio.gather(scheduler, *expansions, return_exceptions=True)
+        return self.results()
+
+    def results(self) -> List[DownloadTask]:
+        """按添加顺序返回任务,已展开为分P子任务的父任务不单独列出"""
+        return [task for task in self.task_manager.list_tasks() if not task.child_ids]
@@ -0,0 +1,252 @@
+import heapq
+import json
+import threading
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Dict, Iterator, List, Optional, Tuple
+import requests
+from rich.console import Console, ConsoleOptions, Group, RenderResult
+from rich.table import Table
+from rich.text import Text
+from src.common.models import TaskStatus
+from src.common.logger import get_logger
+
+WATCH_FIELDS = 'task_id,input,status,progress,estimated_bytes,version'
+SPEED_SMOOTHING = 0.3    # 速率的指数平滑系数
+STALE_SPEED_AFTER = 5    # 超过该秒数没有进度更新时速率视为0
+RECONNECT_DELAY = 2.0
+READ_TIMEOUT = 45        # 服务器每15秒发送一次保活注释,超时视为连接已断开
+HEADER_LINES = 6         # 汇总信息与表头占用的行数
+
+# 显示顺序: 下载中的任务在前,其次是暂停和排队的任务
+_STATUS_RANK = {
+    TaskStatus.DOWNLOADING_VIDEO: 0, TaskStatus.DOWNLOADING_AUDIO: 0, TaskStatus.DOWNLOADING: 0,
+    TaskStatus.MERGING: 1, TaskStatus.PARSING: 1, TaskStatus.CLEANING: 1,
+    TaskStatus.PAUSED: 2, TaskStatus.PENDING: 3,
+    TaskStatus.FAILED: 4, TaskStatus.COMPLETED: 5, TaskStatus.CANCELLED: 6
+}
+_STATUS_STYLES = {
+    TaskStatus.PAUSED: "yellow", TaskStatus.FAILED: "red", TaskStatus.COMPLETED: "cyan",
+    TaskStatus.CANCELLED: "dim", TaskStatus.PENDING: "white"
+}
+_TRANSFERRING = (TaskStatus.DOWNLOADING_VIDEO, TaskStatus.DOWNLOADING_AUDIO, TaskStatus.DOWNLOADING)
+
+def _status(value: str) -> Optional[TaskStatus]:
+    """任务字典中的状态(显示值)转换为枚举"""
+    try:
+        return TaskStatus(value)
+    except ValueError:
+        return None
+
+def _format_rate(bps: float) -> str:
+    for unit in ('B/s', 'KB/s', 'MB/s'):
+        if bps < 1024:
+            return f"{bps:.0f}{unit}" if unit == 'B/s' else f"{bps:.1f}{unit}"
+        bps /= 1024
+    return f"{bps:.1f}GB/s"
+
+def _format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}" if seconds >= 3600 \
+        else f"{seconds // 60}:{seconds % 60:02d}"
+
+def iter_sse(response: requests.Response) -> Iterator[Tuple[Optional[str], str, Dict]]:
+    """
+    解析SSE响应
+    Yields:
+        (事件ID, 事件类型, 数据)
+    """
+    event_id, event, data = None, 'message', []
+    for raw in response.iter_lines(chunk_size=8192):
+        line = raw.decode('utf-8') if isinstance(raw, bytes) else raw
+        if not line:
+            if data:
+                yield event_id, event, json.loads('\n'.join(data))
+            event_id, event, data = None, 'message', []
+        elif line.startswith(':'):
+            continue  # 保活注释
+        else:
+            name, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if name == 'id':
+                event_id = value
+            elif name == 'event':
+                event = value
+            elif name == 'data':
+                data.append(value)
+
+@dataclass
+class WatchedTask:
+    task_id: str
+    input: str
+    status: Optional[TaskStatus]
+    progress: float = 0.0
+    estimated_bytes: int = 0
+    version: int = 0
+    speed: float = 0.0                 # 按进度与预计大小估算的速率(字节/秒)
+    updated_at: float = field(default_factory=monotonic)
+
+    @property
+    def current_speed(self) -> float:
+        if self.status not in _TRANSFERRING or monotonic() - self.updated_at > STALE_SPEED_AFTER:
+            return 0.0
+        return self.speed
+
+    @property
+    def eta(self) -> Optional[float]:
+        speed = self.current_speed
+        if speed <= 0 or not self.estimated_bytes:
+            return None
+        return self.estimated_bytes * (100 - self.progress) / 100 / speed
+
+class TaskBoard:
+    """
+    watch命令的本地任务表
+    启动时加载一次快照,之后只应用事件流中的增量;渲染时只生成终端能显示的行
+    """
+
+    def __init__(self, title: str = "B站视频下载任务"):
+        self.title = title
+        self.connected = False
+        self.error: Optional[str] = None
+        self._tasks: Dict[str, WatchedTask] = {}
+        self._lock = threading.Lock()
+
+    def load(self, tasks: List[Dict]) -> None:
+        """用快照整体替换任务表,保留已有任务的速率"""
+        with self._lock:
+            previous = self._tasks
+            self._tasks = {}
+            for data in tasks:
+                task = self._tasks[data['task_id']] = WatchedTask(
+                    task_id=data['task_id'],
+                    input=data.get('input', ''),
+                    status=_status(data.get('status')),
+                    progress=data.get('progress') or 0.0,
+                    estimated_bytes=data.get('estimated_bytes') or 0,
+                    version=data.get('version') or 0
+                )
+                if data['task_id'] in previous:
+                    task.speed = previous[data['task_id']].speed
+
+    def apply(self, data: Dict) -> None:
+        """应用一条created/status/progress事件"""
+        now = monotonic()
+        with self._lock:
+            task = self._tasks.get(data['task_id'])
+            if task is None:
+                task = self._tasks[data['task_id']] = WatchedTask(data['task_id'], data.get('input', ''), None)
+            elif data.get('version', 0) and data['version'] <= task.version:
+                return  # 早于快照的事件
+            status = _status(data.get('status'))
+            progress = data.get('progress') or 0.0
+            estimated_bytes = data.get('estimated_bytes') or task.estimated_bytes
+            elapsed = now - task.updated_at
+            if status == task.status and progress > task.progress and elapsed > 0 and estimated_bytes:
+                sample = (progress - task.progress) / 100 * estimated_bytes / elapsed
+                task.speed = sample if task.speed <= 0 else \
+                    SPEED_SMOOTHING * sample + (1 - SPEED_SMOOTHING) * task.speed
+            elif status != task.status:
+                # 切换到下一条流时进度从0开始,重新估算
+                task.speed = 0.0
+            task.status = status
+            task.progress = progress
+            task.estimated_bytes = estimated_bytes
+            task.version = data.get('version', task.version)
+            task.input = data.get('input') or task.input
+            task.updated_at = now
+
+    def _summary(self) -> Tuple[Dict[TaskStatus, int], float, List[WatchedTask]]:
+        with self._lock:
+            tasks = list(self._tasks.values())
+        counts: Dict[TaskStatus, int] = {}
+        for task in tasks:
+            counts[task.status] = counts.get(task.status, 0) + 1
+        return counts, sum(task.current_speed for task in tasks), tasks
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        counts, throughput, tasks = self._summary()
+        rows = max(1, (options.height or console.size.height) - HEADER_LINES)
+        # 只取前rows个任务渲染,任务数很多时不对整个列表排序
+        visible = heapq.nsmallest(rows, tasks, key=lambda t: (_STATUS_RANK.get(t.status, 7), -t.progress))
+
+        state = Text("已连接", style="green") if self.connected else \
+            Text(f"重新连接中 {self.error or ''}", style="red")
+        summary = Text.assemble(
+            (f"任务 {len(tasks)}  ", "bold"),
+            (f"下载速率 {_format_rate(throughput)}  ", "bold green"),
+            (f"排队 {counts.get(TaskStatus.PENDING, 0)}  ", "bold"),
+            ("  ".join(f"{status.value} {count}" for status, count in counts.items()
+                       if status is not None and status != TaskStatus.PENDING), "dim"),
+            "  ", state
+        )
+
+        table = Table(expand=True, show_edge=False, pad_edge=False)
+        table.add_column("ID", style="cyan", width=10, no_wrap=True)
+        table.add_column("视频", ratio=1, no_wrap=True)
+        table.add_column("状态", width=10, no_wrap=True)
+        table.add_column("进度", width=22, no_wrap=True)
+        table.add_column("速率", justify="right", width=10, no_wrap=True)
+        table.add_column("剩余", justify="right", width=8, no_wrap=True)
+        for task in visible:
+            style = _STATUS_STYLES.get(task.status, "green")
+            filled = int(task.progress / 100 * 14)
+            table.add_row(
+                task.task_id[:8],
+                task.input,
+                Text(task.status.value if task.status else "未知", style=style),
+                Text(f"{'█' * filled}{'░' * (14 - filled)} {task.progress:5.1f}%", style=style),
+                _format_rate(task.current_speed) if task.current_speed else "-",
+                _format_eta(task.eta)
+            )
+        hidden = len(tasks) - len(visible)
+        footer = Text(f"还有{hidden}个任务未显示  Ctrl+C退出", style="dim") if hidden else \
+            Text("Ctrl+C退出", style="dim")
+        yield Group(Text(self.title, style="bold cyan"), summary, table, footer)
+
+class TaskWatcher(threading.Thread):
+    """
+    保持一个事件流(GET /tasks/events)连接,把增量事件应用到TaskBoard;
+    连接建立后加载一次任务快照,断线或收到resync时重新加载
+    """
+
+    def __init__(self, api, board: TaskBoard):
+        super().__init__(daemon=True)
+        self.logger = get_logger(__name__)
+        self.api = api
+        self.board = board
+        self._stop_event = threading.Event()
+        self._response: Optional[requests.Response] = None
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._response is not None:
+            self._response.close()
+
+    def _snapshot(self) -> None:
+        self.board.load(self.api.get_task_list(fields=WATCH_FIELDS))
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                # 先订阅再加载快照,两者之间的事件不会丢失(早于快照的事件按版本号忽略)
+                with self.api.session.get(f"{self.api.base_url}/tasks/events", stream=True,
+                                          timeout=(self.api.timeout[0], READ_TIMEOUT)) as response:
+                    response.raise_for_status()
+                    self._response = response
+                    self._snapshot()
+                    self.board.connected, self.board.error = True, None
+                    for _, event, data in iter_sse(response):
+                        if event == 'resync':
+                            self._snapshot()
+                        else:
+                            self.board.apply(data)
+            except Exception as e:
+                if self._stop_event.is_set():
+                    return
+                self.board.error = str(e)[:60]
+                self.logger.debug(f"事件流连接断开: {str(e)}")
+            self.board.connected = False
+            self._stop_event.wait(RECONNECT_DELAY)
@@ -1,7 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from uuid import uuid4
 
 class TaskStatus(Enum):
@@ -15,6 +15,7 @@ class TaskStatus(Enum):
     COMPLETED = "已完成"    
     FAILED = "失败"        
     PAUSED = "已暂停"
+    CANCELLED = "已取消"
 
     def __str__(self):
         return self.value  # 返回可读的字符串表示
@@ -24,6 +25,9 @@ class VideoConfig:
     audio_quality: str #音质
     codec: str #编码
     audio_only: bool = False
+    fallback: str = "lower,codec,higher" #找不到指定画质/编码时的降级阶梯
+    max_bitrate: Optional[str] = None #按码率预算选流(bps,支持k/M后缀),设置后忽略画质
+    max_bytes: Optional[str] = None #按体积预算选流(字节,支持K/M/G后缀),设置后忽略画质
 
 @dataclass
 class DownloadConfig:
@@ -31,6 +35,7 @@ class DownloadConfig:
     cache_dir: str
     server_url: str
     threads: int = 4
+    progressive: bool = False #边下边播: 音视频流同时按顺序下载,下载过程中即可通过/tasks/<id>/stream/<kind>播放
 
 @dataclass
 class DownloadTask:
@@ -46,8 +51,92 @@ class DownloadTask:
     error_message: Optional[str] = None
     progress: float = 0.0
     last_updated :datetime = 0.0
+    worker_id: Optional[str] = None #持有租约的工作节点
+    lease_expires_at: Optional[datetime] = None #租约到期时间
+    estimated_bytes: int = 0 #所选音视频流的总字节数,用于磁盘空间准入
+    temp_files: List[str] = field(default_factory=list) #缓存目录中的临时文件
+    output_path: Optional[str] = None #输出文件路径
+    pages: Optional[str] = None #分P选择: all / 1-5,8 ,为空时只下载第一P
+    page_index: int = 0 #下载的分P索引(从0开始)
+    parent_id: Optional[str] = None #分P子任务所属的父任务
+    child_ids: List[str] = field(default_factory=list) #父任务展开出的分P子任务
+    version: int = 0 #最近一次变更时TaskManager的全局版本号
+    stages: List[Dict[str, Any]] = field(default_factory=list) #状态时间线: stage/started_at/ended_at/duration(秒)
+    transfers: Dict[str, Dict[str, Any]] = field(default_factory=dict) #各流(video/audio)的传输统计
+    cdn_host: Optional[str] = None #最近一次下载使用的CDN主机
+    retries: int = 0 #下载重试总次数
+    stream_files: Dict[str, Dict[str, Any]] = field(default_factory=dict) #正在下载的流(video/audio): path/size
     def __post_init__(self):
         if self.task_id is None:
             self.task_id = str(uuid4())
         if self.created_at is None:
-            self.created_at = datetime.now()
\ No newline at end of file
+            self.created_at = datetime.now()
+
+_TASK_DATETIME_FIELDS = ('created_at', 'started_at', 'completed_at', 'last_updated', 'lease_expires_at')
+
+def task_to_dict(task: DownloadTask) -> Dict[str, Any]:
+    """将任务完整转换为可JSON序列化的字典(状态使用枚举名),与task_from_dict互逆"""
+    data = asdict(task)
+    data['status'] = task.status.name
+    for key in _TASK_DATETIME_FIELDS:
+        if isinstance(data[key], datetime):
+            data[key] = data[key].isoformat()
+    return data
+
+def task_from_dict(data: Dict[str, Any]) -> DownloadTask:
+    """由task_to_dict的结果还原任务"""
+    data = dict(data)
+    data['video_config'] = VideoConfig(**data['video_config'])
+    data['download_config'] = DownloadConfig(**data['download_config'])
+    data['status'] = TaskStatus[data['status']]
+    for key in _TASK_DATETIME_FIELDS:
+        if isinstance(data.get(key), str):
+            data[key] = datetime.fromisoformat(data[key])
+    return DownloadTask(**data)
+
+@dataclass
+class ExpansionJob:
+    """批量来源展开任务: 收藏夹/合集/UP主投稿,分页获取并逐页加入下载队列"""
+    source_type: str #favorite / season / uploader
+    source_id: str #收藏夹ID / 合集ID / UP主mid
+    video_config: VideoConfig
+    download_config: DownloadConfig
+    mid: Optional[str] = None #合集所属UP主mid
+    job_id: str = None
+    status: TaskStatus = TaskStatus.PARSING
+    total: int = 0 #来源声明的视频总数
+    pages_fetched: int = 0
+    queued: int = 0 #已加入队列的任务数
+    task_ids: List[str] = field(default_factory=list)
+    error_message: Optional[str] = None
+    created_at: datetime = None
+    completed_at: datetime = None
+    def __post_init__(self):
+        if self.job_id is None:
+            self.job_id = str(uuid4())
+        if self.created_at is None:
+            self.created_at = datetime.now()
+
+@dataclass
+class Subscription:
+    """来源订阅: 定期同步收藏夹/合集/UP主投稿,只把水位线之后的新视频加入下载队列"""
+    source_type: str #favorite / season / uploader
+    source_id: str #收藏夹ID / 合集ID / UP主mid
+    video_config: VideoConfig
+    download_config: DownloadConfig
+    mid: Optional[str] = None #合集所属UP主mid
+    interval: int = 3600 #同步间隔(秒)
+    backfill: bool = False #首次同步是否下载已有视频,否则只记录水位线
+    sub_id: str = None
+    watermark_ts: int = 0 #已见过的最新条目时间戳(发布时间/收藏时间)
+    watermark_bvid: Optional[str] = None #已见过的最新条目
+    watermark_listing: Optional[str] = None #合集列表的摘要(总数与第一页首尾条目),未变化时同步不再翻页
+    queued: int = 0 #累计加入队列的视频数
+    last_sync_at: datetime = None
+    last_error: Optional[str] = None
+    created_at: datetime = None
+    def __post_init__(self):
+        if self.sub_id is None:
+            self.sub_id = str(uuid4())
+        if self.created_at is None:
+            self.created_at = datetime.now()
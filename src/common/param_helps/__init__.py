@@ -12,6 +12,18 @@ __all__ = [
     'cacheDirHelp',
     'audioOnlyHelp',
     'threadsHelp',
+    'pagesHelp',
+    'fallbackHelp',
+    'maxBitrateHelp',
+    'maxBytesHelp',
+    'favoriteHelp',
+    'seasonHelp',
+    'uploaderHelp',
+    'midHelp',
+    'subscribeHelp',
+    'intervalHelp',
+    'backfillHelp',
+    'batchSizeHelp',
     
     # 共享帮助
     'loglevelHelp',
@@ -19,5 +31,11 @@ __all__ = [
     'logDirHelp',
     
     # 服务器帮助
-    'serverHelp'
+    'serverHelp',
+    'localWorkerHelp',
+    'serverModeHelp',
+    'coordinatorUrlHelp',
+    'workerIdHelp',
+    'maxConcurrentHelp',
+    'leaseSecondsHelp'
 ]
\ No newline at end of file
@@ -36,4 +36,48 @@ audioOnlyHelp = "是否仅下载音频，默认为False"
 
 maxWorkersHelp = "并发下载线程数，默认为3"
 
-threadsHelp = "下载线程数，默认为4"
\ No newline at end of file
+threadsHelp = "下载线程数，默认为4"
+
+pagesHelp = """多P视频的分P选择，默认只下载第一P:
+- all: 全部分P
+- 1-5,8: 第1到5P以及第8P
+- 10-: 第10P到最后一P
+分P以子任务形式并发下载，同时下载的分P数不超过threads"""
+
+fallbackHelp = """找不到指定画质/编码时的降级阶梯，按逗号分隔依次尝试，默认为lower,codec,higher:
+- lower: 同编码下最接近的较低画质
+- codec: 替换编码(H264 -> H265 -> AV1)，从指定画质开始向下查找
+- higher: 最接近的较高画质
+- best: 直接使用最佳画质(需显式开启)"""
+
+maxBitrateHelp = "按码率预算选流(音视频合计，单位bps，支持k/M后缀，如2.5M)，设置后忽略--video-quality，选择预算内画质最高的组合"
+
+maxBytesHelp = "按体积预算选流(单位字节，支持K/M/G后缀，如500M)，按 声明码率x时长 估算，设置后忽略--video-quality"
+
+favoriteHelp = "下载收藏夹中的全部视频(收藏夹ID)，由服务器分页获取并陆续加入下载队列"
+
+seasonHelp = "下载合集中的全部视频(合集ID)，需要同时通过--mid指定合集所属UP主"
+
+uploaderHelp = "下载UP主的全部投稿(UP主mid)"
+
+midHelp = "合集所属UP主的mid，与--season一起使用"
+
+subscribeHelp = "与--favorite/--season/--uploader一起使用，改为订阅该来源: 服务器定期同步，只下载之后新增的视频"
+
+intervalHelp = "订阅的同步间隔(秒)，默认为3600"
+
+backfillHelp = "订阅时同时下载来源中已有的视频"
+
+progressiveHelp = "边下边播: 音视频流同时按顺序下载，下载过程中即可用播放器打开 /tasks/<task_id>/stream/video 与 /tasks/<task_id>/stream/audio"
+
+batchSizeHelp = "从文件批量导入时每批提交的任务数，默认为500；导入中断后重新运行会从上次提交到的位置继续"
+
+fetchOutputHelp = "保存路径(文件或目录)，默认使用服务器上的文件名保存到当前目录"
+
+connectionsHelp = "并行下载的分段数，默认为4；中断后重新运行相同命令会从各分段已下载的位置继续"
+
+statusFilterHelp = "同时操作该状态的全部任务(逗号分隔，如PENDING,PAUSED)，多个任务并发处理"
+
+fpsHelp = "每秒刷新次数，默认为4；任务状态通过事件流实时接收，刷新频率只影响界面"
+
+localHelp = "本地下载: 不经过服务器，在当前进程中下载(单个链接、链接文件或批量来源)，全部任务结束后输出每个任务的结果，有任务失败时返回非0"
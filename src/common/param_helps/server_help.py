@@ -1,2 +1,10 @@
 hostHelp = "服务器监听地址"
-portHelp = "服务器监听端口"
\ No newline at end of file
+portHelp = "服务器监听端口"
+localWorkerHelp = "是否在API服务器进程内执行下载任务,作为纯协调服务器部署时可关闭"
+
+coordinatorUrlHelp = "协调服务器(API服务器)地址"
+workerIdHelp = "工作节点ID,默认为 主机名-进程号"
+maxConcurrentHelp = "工作节点最大并发下载数"
+leaseSecondsHelp = "任务租约时长(秒),工作节点失联超过该时长后任务会被重新分配"
+
+serverModeHelp = "服务器模式: aiohttp(默认,API与下载调度共用一个事件循环,退出时保存未完成任务) / flask(开发服务器)"
@@ -1,16 +1,17 @@
 import re
 import os
+import json
+import shutil
 import logging
-import aiohttp
-import asyncio
-import ffmpeg
 import subprocess
-import bilibili_api
-from bilibili_api import HEADERS,login_v2
-import tqdm
-from questionary import Validator, ValidationError
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 
+# bilibili_api/ffmpeg/aiohttp/tqdm只在用到的函数中导入,list/status等命令不加载它们
+FFMPEG_PROBE_CACHE = Path('cache') / 'ffmpeg_probe.json'  # 相对项目根目录
+
+@lru_cache(maxsize=None)
 def find_project_root() -> Path:
             """查找项目根目录"""
                 # 项目标记文件列表（用于识别项目根目录）
@@ -29,6 +30,11 @@ def find_project_root() -> Path:
             logging.warning(f"未找到项目标记，使用当前路径: {current_path}")
             return current_path
 
+# extract_bvid的匹配模式,批量导入时逐行调用,只编译一次
+_AVID_PATTERN = re.compile(r'[aA][vV](\d+)')
+_BVID_PATTERN = re.compile(r'[bB][vV][\d\w]+')
+_NUMBER_PATTERN = re.compile(r'^\d+$')
+
 def extract_bvid(url_or_code: str) -> str:
     '''
     从输入中提取BV号，支持以下格式：
@@ -42,22 +48,18 @@ def extract_bvid(url_or_code: str) -> str:
     if not url_or_code:
         return None
         
-    # 匹配模式
-    avid_pattern = re.compile(r'[aA][vV](\d+)')
-    bvid_pattern = re.compile(r'[bB][vV][\d\w]+')
-    number_pattern = re.compile(r'^\d+$')
-    
     # 尝试匹配AV号
-    avid_match = avid_pattern.search(url_or_code)
+    avid_match = _AVID_PATTERN.search(url_or_code)
     if avid_match:
+        from bilibili_api import aid2bvid
         try:
-            return bilibili_api.aid2bvid(int(avid_match.group(1)))
+            return aid2bvid(int(avid_match.group(1)))
         except ValueError:
             logging.error("AV号格式不正确")
             return None
             
     # 尝试匹配BV号
-    bvid_match = bvid_pattern.search(url_or_code)
+    bvid_match = _BVID_PATTERN.search(url_or_code)
     if bvid_match:
         bvid = bvid_match.group(0)
         if bvid.startswith(('Bv', 'bV', 'bv')):
@@ -65,16 +67,63 @@ def extract_bvid(url_or_code: str) -> str:
         return bvid
         
     # 尝试匹配纯数字（作为AV号处理）
-    number_match = number_pattern.search(url_or_code)
+    number_match = _NUMBER_PATTERN.search(url_or_code)
     if number_match:
+        from bilibili_api import aid2bvid
         try:
-            return bilibili_api.aid2bvid(int(number_match.group(0)))
+            return aid2bvid(int(number_match.group(0)))
         except ValueError:
             logging.error("AV号格式不正确")
             return None
             
     return None
 
+def parse_page_selection(selection: str, page_count: int) -> list:
+    '''
+    解析分P选择，支持以下格式：
+    1. all: 全部分P
+    2. 逗号分隔的页码与范围，如 1-5,8,10- (页码从1开始，末尾开放的范围表示到最后一P)
+    返回：
+        list: 去重并排序后的分P索引(从0开始)
+    '''
+    selection = (selection or '').strip().lower()
+    if selection in ('', 'all', '*'):
+        return list(range(page_count))
+    indices = set()
+    for part in selection.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            start = int(start) if start.strip() else 1
+            end = int(end) if end.strip() else page_count
+        else:
+            start = end = int(part)
+        if start < 1 or end < start:
+            raise ValueError(f"分P范围不正确: {part}")
+        indices.update(range(start - 1, min(end, page_count)))
+    return sorted(indices)
+
+def parse_size(value, base: int = 1024):
+    '''
+    解析带单位的大小，支持纯数字或K/M/G后缀(如 500M、1.5G、2500k)
+    参数：
+        base: 单位进制，字节数使用1024，码率使用1000
+    返回：
+        int: 数值
+        None: 输入为空
+    '''
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper().rstrip('B').rstrip('I')
+    units = {'K': base, 'M': base ** 2, 'G': base ** 3, 'T': base ** 4}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(float(text))
+
 def config2reality(str) -> str :
     qualityOfVideoAndAudio = {
         #视频清晰度
@@ -101,12 +150,69 @@ def config2reality(str) -> str :
     }
     return qualityOfVideoAndAudio[str]
 
-def check_ffmpeg() -> None:
+def _parse_codecs(output: str) -> list:
+    """解析ffmpeg -codecs的输出,返回编解码器名称"""
+    codecs, started = [], False
+    for line in output.splitlines():
+        if line.strip().startswith('-------'):
+            started = True
+        elif started and line.strip():
+            parts = line.split()
+            if len(parts) >= 2:
+                codecs.append(parts[1])
+    return sorted(codecs)
+
+def probe_ffmpeg(cache_path: Optional[Path] = None) -> Optional[dict]:
+    '''
+    探测ffmpeg的路径、版本与支持的编解码器
+    结果按可执行文件的路径与修改时间缓存在磁盘上,ffmpeg没有变化时不再启动子进程
+    返回：
+        dict: {"path", "mtime_ns", "version", "codecs"}
+        None: 未找到ffmpeg或无法运行
+    '''
+    path = shutil.which('ffmpeg')
+    if not path:
+        return None
+    path = os.path.realpath(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    cache_path = cache_path or find_project_root() / FFMPEG_PROBE_CACHE
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('path') == path and cached.get('mtime_ns') == mtime_ns:
+            return cached
+    except (OSError, ValueError):
+        pass
+
+    try:
+        version_output = subprocess.run([path, '-version'], capture_output=True, text=True, check=True).stdout
+        codecs_output = subprocess.run([path, '-hide_banner', '-codecs'], capture_output=True, text=True,
+                                       check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    version = re.match(r'ffmpeg version (\S+)', version_output)
+    probe = {
+        "path": path,
+        "mtime_ns": mtime_ns,
+        "version": version.group(1) if version else None,
+        "codecs": _parse_codecs(codecs_output)
+    }
     try:
-        subprocess.check_call(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except (FileNotFoundError, subprocess.CalledProcessError):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(probe, f)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.warning(f"保存ffmpeg探测结果失败: {str(e)}")
+    return probe
+
+def check_ffmpeg() -> dict:
+    probe = probe_ffmpeg()
+    if probe is None:
         logging.error("FFmpeg is not installed or not found in PATH. Please install FFmpeg.")
         exit(1)
+    return probe
 
 def sanitize_filename(filename: str) -> str:
     illegal_chars = r'[\\/:*?"<>|\s]'
@@ -115,6 +221,9 @@ def sanitize_filename(filename: str) -> str:
     return sanitized[:200] if sanitized else "untitled"
 
 async def download_file(url: str, path: str) -> None:
+    import aiohttp
+    from bilibili_api import HEADERS
+    from tqdm import tqdm
     async with aiohttp.ClientSession() as session:
         async with session.get(url, headers=HEADERS) as response:
             total_size = int(response.headers.get("content-length", 0))
@@ -131,6 +240,8 @@ async def mix_streams(videoPath='', audioPath='', outputPath='') -> None:
     '''
         混流
     '''
+    import asyncio
+    import ffmpeg
     try:
         # 创建输出目录（如果不存在）
         os.makedirs(os.path.dirname(outputPath), exist_ok=True)
@@ -152,8 +263,8 @@ async def mix_streams(videoPath='', audioPath='', outputPath='') -> None:
         else:
             raise ValueError("至少需要提供一个输入文件")
         
-        # 运行FFmpeg命令
-        ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
+        # 运行FFmpeg命令(在线程中执行,不阻塞事件循环)
+        await asyncio.to_thread(ffmpeg.run, stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
         
         # 删除临时文件
         if videoPath and os.path.exists(videoPath):
@@ -167,18 +278,3 @@ async def mix_streams(videoPath='', audioPath='', outputPath='') -> None:
     except Exception as e:
         logging.error(f"混流错误: {str(e)}")
         raise
-class CountryCodeValidator(Validator):
-    def validate(self, document):
-        code = document.text
-        # 业务逻辑验证
-        try:
-            if not login_v2.have_code(code):
-                raise ValidationError(
-                    message="无效的国家代码", 
-                    cursor_position=len(code)
-                )
-        except ValueError:  # 如果验证失败抛出异常
-            raise ValidationError(
-                message="非法代码格式",
-                cursor_position=len(code)
-            )
\ No newline at end of file
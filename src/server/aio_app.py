@@ -0,0 +1,83 @@
+import re
+from urllib.parse import quote
+from aiohttp import web
+from src.server.api_handlers import APIHandlers, ApiRequest, ApiFile
+from src.service.event_bus import EventSubscription
+from src.service.growing_file import GrowingFile
+from src.common.logger import get_logger
+
+_PATH_PARAM = re.compile(r'<(\w+)>')
+
+def _aio_path(path: str) -> str:
+    """将Flask风格的路径参数<name>转换为aiohttp的{name}"""
+    return _PATH_PARAM.sub(r'{\1}', path)
+
+async def _stream_events(request: web.Request, subscription: EventSubscription) -> web.StreamResponse:
+    """以SSE推送任务事件,直到客户端断开"""
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+    try:
+        while True:
+            messages = subscription.fetch()
+            if messages:
+                await response.write(''.join(messages).encode('utf-8'))
+            elif not await subscription.bus.wait_async(subscription.last_id, subscription.KEEPALIVE_INTERVAL):
+                await response.write(b': keepalive\n\n')
+    except (ConnectionResetError, ConnectionError):
+        pass
+    return response
+
+async def _stream_file(request: web.Request, growing: GrowingFile, status: int, headers: dict) -> web.StreamResponse:
+    """边下边播: 数据写入后立即发送,直到区间发送完毕或下载结束"""
+    response = web.StreamResponse(status=status, headers=headers)
+    await response.prepare(request)
+    try:
+        async for chunk in growing.achunks():
+            await response.write(chunk)
+    except (ConnectionResetError, ConnectionError):
+        pass
+    return response
+
+def _view(handler, logger):
+    async def view(request: web.Request) -> web.StreamResponse:
+        try:
+            data = await request.json() if request.can_read_body else {}
+            payload, status, *headers = handler(ApiRequest(
+                json=data if isinstance(data, dict) else {},
+                args=request.query,
+                params=dict(request.match_info),
+                headers=request.headers
+            ))
+        except Exception as e:
+            logger.error(f"处理请求{request.path}失败: {str(e)}")
+            payload, status, headers = {"status": "error", "message": str(e)}, 500, []
+        if isinstance(payload, EventSubscription):
+            return await _stream_events(request, payload)
+        if isinstance(payload, GrowingFile):
+            return await _stream_file(request, payload, status, headers[0])
+        if isinstance(payload, ApiFile):
+            # FileResponse处理Range/If-Range,并在支持时通过sendfile零拷贝发送
+            return web.FileResponse(payload.path, headers={
+                'Content-Disposition': f"attachment; filename*=UTF-8''{quote(payload.filename)}"
+            })
+        if status == 304:
+            return web.Response(status=304, headers=headers[0] if headers else None)
+        if isinstance(payload, str):
+            return web.Response(body=payload.encode('utf-8'), status=status, headers=headers[0] if headers else None)
+        return web.json_response(payload, status=status, headers=headers[0] if headers else None)
+    return view
+
+def create_aio_app(handlers: APIHandlers) -> web.Application:
+    """
+    创建aiohttp应用
+    处理函数只操作内存中的任务表,直接在事件循环中执行,不为每个请求占用线程
+    """
+    logger = get_logger(__name__)
+    app = web.Application()
+    for method, path, name in handlers.ROUTES:
+        app.router.add_route(method, _aio_path(path), _view(getattr(handlers, name), logger))
+    return app
@@ -0,0 +1,701 @@
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from threading import Lock
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple, Union
+from src.common.models import VideoConfig, DownloadConfig, DownloadTask, ExpansionJob, Subscription, TaskStatus
+from src.common.utils import extract_bvid
+from src.service.task_manager import TaskManager, DEFAULT_LEASE_SECONDS, TERMINAL_STATUSES
+from src.service.rate_limiter import api_guard
+from src.service.metrics import metrics
+from src.service.event_bus import EventSubscription
+from src.service.growing_file import GrowingFile, parse_range
+
+MAX_BATCH_ITEMS = 10000  # 单次批量提交的条目上限
+TASK_PAGE_LIMIT = 100     # GET /tasks默认每页任务数
+MAX_TASK_PAGE_LIMIT = 1000
+TERMINAL_CACHE_SIZE = 10000  # 缓存的已结束任务字典数,超出时淘汰最久未访问的
+
+# 任务字典的全部字段,可通过fields参数选择;列表默认只返回LIST_FIELDS
+TASK_FIELDS = ('task_id', 'input', 'status', 'progress', 'created_at', 'started_at', 'completed_at',
+               'error_message', 'estimated_bytes', 'parent_id', 'page', 'pages', 'version',
+               'stages', 'durations', 'transfers', 'cdn_host', 'retries', 'streams')
+LIST_FIELDS = ('task_id', 'input', 'status', 'progress', 'created_at', 'started_at', 'completed_at',
+               'error_message')
+
+@dataclass
+class ApiRequest:
+    """与Web框架无关的请求"""
+    json: Dict[str, Any] = field(default_factory=dict)     # 请求体
+    args: Mapping[str, str] = field(default_factory=dict)   # 查询参数
+    params: Dict[str, str] = field(default_factory=dict)    # 路径参数
+    headers: Mapping[str, str] = field(default_factory=dict)  # 请求头
+
+# (响应体, 状态码[, 响应头]);响应体为字典时以JSON返回,为字符串时原样返回(Content-Type由响应头指定),
+# 事件流接口返回EventSubscription,由适配层以text/event-stream推送;文件下载返回ApiFile;
+# 边下边播返回GrowingFile,由适配层边读边发送
+@dataclass
+class ApiFile:
+    """文件响应,由适配层以框架自带的文件响应发送(支持Range/If-Range)"""
+    path: str
+    filename: str
+
+ApiResponse = Union[Tuple[Union[Dict[str, Any], str, EventSubscription, ApiFile], int],
+                    Tuple[Union[Dict[str, Any], str, GrowingFile], int, Dict[str, str]]]
+
+@lru_cache(maxsize=65536)
+def _task_bvid(task_input: str) -> Optional[str]:
+    """任务输入对应的BV号(按bvid过滤时使用)"""
+    try:
+        return extract_bvid(task_input)
+    except Exception:
+        return None
+
+def _stage_durations(task: DownloadTask) -> Dict[str, float]:
+    """按阶段汇总已结束阶段的耗时(秒),PENDING即排队时间(含退回队列后的再次排队)"""
+    durations: Dict[str, float] = {}
+    for stage in task.stages:
+        if stage['duration'] is not None:
+            durations[stage['stage']] = round(durations.get(stage['stage'], 0) + stage['duration'], 3)
+    return durations
+
+def _split(value) -> list:
+    """逗号分隔的字符串或列表"""
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value or '').split(',') if v.strip()]
+
+def _parse_fields(value, default: Sequence[str]) -> Sequence[str]:
+    fields = _split(value)
+    unknown = [f for f in fields if f not in TASK_FIELDS]
+    if unknown:
+        raise ValueError(f"未知字段: {','.join(unknown)}")
+    return fields or default
+
+def _parse_status(value: str) -> TaskStatus:
+    """状态可以是枚举名(COMPLETED)或显示值(已完成)"""
+    try:
+        return TaskStatus[value.upper()]
+    except KeyError:
+        return TaskStatus(value)
+
+def _task_filter(args: Mapping[str, str]) -> Callable[[DownloadTask], bool]:
+    """根据查询参数status/bvid/created_after/created_before构造过滤条件"""
+    statuses = {_parse_status(s) for s in _split(args.get('status'))}
+    bvid = None
+    if args.get('bvid'):
+        bvid = extract_bvid(args['bvid'])
+        if not bvid:
+            raise ValueError(f"无法识别的BV号: {args['bvid']}")
+    after = datetime.fromisoformat(args['created_after']) if args.get('created_after') else None
+    before = datetime.fromisoformat(args['created_before']) if args.get('created_before') else None
+
+    def match(task: DownloadTask) -> bool:
+        if statuses and task.status not in statuses:
+            return False
+        if after and task.created_at < after:
+            return False
+        if before and task.created_at >= before:
+            return False
+        return not bvid or _task_bvid(task.input) == bvid
+    return match
+
+class APIHandlers:
+    """
+    API处理逻辑
+    不依赖具体的Web框架,由Flask(routes.APIRoutes)与aiohttp(aio_app)共用同一份路由表
+    """
+
+    # (方法, 路径, 处理函数名),路径参数使用Flask的<name>写法
+    ROUTES = [
+        ('POST', '/download', 'download'),
+        ('POST', '/download/batch', 'download_batch'),
+        ('GET', '/tasks', 'list_tasks'),
+        ('GET', '/tasks/events', 'task_events'),   # 需在/tasks/<task_id>之前注册
+        ('POST', '/tasks/query', 'query_tasks'),
+        ('POST', '/tasks/batch', 'manage_tasks'),
+        ('GET', '/tasks/changes', 'task_changes'),
+        ('GET', '/tasks/<task_id>', 'get_task'),
+        ('GET', '/tasks/<task_id>/file', 'get_task_file'),
+        ('GET', '/tasks/<task_id>/stream/<kind>', 'stream_task'),
+        ('POST', '/tasks/<task_id>/cancel', 'cancel_task'),
+        ('POST', '/tasks/<task_id>/pause', 'pause_task'),
+        ('POST', '/tasks/<task_id>/resume', 'resume_task'),
+        ('POST', '/workers/claim', 'claim_task'),
+        ('POST', '/workers/heartbeat', 'worker_heartbeat'),
+        ('POST', '/workers/tasks/<task_id>/progress', 'report_progress'),
+        ('POST', '/workers/tasks/<task_id>/complete', 'complete_leased_task'),
+        ('POST', '/workers/tasks/<task_id>/release', 'release_leased_task'),
+        ('POST', '/workers/tasks/<task_id>/pages', 'expand_leased_task'),
+        ('GET', '/disk', 'disk_reservations'),
+        ('GET', '/cache', 'resolve_cache_stats'),
+        ('GET', '/ratelimit', 'rate_limit_stats'),
+        ('GET', '/metrics', 'metrics'),
+        ('GET', '/config', 'get_config'),
+        ('PATCH', '/config', 'update_config'),
+        ('POST', '/expand', 'expand'),
+        ('GET', '/expand', 'list_expansions'),
+        ('GET', '/expand/<job_id>', 'get_expansion'),
+        ('POST', '/subscriptions', 'subscribe'),
+        ('GET', '/subscriptions', 'list_subscriptions'),
+        ('GET', '/subscriptions/<sub_id>', 'get_subscription'),
+        ('DELETE', '/subscriptions/<sub_id>', 'delete_subscription'),
+        ('POST', '/subscriptions/<sub_id>/sync', 'sync_subscription'),
+    ]
+
+    def __init__(self, task_manager: TaskManager, download_service=None, source_expander=None,
+                 subscription_service=None, runtime_config=None):
+        self.task_manager = task_manager
+        self.download_service = download_service
+        self.source_expander = source_expander
+        self.subscription_service = subscription_service
+        self.runtime_config = runtime_config
+        # 已结束任务不再变化,缓存其任务字典(LRU)
+        self._terminal_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = Lock()  # Flask模式下多个请求线程同时访问
+
+    def _etag(self) -> str:
+        """基于全局变更版本号的ETag,任务表没有变化时不变"""
+        return f'W/"{self.task_manager.epoch}-{self.task_manager.version}"'
+
+    @staticmethod
+    def _not_modified(req: ApiRequest, etag: str) -> bool:
+        tags = [t.strip() for t in req.headers.get('If-None-Match', '').split(',')]
+        return '*' in tags or etag in tags or etag[2:] in tags
+
+    def _task_to_dict(self, task: DownloadTask) -> Dict[str, Any]:
+        """任务字典,任务及其分P都已结束时按版本号缓存"""
+        with self._cache_lock:
+            cached = self._terminal_cache.get(task.task_id)
+            if cached is not None and cached["version"] == task.version:
+                self._terminal_cache.move_to_end(task.task_id)
+                return cached
+        children = self.task_manager.get_children(task.task_id)
+        # 结束状态最后写入,先读取状态可保证缓存的是完整的最终结果
+        settled = task.status in TERMINAL_STATUSES and all(c.status in TERMINAL_STATUSES for c in children)
+        data = {
+            "task_id": task.task_id,
+            "input": task.input,
+            "status": task.status.value,
+            "progress": task.progress,
+            "created_at": task.created_at.isoformat() if task.created_at else None,
+            "started_at": task.started_at.isoformat() if task.started_at else None,
+            "completed_at": task.completed_at.isoformat() if task.completed_at else None,
+            "error_message": task.error_message,
+            "estimated_bytes": task.estimated_bytes,
+            "parent_id": task.parent_id,
+            "page": task.page_index + 1,
+            "pages": [{
+                "task_id": child.task_id,
+                "page": child.page_index + 1,
+                "status": child.status.value,
+                "progress": child.progress,
+                "error_message": child.error_message
+            } for child in children],
+            "version": task.version,
+            "stages": [dict(stage) for stage in task.stages],
+            "durations": _stage_durations(task),
+            "transfers": {kind: dict(stats) for kind, stats in task.transfers.items()},
+            "cdn_host": task.cdn_host,
+            "retries": task.retries,
+            "streams": {kind: {"size": info["size"], "url": f"/tasks/{task.task_id}/stream/{kind}"}
+                        for kind, info in task.stream_files.items()}
+        }
+        with self._cache_lock:
+            if settled:
+                self._terminal_cache[task.task_id] = data
+                self._terminal_cache.move_to_end(task.task_id)
+                while len(self._terminal_cache) > TERMINAL_CACHE_SIZE:
+                    self._terminal_cache.popitem(last=False)
+            elif cached is not None:
+                # 任务不再处于结束状态(如被重新排队)时不再缓存
+                self._terminal_cache.pop(task.task_id, None)
+        return data
+
+    def _select(self, task: DownloadTask, fields: Sequence[str]) -> Dict[str, Any]:
+        data = self._task_to_dict(task)
+        return {key: data[key] for key in fields}
+
+    @staticmethod
+    def _expansion_to_dict(job: ExpansionJob) -> dict:
+        return {
+            "job_id": job.job_id,
+            "source_type": job.source_type,
+            "source_id": job.source_id,
+            "status": job.status.value,
+            "total": job.total,
+            "pages_fetched": job.pages_fetched,
+            "queued": job.queued,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+            "error_message": job.error_message
+        }
+
+    @staticmethod
+    def _subscription_to_dict(sub: Subscription) -> dict:
+        return {
+            "sub_id": sub.sub_id,
+            "source_type": sub.source_type,
+            "source_id": sub.source_id,
+            "mid": sub.mid,
+            "interval": sub.interval,
+            "watermark_bvid": sub.watermark_bvid,
+            "watermark_ts": sub.watermark_ts,
+            "queued": sub.queued,
+            "last_sync_at": sub.last_sync_at.isoformat() if sub.last_sync_at else None,
+            "last_error": sub.last_error,
+            "created_at": sub.created_at.isoformat() if sub.created_at else None
+        }
+
+    def download(self, req: ApiRequest) -> ApiResponse:
+        try:
+            data = req.json
+            video_config = VideoConfig(**data['video_config'])
+            download_config = DownloadConfig(**data['download_config'])
+            task = DownloadTask(
+                input=data['input'],
+                video_config=video_config,
+                download_config=download_config,
+                pages=data.get('pages')
+            )
+
+            task_id = self.task_manager.add_task(task)
+            return {"status": "success", "message": "任务已添加", "task_id": task_id}, 200
+        except Exception as e:
+            logging.error(f"添加任务失败: {str(e)}")
+            return {"status": "error", "message": str(e)}, 500
+
+    def download_batch(self, req: ApiRequest) -> ApiResponse:
+        """
+        批量添加任务
+        items中每一项为输入字符串,或包含input及可选pages/priority/video_config/download_config覆盖项的对象;
+        返回与items一一对应的任务ID或错误信息
+        """
+        try:
+            data = req.json
+            items = data['items']
+            if len(items) > MAX_BATCH_ITEMS:
+                return {"status": "error", "message": f"单次最多提交{MAX_BATCH_ITEMS}个任务"}, 400
+            shared_video = data.get('video_config') or {}
+            shared_download = data.get('download_config') or {}
+            shared_video_config = VideoConfig(**shared_video) if shared_video else None
+            shared_download_config = DownloadConfig(**shared_download) if shared_download else None
+        except Exception as e:
+            logging.error(f"批量添加任务失败: {str(e)}")
+            return {"status": "error", "message": str(e)}, 400
+
+        tasks, results = [], []
+        for item in items:
+            try:
+                if isinstance(item, str):
+                    item = {"input": item}
+                if not item.get('input'):
+                    raise ValueError("缺少input")
+                # 没有覆盖项的条目共用同一个配置对象
+                video_config = (VideoConfig(**{**shared_video, **item['video_config']})
+                                if item.get('video_config') else shared_video_config)
+                download_config = (DownloadConfig(**{**shared_download, **item['download_config']})
+                                   if item.get('download_config') else shared_download_config)
+                if video_config is None or download_config is None:
+                    raise ValueError("缺少video_config或download_config")
+                task = DownloadTask(
+                    input=item['input'],
+                    video_config=video_config,
+                    download_config=download_config,
+                    pages=item.get('pages', data.get('pages')),
+                    priority=int(item.get('priority', 0))
+                )
+                tasks.append(task)
+                results.append({"task_id": task.task_id})
+            except Exception as e:
+                results.append({"error": str(e)})
+
+        self.task_manager.add_tasks(tasks)
+        return {
+            "status": "success",
+            "accepted": len(tasks),
+            "rejected": len(results) - len(tasks),
+            "results": results
+        }, 200
+
+    def list_tasks(self, req: ApiRequest) -> ApiResponse:
+        """
+        分页获取任务列表(按创建顺序)
+        查询参数: status(逗号分隔) bvid created_after/created_before(ISO时间) fields(逗号分隔)
+        limit cursor(上一页返回的next_cursor);If-None-Match与当前ETag相同时返回304
+        """
+        etag = self._etag()
+        if self._not_modified(req, etag):
+            return {}, 304, {"ETag": etag}
+        try:
+            fields = _parse_fields(req.args.get('fields'), LIST_FIELDS)
+            match = _task_filter(req.args)
+            limit = int(req.args.get('limit', TASK_PAGE_LIMIT))
+            if not 1 <= limit <= MAX_TASK_PAGE_LIMIT:
+                raise ValueError(f"limit需在1~{MAX_TASK_PAGE_LIMIT}之间")
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}, 400
+
+        cursor = req.args.get('cursor')
+        if cursor and not self.task_manager.get_task(cursor):
+            return {"status": "error", "message": "无效的cursor"}, 400
+        page = list(islice((task for task in self.task_manager.iter_tasks(after=cursor) if match(task)), limit + 1))
+        next_cursor = page[limit - 1].task_id if len(page) > limit else None
+        return {
+            "status": "success",
+            "tasks": [self._select(task, fields) for task in page[:limit]],
+            "next_cursor": next_cursor
+        }, 200, {"ETag": etag}
+
+    def query_tasks(self, req: ApiRequest) -> ApiResponse:
+        """按ID批量查询任务,返回顺序与task_ids一致,不存在的ID列在missing中"""
+        task_ids = _split(req.json.get('task_ids'))
+        if len(task_ids) > MAX_BATCH_ITEMS:
+            return {"status": "error", "message": f"单次最多查询{MAX_BATCH_ITEMS}个任务"}, 400
+        try:
+            fields = _parse_fields(req.json.get('fields'), TASK_FIELDS)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}, 400
+        tasks, missing = [], []
+        for task_id in task_ids:
+            task = self.task_manager.get_task(task_id)
+            if task:
+                tasks.append(self._select(task, fields))
+            else:
+                missing.append(task_id)
+        return {"status": "success", "tasks": tasks, "missing": missing}, 200
+
+    def manage_tasks(self, req: ApiRequest) -> ApiResponse:
+        """批量暂停/恢复/取消: {"action": pause/resume/cancel, "task_ids": [...]},返回各任务是否操作成功"""
+        operations = {
+            'pause': self.task_manager.pause_task,
+            'resume': self.task_manager.resume_task,
+            'cancel': self.task_manager.cancel_task
+        }
+        operation = operations.get(req.json.get('action'))
+        if operation is None:
+            return {"status": "error", "message": f"不支持的操作: {req.json.get('action')}"}, 400
+        task_ids = _split(req.json.get('task_ids'))
+        if len(task_ids) > MAX_BATCH_ITEMS:
+            return {"status": "error", "message": f"单次最多操作{MAX_BATCH_ITEMS}个任务"}, 400
+        return {"status": "success", "results": {task_id: operation(task_id) for task_id in task_ids}}, 200
+
+    def task_changes(self, req: ApiRequest) -> ApiResponse:
+        """
+        增量同步: 返回版本号since之后变化过的任务
+        客户端保存响应中的epoch与version,下次请求带上since=<version>&epoch=<epoch>;
+        响应snapshot为true时tasks为全部任务(首次请求或服务器重启),客户端应整体替换本地副本
+        """
+        try:
+            fields = _parse_fields(req.args.get('fields'), TASK_FIELDS)
+            since = int(req.args['since']) if req.args.get('since') else None
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}, 400
+        if req.args.get('epoch') and req.args['epoch'] != self.task_manager.epoch:
+            since = None
+        tasks, version, snapshot = self.task_manager.changes_since(since)
+        return {
+            "status": "success",
+            "epoch": self.task_manager.epoch,
+            "version": version,
+            "snapshot": snapshot,
+            "tasks": [self._select(task, fields) for task in tasks]
+        }, 200
+
+    def task_events(self, req: ApiRequest) -> ApiResponse:
+        """
+        任务事件流(SSE)
+        查询参数task_ids(逗号分隔)只推送指定任务;重连时带上Last-Event-ID请求头
+        (或last_event_id查询参数)只补发错过的事件
+        """
+        last_event_id = req.headers.get('Last-Event-ID') or req.args.get('last_event_id')
+        task_ids = {t for t in req.args.get('task_ids', '').split(',') if t} or None
+        try:
+            return EventSubscription(self.task_manager.events, last_event_id, task_ids), 200
+        except ValueError:
+            return {"status": "error", "message": "非法的Last-Event-ID"}, 400
+
+    def get_task(self, req: ApiRequest) -> ApiResponse:
+        task = self.task_manager.get_task(req.params['task_id'])
+        if not task:
+            return {"status": "error", "message": "任务不存在"}, 404
+        etag = self._etag()
+        if self._not_modified(req, etag):
+            return {}, 304, {"ETag": etag}
+        try:
+            fields = _parse_fields(req.args.get('fields'), TASK_FIELDS)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}, 400
+        return {"status": "success", "task": self._select(task, fields)}, 200, {"ETag": etag}
+
+    def get_task_file(self, req: ApiRequest) -> ApiResponse:
+        """下载已完成任务的输出文件"""
+        task = self.task_manager.get_task(req.params['task_id'])
+        if not task:
+            return {"status": "error", "message": "任务不存在"}, 404
+        if task.child_ids:
+            return {"status": "error", "message": "多P任务请分别下载各分P",
+                    "pages": list(task.child_ids)}, 409
+        if task.status != TaskStatus.COMPLETED:
+            return {"status": "error", "message": f"任务尚未完成: {task.status.value}"}, 409
+        if not task.output_path or not os.path.isfile(task.output_path):
+            # 由工作节点下载的任务,文件在工作节点上
+            return {"status": "error", "message": "输出文件不在本服务器上"}, 404
+        return ApiFile(task.output_path, os.path.basename(task.output_path)), 200
+
+    def stream_task(self, req: ApiRequest) -> ApiResponse:
+        """
+        边下边播: 读取正在下载的视频/音频流(分片MP4),支持Range,
+        请求的区间尚未下载到时阻塞等待;任务完成后返回混流后的输出文件
+        """
+        task = self.task_manager.get_task(req.params['task_id'])
+        if not task:
+            return {"status": "error", "message": "任务不存在"}, 404
+        if task.status == TaskStatus.COMPLETED and task.output_path and os.path.isfile(task.output_path):
+            return ApiFile(task.output_path, os.path.basename(task.output_path)), 200
+        info = task.stream_files.get(req.params['kind'])
+        if not info:
+            return {"status": "error", "message": "任务没有该流或尚未开始下载"}, 404
+        if task.status in (TaskStatus.FAILED, TaskStatus.CANCELLED):
+            return {"status": "error", "message": f"任务已结束: {task.status.value}"}, 409
+        size = info['size']
+        if size <= 0:
+            return {"status": "error", "message": "流大小未知,无法边下边播"}, 409
+        try:
+            byte_range = parse_range(req.headers.get('Range'), size)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}, 416, {"Content-Range": f"bytes */{size}"}
+        start, end = byte_range or (0, size - 1)
+
+        task_id = req.params['task_id']
+        def is_alive() -> bool:
+            current = self.task_manager.get_task(task_id)
+            return current is not None and current.status not in TERMINAL_STATUSES
+
+        headers = {
+            # DASH流为分片MP4(video/audio_temp_*.m4s),不支持DASH的视频为FLV
+            "Content-Type": 'video/x-flv' if info['path'].endswith('.flv') else f"{req.params['kind']}/mp4",
+            "Content-Length": str(end - start + 1),
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "no-cache"
+        }
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return GrowingFile(info['path'], start, end, is_alive), 206 if byte_range else 200, headers
+
+    def cancel_task(self, req: ApiRequest) -> ApiResponse:
+        if self.task_manager.cancel_task(req.params['task_id']):
+            return {"status": "success", "message": "任务已取消"}, 200
+        return {"status": "error", "message": "无法取消任务"}, 400
+
+    def pause_task(self, req: ApiRequest) -> ApiResponse:
+        if self.task_manager.pause_task(req.params['task_id']):
+            return {"status": "success", "message": "任务已暂停"}, 200
+        return {"status": "error", "message": "无法暂停任务"}, 400
+
+    def resume_task(self, req: ApiRequest) -> ApiResponse:
+        if self.task_manager.resume_task(req.params['task_id']):
+            return {"status": "success", "message": "任务已恢复"}, 200
+        return {"status": "error", "message": "无法恢复任务"}, 400
+
+    def claim_task(self, req: ApiRequest) -> ApiResponse:
+        data = req.json
+        worker_id = data.get('worker_id')
+        if not worker_id:
+            return {"status": "error", "message": "缺少worker_id"}, 400
+        lease_seconds = float(data.get('lease_seconds', DEFAULT_LEASE_SECONDS))
+        task = self.task_manager.claim_task(worker_id, lease_seconds)
+        if not task:
+            return {"status": "success", "task": None}, 200
+        return {
+            "status": "success",
+            "task": {
+                "task_id": task.task_id,
+                "input": task.input,
+                "priority": task.priority,
+                "progress": task.progress,
+                "video_config": vars(task.video_config),
+                "download_config": vars(task.download_config),
+                "pages": task.pages,
+                "page_index": task.page_index,
+                "parent_id": task.parent_id,
+                "lease_expires_at": task.lease_expires_at.isoformat()
+            }
+        }, 200
+
+    def worker_heartbeat(self, req: ApiRequest) -> ApiResponse:
+        data = req.json
+        lost = self.task_manager.heartbeat(
+            data.get('worker_id'),
+            data.get('task_ids', []),
+            float(data.get('lease_seconds', DEFAULT_LEASE_SECONDS))
+        )
+        return {"status": "success", "lost": lost}, 200
+
+    def report_progress(self, req: ApiRequest) -> ApiResponse:
+        data = req.json
+        updates = {k: data[k] for k in ('progress', 'status') if k in data}
+        if self.task_manager.report_progress(
+            req.params['task_id'],
+            data.get('worker_id'),
+            float(data.get('lease_seconds', DEFAULT_LEASE_SECONDS)),
+            **updates
+        ):
+            transfer = data.get('transfer')
+            if isinstance(transfer, dict) and transfer.get('kind'):
+                self.task_manager.record_transfer(req.params['task_id'], transfer['kind'],
+                                                  transfer.get('stats') or {})
+            return {"status": "success"}, 200
+        return {"status": "error", "message": "租约已失效或参数非法"}, 409
+
+    def complete_leased_task(self, req: ApiRequest) -> ApiResponse:
+        data = req.json
+        if self.task_manager.complete_leased_task(
+            req.params['task_id'],
+            data.get('worker_id'),
+            bool(data.get('success')),
+            data.get('error_message')
+        ):
+            return {"status": "success"}, 200
+        return {"status": "error", "message": "租约已失效"}, 409
+
+    def release_leased_task(self, req: ApiRequest) -> ApiResponse:
+        if self.task_manager.release_lease(req.params['task_id'], req.json.get('worker_id')):
+            return {"status": "success"}, 200
+        return {"status": "error", "message": "租约已失效"}, 409
+
+    def expand_leased_task(self, req: ApiRequest) -> ApiResponse:
+        data = req.json
+        child_ids = self.task_manager.expand_leased_task(
+            req.params['task_id'],
+            data.get('worker_id'),
+            [int(i) for i in data.get('page_indices', [])]
+        )
+        if child_ids is None:
+            return {"status": "error", "message": "租约已失效"}, 409
+        return {"status": "success", "child_ids": child_ids}, 200
+
+    def disk_reservations(self, req: ApiRequest) -> ApiResponse:
+        return {
+            "status": "success",
+            "min_free_bytes": self.task_manager.disk.min_free_bytes,
+            "filesystems": self.task_manager.disk.snapshot()
+        }, 200
+
+    def resolve_cache_stats(self, req: ApiRequest) -> ApiResponse:
+        if not self.download_service:
+            return {"status": "error", "message": "本服务器未启用下载服务"}, 404
+        return {
+            "status": "success",
+            "cache": self.download_service.video_service.cache.stats()
+        }, 200
+
+    def rate_limit_stats(self, req: ApiRequest) -> ApiResponse:
+        return {
+            "status": "success",
+            "ratelimit": api_guard.stats()
+        }, 200
+
+    def metrics(self, req: ApiRequest) -> ApiResponse:
+        """Prometheus文本格式的指标,任务数与槽位占用在抓取时统计"""
+        stats = self.task_manager.queue_stats()
+        metrics.tasks.replace({(status.name,): count for status, count in stats["by_status"].items()})
+        metrics.slots_used.set(stats["running"])
+        metrics.slots_total.set(stats["max_concurrent"])
+        metrics.leased_tasks.set(stats["leased"])
+        return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+    def get_config(self, req: ApiRequest) -> ApiResponse:
+        """运行时可调整的配置项的当前值"""
+        if not self.runtime_config:
+            return {"status": "error", "message": "本服务器不支持运行时调整配置"}, 404
+        return {"status": "success", "config": self.runtime_config.get()}, 200
+
+    def update_config(self, req: ApiRequest) -> ApiResponse:
+        """
+        调整配置(如{"max_concurrent_downloads": 8, "bandwidth_limit": "20M"}),立即生效,不中断正在下载的任务
+        只修改运行中的配置,重启后恢复配置文件中的值
+        """
+        if not self.runtime_config:
+            return {"status": "error", "message": "本服务器不支持运行时调整配置"}, 404
+        if not req.json:
+            return {"status": "error", "message": "请提供要调整的配置项"}, 400
+        try:
+            changed = self.runtime_config.update(req.json)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}, 400
+        return {"status": "success", "changed": changed, "config": self.runtime_config.get()}, 200
+
+    def expand(self, req: ApiRequest) -> ApiResponse:
+        try:
+            data = req.json
+            job = ExpansionJob(
+                source_type=data['source_type'],
+                source_id=str(data['source_id']),
+                mid=str(data['mid']) if data.get('mid') else None,
+                video_config=VideoConfig(**data['video_config']),
+                download_config=DownloadConfig(**data['download_config'])
+            )
+            job_id = self.source_expander.submit(job)
+            return {"status": "success", "message": "展开任务已添加", "job_id": job_id}, 200
+        except Exception as e:
+            logging.error(f"添加展开任务失败: {str(e)}")
+            return {"status": "error", "message": str(e)}, 400
+
+    def list_expansions(self, req: ApiRequest) -> ApiResponse:
+        return {
+            "status": "success",
+            "jobs": [self._expansion_to_dict(job) for job in self.source_expander.list_jobs()]
+        }, 200
+
+    def get_expansion(self, req: ApiRequest) -> ApiResponse:
+        job = self.source_expander.get_job(req.params['job_id'])
+        if not job:
+            return {"status": "error", "message": "展开任务不存在"}, 404
+        result = self._expansion_to_dict(job)
+        result["task_ids"] = job.task_ids
+        return {"status": "success", "job": result}, 200
+
+    def subscribe(self, req: ApiRequest) -> ApiResponse:
+        try:
+            data = req.json
+            sub = Subscription(
+                source_type=data['source_type'],
+                source_id=str(data['source_id']),
+                mid=str(data['mid']) if data.get('mid') else None,
+                interval=int(data.get('interval') or 3600),
+                backfill=bool(data.get('backfill', False)),
+                video_config=VideoConfig(**data['video_config']),
+                download_config=DownloadConfig(**data['download_config'])
+            )
+            sub_id = self.subscription_service.subscribe(sub)
+            return {"status": "success", "message": "订阅已添加", "sub_id": sub_id}, 200
+        except Exception as e:
+            logging.error(f"添加订阅失败: {str(e)}")
+            return {"status": "error", "message": str(e)}, 400
+
+    def list_subscriptions(self, req: ApiRequest) -> ApiResponse:
+        return {
+            "status": "success",
+            "subscriptions": [self._subscription_to_dict(sub) for sub in self.subscription_service.store.list()]
+        }, 200
+
+    def get_subscription(self, req: ApiRequest) -> ApiResponse:
+        sub = self.subscription_service.store.get(req.params['sub_id'])
+        if not sub:
+            return {"status": "error", "message": "订阅不存在"}, 404
+        return {"status": "success", "subscription": self._subscription_to_dict(sub)}, 200
+
+    def delete_subscription(self, req: ApiRequest) -> ApiResponse:
+        if self.subscription_service.unsubscribe(req.params['sub_id']):
+            return {"status": "success"}, 200
+        return {"status": "error", "message": "订阅不存在"}, 404
+
+    def sync_subscription(self, req: ApiRequest) -> ApiResponse:
+        if self.subscription_service.sync_now(req.params['sub_id']):
+            return {"status": "success", "message": "同步已开始"}, 200
+        return {"status": "error", "message": "订阅不存在"}, 404
@@ -1,44 +1,125 @@
+import asyncio
 from flask import Flask
 from pathlib import Path
 from src.service.task_manager import TaskManager
-from src.service.config_manager import UnifiedConfigManager 
-from src.server.download_service import DownloadService  
-from src.server.routes import APIRoutes  
+from src.service.config_manager import UnifiedConfigManager
+from src.server.download_service import DownloadService
+from src.server.api_handlers import APIHandlers
+from src.server.routes import APIRoutes
+from src.server.aio_app import create_aio_app
+from src.server.source_expander import SourceExpander
+from src.server.runtime_config import RuntimeConfig
+from src.server.subscription_service import SubscriptionService
+from src.service.subscription_store import SubscriptionStore
 from src.common.logger import get_logger
 
+SERVER_MODES = ('aiohttp', 'flask')
+
 class ApplicationFactory:
-    """应用工厂类，封装Flask应用创建逻辑"""
-    
+    """应用工厂类，封装应用创建逻辑(aiohttp异步服务器或Flask开发服务器)"""
+
     def __init__(self,config_path: str = None,**overrides):
         _template ={
             'host': '0.0.0.0',
             'port': 5000,
             'log_level': 'INFO',
             'log_dir': str(Path('logs') / 'server'),
-            'cache_dir': "cache",   
+            'cache_dir': "cache",
             'download_dir': "download",
-            'config_dir': str(Path('configs') / 'server')
+            'config_dir': str(Path('configs') / 'server'),
+            'server_mode': 'aiohttp',
+            'local_worker': True,
+            'prefetch_depth': 8,
+            'resolver_concurrency': 4,
+            'max_concurrent_downloads': 3,
+            'bandwidth_limit': 0,                           # 字节/秒,支持K/M/G后缀,0表示不限速
+            'max_retries': 3,
+            'retry_backoff': 1.0,
+            'resolve_cache_size': 2048,
+            'subscription_db': 'subscriptions.db',          # 相对于config_dir
+            'checkpoint_file': 'tasks_checkpoint.json'      # 相对于config_dir
         }
         self.logger = get_logger(__name__)
-        self.app = Flask(__name__)
         self.config_manager = UnifiedConfigManager(_template,config_path)
         self.config = self.config_manager.apply_overrides(overrides)
+        self.checkpoint_file = str(Path(self.config['config_dir']) / self.config['checkpoint_file'])
         self.task_manager = TaskManager()
+        self.task_manager.restore(self.checkpoint_file)
+        self._scheduler = None
         self._initialize_services()
-        self._register_routes()
-    
+        self.handlers = APIHandlers(self.task_manager, self.download_service, self.source_expander,
+                                    self.subscription_service, self.runtime_config)
+
     def _initialize_services(self):
-        """初始化核心服务"""
-        self.download_service = DownloadService(self.task_manager)
-        self.download_service.start_worker()
+        """初始化核心服务(由具体的服务器模式启动)"""
+        self.download_service = DownloadService(
+            self.task_manager,
+            prefetch_depth=int(self.config['prefetch_depth']),
+            resolver_concurrency=int(self.config['resolver_concurrency'])
+        )
+        self.source_expander = SourceExpander(self.task_manager)
+        self.subscription_service = SubscriptionService(
+            self.task_manager,
+            SubscriptionStore(str(Path(self.config['config_dir']) / self.config['subscription_db'])),
+            self.source_expander
+        )
+        # 槽位数/带宽/重试/缓存大小可通过PATCH /config或修改配置文件在运行时调整
+        self.runtime_config = RuntimeConfig(self.task_manager, self.download_service)
+        self.runtime_config.load(self.config)
         self.logger.info("初始化核心服务成功")
-    
-    def _register_routes(self):
-        """注册API路由"""
-        APIRoutes(self.app, self.task_manager)
-        self.logger.info("注册API路由成功")
-    
+
+    def checkpoint(self) -> None:
+        """保存未结束的任务,下次启动时恢复"""
+        try:
+            self.task_manager.checkpoint(self.checkpoint_file)
+        except Exception as e:
+            self.logger.error(f"保存任务检查点失败: {str(e)}")
+
     def create_app(self):
-        """获取配置完成的Flask应用"""
+        """获取配置完成的Flask应用,后台服务各自在线程中运行"""
+        self.source_expander.start()
+        self.subscription_service.start()
+        self.runtime_config.watch(self.config_manager)
+        if self.config.get('local_worker', True):
+            self.download_service.start_worker()
+        else:
+            self.logger.info("未启用本地下载,任务将由工作节点(btool-worker)领取")
+        app = Flask(__name__)
+        APIRoutes(app, self.handlers)
         self.logger.info("创建Flask应用成功")
-        return self.app
\ No newline at end of file
+        return app
+
+    def shutdown(self) -> None:
+        """Flask模式退出时中断下载并保存检查点"""
+        self.runtime_config.stop()
+        try:
+            self.download_service.stop()
+        except Exception as e:
+            self.logger.error(f"停止下载服务失败: {str(e)}")
+        self.checkpoint()
+
+    def create_aio_app(self):
+        """获取aiohttp应用,API处理、下载调度与来源展开共用同一个事件循环"""
+        app = create_aio_app(self.handlers)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        self.logger.info("创建aiohttp应用成功")
+        return app
+
+    async def _on_startup(self, app) -> None:
+        self.source_expander.start(asyncio.get_running_loop())
+        self.subscription_service.start()
+        self.runtime_config.watch(self.config_manager)
+        if self.config.get('local_worker', True):
+            self._scheduler = asyncio.create_task(self.download_service.run())
+            self.logger.info("下载调度启动成功")
+        else:
+            self.logger.info("未启用本地下载,任务将由工作节点(btool-worker)领取")
+
+    async def _on_shutdown(self, app) -> None:
+        """优雅退出: 停止调度,中断正在下载的任务并保存检查点"""
+        self.runtime_config.stop()
+        if self._scheduler:
+            await self.download_service.shutdown()
+            await asyncio.gather(self._scheduler, return_exceptions=True)
+        self.checkpoint()
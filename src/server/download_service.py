@@ -1,68 +1,218 @@
 import asyncio
 import threading
-import os
-from time import time
-from bilibili_api import video
-from src.common.models import DownloadTask,TaskStatus  
-from src.service.download import Downloader  
-from src.service.task_manager import TaskManager
-from src.common.utils import sanitize_filename, mix_streams  
-from src.server.video_service import VideoService  
+from time import monotonic, time
+from typing import Dict
+from src.common.models import DownloadTask,TaskStatus
+from src.service.download import Downloader, DownloadError, TransferStats
+from src.service.metrics import metrics
+from src.service.task_manager import TaskManager, TaskHeldError
+from src.common.utils import mix_streams, parse_page_selection
+from src.server.video_service import VideoService
+from src.server.resolver import StreamResolver, Resolution, DEFAULT_PREFETCH_DEPTH, DEFAULT_RESOLVER_CONCURRENCY
 from src.common.logger import get_logger
 
 class DownloadService:
-    def __init__(self, task_manager:TaskManager):
+    def __init__(self, task_manager:TaskManager,
+                 prefetch_depth: int = DEFAULT_PREFETCH_DEPTH,
+                 resolver_concurrency: int = DEFAULT_RESOLVER_CONCURRENCY):
         self.task_manager = task_manager
         self.downloader = Downloader()
         self.video_service = VideoService()
+        self.resolver = StreamResolver(task_manager, self.video_service, self.downloader,
+                                       prefetch_depth=prefetch_depth,
+                                       concurrency=resolver_concurrency)
         self.worker_thread = None
+        self.loop = None
+        self._stopping = False
+        self._running: Dict[str, asyncio.Task] = {}
+        self._aborted = set()  # 租约被收回而中断的任务
         self.logger = get_logger(__name__)
         self.logger.info("DownloadService初始化成功")
-    
+
     def start_worker(self):
         """启动下载工作线程"""
         self.worker_thread = threading.Thread(target=self._download_worker, daemon=True)
         self.worker_thread.start()
         self.logger.info("下载工作线程启动成功")
-    
+
     def _download_worker(self):
         """下载工作线程"""
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        
-        while True:
-            tasks = []
-            # 获取多个任务，直到达到最大并发下载数
-            while len(tasks) < self.task_manager.get_max_concurrent_downloads():
-                task = self.task_manager.get_next_task()
-                if task:
-                    tasks.append(task)
+        loop.run_until_complete(self.run())
+
+    async def run(self):
+        """
+        调度主循环
+        解析阶段(StreamResolver)独立于下载槽位预解析队列中的任务,
+        槽位空出后立即领取下一个任务,不必等待同批任务全部结束
+        """
+        self.loop = asyncio.get_running_loop()
+        resolver_task = asyncio.create_task(self.resolver.run())
+        lag_task = asyncio.create_task(self._monitor_loop_lag())
+        running = self._running
+        try:
+            while not self._stopping:
+                # 获取任务，直到达到最大并发下载数
+                # 工作节点领取任务要请求协调服务器,放到线程池中执行,不阻塞正在进行的下载
+                while True:
+                    task = await asyncio.to_thread(self.task_manager.get_next_task)
+                    if not task:
+                        break
+                    running[task.task_id] = asyncio.create_task(self._run_task(task))
+
+                if running:
+                    done, _ = await asyncio.wait(running.values(), timeout=1, return_when=asyncio.FIRST_COMPLETED)
+                    for task_id in [task_id for task_id, job in running.items() if job in done]:
+                        del running[task_id]
                 else:
-                    break
-            
-            if tasks:
-                try:
-                    # 使用asyncio.gather并发执行多个任务
-                    results = loop.run_until_complete(asyncio.gather(*[self.download_core(task) for task in tasks], return_exceptions=True))
-                    for task, result in zip(tasks, results):
-                        if isinstance(result, Exception):
-                            self.task_manager.complete_task(task.task_id, False, str(result))
-                        else:
-                            self.task_manager.complete_task(task.task_id, True)
-                except Exception as e:
-                    for task in tasks:
-                        self.task_manager.complete_task(task.task_id, False, str(e))
-            else:
-                # 如果没有任务，等待一段时间再检查
-                loop.run_until_complete(asyncio.sleep(1))
+                    # 如果没有任务，等待一段时间再检查
+                    await asyncio.sleep(1)
+        finally:
+            resolver_task.cancel()
+            lag_task.cancel()
+
+    async def _monitor_loop_lag(self, interval: float = 0.5) -> None:
+        """测量事件循环延迟: 定时唤醒的实际时间与预期时间之差"""
+        while True:
+            started = monotonic()
+            await asyncio.sleep(interval)
+            metrics.loop_lag.set(max(0.0, monotonic() - started - interval))
+
+    async def shutdown(self):
+        """
+        停止调度并中断正在下载的任务
+        已下载的部分保留在缓存目录中(续传记录按文件路径保存),任务状态留给检查点处理
+        """
+        self._stopping = True
+        jobs = list(self._running.values())
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+        self._running.clear()
+        await self.downloader.close()
+        self.logger.info(f"下载服务已停止,中断{len(jobs)}个任务")
+
+    def stop(self, timeout: float = 30):
+        """停止工作线程中的调度(线程安全)"""
+        if self.loop and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(timeout)
+
+    def abort_task(self, task_id: str) -> None:
+        """
+        中断正在下载的任务(线程安全),用于租约被协调服务器收回时:
+        任务已由其他节点接手,继续下载会与其写入同一个临时文件
+        """
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._abort_job, task_id)
+
+    def _abort_job(self, task_id: str) -> None:
+        job = self._running.get(task_id)
+        if job and not job.done():
+            self._aborted.add(task_id)
+            job.cancel()
+
+    async def _run_task(self, task: DownloadTask) -> None:
+        """执行单个任务并提交结果"""
+        try:
+            await self.download_core(task)
+        except TaskHeldError:
+            # 任务已退回队列等待,不计为失败
+            return
+        except asyncio.CancelledError:
+            self.logger.info(f"任务{task.task_id}被中断")
+            if task.task_id in self._aborted:
+                # 释放本地槽位与磁盘预留,临时文件留给接手的节点
+                self._aborted.discard(task.task_id)
+                self.task_manager.complete_task(task.task_id, False, "租约已失效")
+                return
+            raise
+        except Exception as e:
+            metrics.task_failures.inc(error=type(e).__name__)
+            self.video_service.invalidate_playurl(task.input)
+            self.task_manager.complete_task(task.task_id, False, str(e))
+        else:
+            if not task.child_ids:
+                # 多P父任务由子任务汇总结果
+                self.task_manager.complete_task(task.task_id, True)
 
     def _update_progress(self, task: DownloadTask, **kwargs):
         """更新任务进度到管理器"""
         #if time() - task.last_updated < 0.3:  # 每300ms更新一次
             #return
         #task.last_updated = time()
-        self.task_manager.update_task(task.task_id,**kwargs)         
-    
+        self.task_manager.update_task(task.task_id,**kwargs)
+
+    async def _reserve_disk_space(self, task: DownloadTask, resolution: Resolution) -> None:
+        """按所选流的实际大小预留磁盘空间,空间不足时将任务退回队列等待"""
+        self.logger.debug(f"任务{task.task_id}预计占用{resolution.stream_bytes}字节")
+        if not self.task_manager.reserve_disk_space(
+                task.task_id,
+                resolution.stream_bytes,
+                [path for _, _, path in resolution.streams],
+                resolution.output):
+            self.task_manager.hold_task(task.task_id)
+            raise TaskHeldError(f"磁盘空间不足,任务{task.task_id}等待空间释放")
+
+    async def _expand_pages(self, task: DownloadTask) -> None:
+        """多P视频: 按分P选择展开为子任务,父任务随即释放下载槽位"""
+        self.task_manager.update_task(task.task_id, status=TaskStatus.PARSING.name)
+        info = await self.video_service.get_video_info(task.input)
+        page_indices = parse_page_selection(task.pages, len(info.get('pages') or [info]))
+        if not page_indices:
+            raise ValueError(f"分P选择为空: {task.pages}")
+        task.child_ids = await asyncio.to_thread(self.task_manager.add_child_tasks, task.task_id, page_indices)
+        self.logger.info(f"视频{task.input}共选择{len(page_indices)}个分P")
+
+    @staticmethod
+    def _stream_stage(kind: str) -> TaskStatus:
+        return TaskStatus.DOWNLOADING_VIDEO if kind == 'video' else TaskStatus.DOWNLOADING_AUDIO
+
+    async def _download_stream(self, task: DownloadTask, resolution: Resolution, kind: str, url: str, path: str,
+                               progress_callback) -> None:
+        """下载一条流并记录传输统计"""
+        stage = self._stream_stage(kind)
+        self.logger.info(f"正在下载视频 {resolution.title} 的{'视频' if kind == 'video' else '音频'}流")
+        started = monotonic()
+        stats = TransferStats()
+        success, error_msg = await self.downloader.download(
+            url,
+            path,
+            progress_callback=progress_callback,
+            stats=stats)
+        self.task_manager.record_transfer(task.task_id, kind, stats.to_dict())
+        if not success:
+            raise DownloadError(error_msg)
+        metrics.stage_duration.observe(monotonic() - started, stage=stage.name)
+
+    async def _download_streams_together(self, task: DownloadTask, resolution: Resolution) -> None:
+        """
+        边下边播: 音视频流同时下载
+        每条流仍按顺序单连接写入,初始化段与索引(sidx)最先落盘,播放器可以从头开始读取;
+        进度按两条流的字节数加权汇总
+        """
+        sizes = resolution.stream_sizes
+        total = sum(sizes.values()) or 1
+        percents = {kind: 0.0 for kind, _, _ in resolution.streams}
+
+        def on_progress(kind):
+            def callback(progress: float):
+                percents[kind] = progress
+                self._update_progress(task, progress=sum(
+                    percents[k] * sizes.get(k, 0) for k in percents) / total)
+            return callback
+
+        self._update_progress(task, status=TaskStatus.DOWNLOADING_VIDEO.name)
+        jobs = [asyncio.create_task(self._download_stream(task, resolution, kind, url, path, on_progress(kind)))
+                for kind, url, path in resolution.streams]
+        try:
+            await asyncio.gather(*jobs)
+        finally:
+            # 一条流失败或任务被中断时,停止另一条
+            for job in jobs:
+                job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+
     async def download_core(self, task: DownloadTask) -> None:
         """核心下载逻辑"""
         #解析数据
@@ -70,75 +220,37 @@ class DownloadService:
         self.logger.info(f"开始下载: {bvid}")
         self.logger.debug(f"下载配置{task.download_config}")
         self.logger.debug(f"视频配置{task.video_config}")
-        
-        self.task_manager.update_task(task.task_id,status=TaskStatus.PARSING.name)
-        download_video = video.Video(bvid=bvid)
-        downloadUrlData = await download_video.get_download_url(0)
-        Detecter = video.VideoDownloadURLDataDetecter(data=downloadUrlData)
-        downloadVideoInfo = await download_video.get_info()
-        downloadVideoName = downloadVideoInfo["title"]
+
+        if task.pages and not task.parent_id:
+            await self._expand_pages(task)
+            return
+
+        resolution = self.resolver.take(task.task_id)
+        if resolution:
+            self.logger.debug("使用预解析结果")
+        else:
+            self.task_manager.update_task(task.task_id,status=TaskStatus.PARSING.name)
+            resolution = await self.resolver.resolve(task)
         self.logger.debug("解析数据成功")
-        self.logger.info(f"视频名称:{downloadVideoName}")
-        
-        #合成临时文件名
-        fileName = sanitize_filename(downloadVideoName) + '.mp4'
-        tempFlv = os.path.join(task.download_config.cache_dir, f"flv_temp_{task.task_id}.flv")
-        tempAudio = os.path.join(task.download_config.cache_dir, f"audio_temp_{task.task_id}.m4s")
-        tempVideo = os.path.join(task.download_config.cache_dir, f"video_temp_{task.task_id}.m4s")
-        output = os.path.join(task.download_config.download_dir, fileName)
-        
-        #获取流链接   
-        videoUrl, audioUrl = await self.video_service.select_stream(Detecter, task.video_config)
-        self.logger.debug('获取流链接成功')
-        
-        if Detecter.check_flv_mp4_stream():
-
-            self.logger.info(f"正在下载视频{downloadVideoName} 的Flv文件")
-            self._update_progress(task,status = TaskStatus.DOWNLOADING_VIDEO.name)
-            success, error_msg = await self.downloader.download(
-                videoUrl, 
-                tempFlv, 
-                progress_callback=lambda progress: self._update_progress(task, progress=progress))
-            if not success:
-                raise Exception(error_msg)
-            
-            self.logger.debug('混流开始')
-            self._update_progress(task,status=TaskStatus.MERGING.name)
-            await mix_streams(tempFlv, '', output)
+        self.logger.info(f"视频名称:{resolution.title}")
+
+        #磁盘空间准入
+        await self._reserve_disk_space(task, resolution)
+
+        self.task_manager.set_stream_files(task.task_id, {
+            kind: {"path": path, "size": resolution.stream_sizes.get(kind, 0)}
+            for kind, _, path in resolution.streams
+        })
+        if task.download_config.progressive and len(resolution.streams) > 1:
+            await self._download_streams_together(task, resolution)
         else:
-            if task.video_config.audio_only == 'True':
-                self.logger.info("仅下载音频模式")
-                self.logger.info(f"正在下载视频 {downloadVideoName} 的音频流")
-                self._update_progress(task,status = TaskStatus.DOWNLOADING_AUDIO.name)
-                success, error_msg = await self.downloader.download(
-                    audioUrl, 
-                    tempAudio, 
-                    progress_callback=lambda progress: self._update_progress(task, progress=progress))
-                if not success:
-                    raise Exception(error_msg)
-                
-                self.logger.debug('混流开始')
-                self._update_progress(task,status=TaskStatus.MERGING.name)
-                await mix_streams('', tempAudio, output)
-            else:
-                self._update_progress(task, status = TaskStatus.DOWNLOADING_VIDEO.name)
-                self.logger.info(f"正在下载视频 {downloadVideoName} 的视频流")
-                success, error_msg = await self.downloader.download(
-                    videoUrl, 
-                    tempVideo, 
-                    progress_callback=lambda progress: self._update_progress(task, progress=progress))
-                if not success:
-                    raise Exception(error_msg)     
-                           
-                self._update_progress(task, status=TaskStatus.DOWNLOADING_AUDIO.name)
-                self.logger.info(f"正在下载视频 {downloadVideoName} 的音频流")
-                success, error_msg = await self.downloader.download(
-                    audioUrl, 
-                    tempAudio, 
-                    progress_callback=lambda progress: self._update_progress(task, progress=progress))
-                if not success:
-                    raise Exception(error_msg)
-                
-                self._update_progress(task,status=TaskStatus.MERGING.name)
-                self.logger.debug('混流开始')
-                await mix_streams(tempVideo, tempAudio, output)
\ No newline at end of file
+            for kind, url, path in resolution.streams:
+                self._update_progress(task, status=self._stream_stage(kind).name)
+                await self._download_stream(task, resolution, kind, url, path,
+                                            lambda progress: self._update_progress(task, progress=progress))
+
+        self._update_progress(task, status=TaskStatus.MERGING.name)
+        self.logger.debug('混流开始')
+        started = monotonic()
+        await mix_streams(resolution.get_path('video'), resolution.get_path('audio'), resolution.output)
+        metrics.stage_duration.observe(monotonic() - started, stage=TaskStatus.MERGING.name)
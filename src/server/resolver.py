@@ -0,0 +1,157 @@
+import asyncio
+import os
+from dataclasses import dataclass, field
+from time import monotonic, time
+from typing import Dict, List, Optional, Tuple
+from bilibili_api import video
+from src.common.models import DownloadTask, TaskStatus
+from src.common.utils import sanitize_filename
+from src.common.logger import get_logger
+from src.server.video_service import VideoService
+from src.service.download import Downloader
+from src.service.metrics import metrics
+
+DEFAULT_PREFETCH_DEPTH = 8          # 预解析队列中前K个任务
+DEFAULT_RESOLVER_CONCURRENCY = 4    # 解析阶段的并发数
+DEFAULT_REFRESH_AHEAD = 300         # 签名链接剩余有效期不足该秒数时重新解析
+
+@dataclass
+class Resolution:
+    """任务的解析结果: 需要下载的流、输出路径与大小"""
+    title: str
+    streams: List[Tuple[str, str, str]]  # (video/audio, 链接, 临时文件路径)
+    output: str
+    stream_bytes: int
+    expires_at: float
+    stream_sizes: Dict[str, int] = field(default_factory=dict)  # 各流的字节数
+    ttl: float = 0.0  # 解析时链接的剩余有效期(秒)
+
+    def get_path(self, kind: str) -> str:
+        """获取指定类型流的临时文件路径,不存在时返回空字符串"""
+        return next((path for k, _, path in self.streams if k == kind), '')
+
+class StreamResolver:
+    """
+    解析阶段
+    下载槽位之外独立运行,提前解析队列中即将执行的任务,
+    使下载槽位只用于传输数据
+    """
+
+    def __init__(self, task_manager, video_service: VideoService, downloader: Downloader,
+                 prefetch_depth: int = DEFAULT_PREFETCH_DEPTH,
+                 concurrency: int = DEFAULT_RESOLVER_CONCURRENCY,
+                 refresh_ahead: float = DEFAULT_REFRESH_AHEAD):
+        self.logger = get_logger(__name__)
+        self.task_manager = task_manager
+        self.video_service = video_service
+        self.downloader = downloader
+        self.prefetch_depth = prefetch_depth
+        self.concurrency = concurrency
+        self.refresh_ahead = refresh_ahead
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._resolved: Dict[str, Resolution] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def resolve(self, task: DownloadTask) -> Resolution:
+        """解析任务: 并发获取播放链接与视频信息,选择流并获取流大小"""
+        started = monotonic()
+        bvid = task.input
+        page_index = task.page_index
+        downloadUrlData, downloadVideoInfo = await asyncio.gather(
+            self.video_service.get_download_url_data(bvid, page_index),
+            self.video_service.get_video_info(bvid)
+        )
+        detecter = video.VideoDownloadURLDataDetecter(data=downloadUrlData)
+        title = downloadVideoInfo["title"]
+        if task.parent_id:
+            # 分P子任务以 标题_P页码_分P标题 命名
+            page = downloadVideoInfo["pages"][page_index]
+            title = f"{title}_P{page['page']}_{page['part']}"
+        videoUrl, audioUrl = await self.video_service.select_stream(detecter, task.video_config, downloadUrlData)
+
+        #合成临时文件名
+        cache_dir = task.download_config.cache_dir
+        output = os.path.join(task.download_config.download_dir, sanitize_filename(title) + '.mp4')
+        if detecter.check_flv_mp4_stream():
+            streams = [('video', videoUrl, os.path.join(cache_dir, f"flv_temp_{task.task_id}.flv"))]
+        elif task.video_config.audio_only == 'True':
+            streams = [('audio', audioUrl, os.path.join(cache_dir, f"audio_temp_{task.task_id}.m4s"))]
+        else:
+            streams = [('video', videoUrl, os.path.join(cache_dir, f"video_temp_{task.task_id}.m4s"))]
+            if audioUrl:
+                streams.append(('audio', audioUrl, os.path.join(cache_dir, f"audio_temp_{task.task_id}.m4s")))
+
+        sizes = await asyncio.gather(*[self.downloader.get_file_size(url) for _, url, _ in streams])
+        expires_in = self.video_service.cache.expires_in(('playurl', bvid, page_index))
+        if expires_in is None:
+            # 播放链接没有进入缓存(有效期过短或已被淘汰)时按签名链接的deadline或默认有效期计算,
+            # 否则预解析结果立即过期,同一任务会被反复解析
+            expires_in = self.video_service.cache.playurl_ttl_for(downloadUrlData)
+        metrics.stage_duration.observe(monotonic() - started, stage=TaskStatus.PARSING.name)
+        return Resolution(
+            title=title,
+            streams=streams,
+            output=output,
+            stream_bytes=sum(size or 0 for size in sizes),
+            expires_at=time() + expires_in,
+            stream_sizes={kind: size or 0 for (kind, _, _), size in zip(streams, sizes)},
+            ttl=expires_in
+        )
+
+    def take(self, task_id: str) -> Optional[Resolution]:
+        """取出预解析结果,链接已过期时返回None"""
+        resolution = self._resolved.pop(task_id, None)
+        if resolution and resolution.expires_at > time():
+            return resolution
+        return None
+
+    def _needs_resolve(self, task: DownloadTask) -> bool:
+        if task.task_id in self._inflight or (task.pages and not task.parent_id):
+            # 多P父任务只会展开为子任务,由子任务各自解析
+            return False
+        resolution = self._resolved.get(task.task_id)
+        if resolution is None:
+            return True
+        # 有效期本身很短的链接按其一半提前刷新,否则刚解析完就被视为即将过期,每轮都会重新解析
+        refresh_ahead = min(self.refresh_ahead, resolution.ttl / 2)
+        return resolution.expires_at - time() < refresh_ahead
+
+    async def _prefetch(self, task: DownloadTask) -> None:
+        async with self._semaphore:
+            try:
+                if task.task_id in self._resolved:
+                    # 链接即将过期,丢弃缓存重新获取
+                    self.video_service.invalidate_playurl(task.input)
+                resolution = await self.resolve(task)
+                self._resolved[task.task_id] = resolution
+                self.task_manager.set_task_estimate(
+                    task.task_id,
+                    resolution.stream_bytes,
+                    [path for _, _, path in resolution.streams],
+                    resolution.output
+                )
+                self.logger.debug(f"预解析完成: {task.task_id}")
+            except Exception as e:
+                # 预解析失败不影响任务,进入下载槽位后会重新解析
+                self.logger.warning(f"预解析任务{task.task_id}失败: {str(e)}")
+            finally:
+                self._inflight.pop(task.task_id, None)
+
+    def _prune(self) -> None:
+        """丢弃已取消或已结束任务的解析结果"""
+        for task_id in list(self._resolved):
+            task = self.task_manager.get_task(task_id)
+            if not task or task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED):
+                del self._resolved[task_id]
+
+    async def run(self, poll_interval: float = 1.0) -> None:
+        """预解析主循环"""
+        while True:
+            try:
+                self._prune()
+                for task in self.task_manager.peek_pending(self.prefetch_depth):
+                    if self._needs_resolve(task):
+                        self._inflight[task.task_id] = asyncio.create_task(self._prefetch(task))
+            except Exception as e:
+                self.logger.error(f"预解析循环出错: {str(e)}")
+            await asyncio.sleep(poll_interval)
@@ -1,84 +1,54 @@
-from flask import request, jsonify
-from src.common.models import VideoConfig, DownloadConfig, DownloadTask
-from src.service.task_manager import TaskManager
+from flask import request, jsonify, Response, stream_with_context, send_file
+from src.server.api_handlers import APIHandlers, ApiRequest, ApiFile
+from src.service.event_bus import EventSubscription
+from src.service.growing_file import GrowingFile
 import logging
 
+def _stream_events(subscription: EventSubscription):
+    """SSE生成器,每个连接占用一个请求线程阻塞等待事件"""
+    while True:
+        messages = subscription.fetch()
+        if messages:
+            yield ''.join(messages)
+        elif not subscription.bus.wait(subscription.last_id, subscription.KEEPALIVE_INTERVAL):
+            yield ': keepalive\n\n'
+
 class APIRoutes:
-    def __init__(self, app, task_manager:TaskManager):
+    """将APIHandlers的路由表注册到Flask应用(开发服务器/兼容模式)"""
+
+    def __init__(self, app, handlers: APIHandlers):
         self.app = app
-        self.task_manager = task_manager
+        self.handlers = handlers
         self.register_routes()
-    
-    def register_routes(self):
-        @self.app.route('/download', methods=['POST'])
-        def handle_download():
+
+    def _view(self, handler):
+        def view(**params):
             try:
-                data = request.json
-                video_config = VideoConfig(**data['video_config'])
-                download_config = DownloadConfig(**data['download_config'])
-                task = DownloadTask(
-                    input=data['input'],
-                    video_config=video_config,
-                    download_config=download_config
-                )
-                
-                task_id = self.task_manager.add_task(task)
-                return jsonify({"status": "success", "message": "任务已添加", "task_id": task_id})
+                payload, status, *headers = handler(ApiRequest(
+                    json=request.get_json(silent=True) or {},
+                    args=request.args,
+                    params=params,
+                    headers=request.headers
+                ))
             except Exception as e:
-                logging.error(f"添加任务失败: {str(e)}")
-                return jsonify({"status": "error", "message": str(e)}), 500
-
-        @self.app.route('/tasks', methods=['GET'])
-        def list_tasks():
-            tasks = self.task_manager.list_tasks()
-            return jsonify({
-                "status": "success",
-                "tasks": [{
-                    "task_id": task.task_id,
-                    "input": task.input,
-                    "status": task.status.value,
-                    "progress": task.progress,
-                    "created_at": task.created_at.isoformat() if task.created_at else None,
-                    "started_at": task.started_at.isoformat() if task.started_at else None,
-                    "completed_at": task.completed_at.isoformat() if task.completed_at else None,
-                    "error_message": task.error_message
-                } for task in tasks]
-            })
+                logging.error(f"处理请求{request.path}失败: {str(e)}")
+                payload, status, headers = {"status": "error", "message": str(e)}, 500, []
+            if isinstance(payload, EventSubscription):
+                return Response(stream_with_context(_stream_events(payload)), mimetype='text/event-stream',
+                                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+            if isinstance(payload, GrowingFile):
+                # 每个播放连接占用一个请求线程,等待数据写入
+                return Response(payload.chunks(), status=status, headers=headers[0], direct_passthrough=True)
+            if isinstance(payload, ApiFile):
+                return send_file(payload.path, as_attachment=True, download_name=payload.filename, conditional=True)
+            if status == 304:
+                return '', 304, (headers[0] if headers else {})
+            if isinstance(payload, str):
+                return Response(payload, status=status, headers=headers[0] if headers else None)
+            return jsonify(payload), status, (headers[0] if headers else {})
+        return view
 
-        @self.app.route('/tasks/<task_id>', methods=['GET'])
-        def get_task(task_id):
-            task = self.task_manager.get_task(task_id)
-            if not task:
-                return jsonify({"status": "error", "message": "任务不存在"}), 404
-            
-            return jsonify({
-                "status": "success",
-                "task": {
-                    "task_id": task.task_id,
-                    "input": task.input,
-                    "status": task.status.value,
-                    "progress": task.progress,
-                    "created_at": task.created_at.isoformat() if task.created_at else None,
-                    "started_at": task.started_at.isoformat() if task.started_at else None,
-                    "completed_at": task.completed_at.isoformat() if task.completed_at else None,
-                    "error_message": task.error_message
-                }
-            })
-
-        @self.app.route('/tasks/<task_id>/cancel', methods=['POST'])
-        def cancel_task(task_id):
-            if self.task_manager.cancel_task(task_id):
-                return jsonify({"status": "success", "message": "任务已取消"})
-            return jsonify({"status": "error", "message": "无法取消任务"}), 400
-
-        @self.app.route('/tasks/<task_id>/pause', methods=['POST'])
-        def pause_task(task_id):
-            if self.task_manager.pause_task(task_id):
-                return jsonify({"status": "success", "message": "任务已暂停"})
-            return jsonify({"status": "error", "message": "无法暂停任务"}), 400
-
-        @self.app.route('/tasks/<task_id>/resume', methods=['POST'])
-        def resume_task(task_id):
-            if self.task_manager.resume_task(task_id):
-                return jsonify({"status": "success", "message": "任务已恢复"})
-            return jsonify({"status": "error", "message": "无法恢复任务"}), 400
\ No newline at end of file
+    def register_routes(self):
+        for method, path, name in self.handlers.ROUTES:
+            self.app.add_url_rule(path, endpoint=f"{name}_{method.lower()}",
+                                  view_func=self._view(getattr(self.handlers, name)), methods=[method])
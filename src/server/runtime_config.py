@@ -0,0 +1,181 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+from src.common.logger import get_logger
+from src.common.utils import parse_size
+from src.service.config_manager import UnifiedConfigManager
+from src.service.task_manager import TaskManager
+
+CONFIG_POLL_INTERVAL = 2.0  # 检查配置文件是否修改的间隔(秒)
+APPLY_TIMEOUT = 10          # 等待事件循环应用配置的超时(秒)
+
+def _positive_int(value: Any) -> int:
+    value = int(value)
+    if value < 1:
+        raise ValueError(value)
+    return value
+
+def _non_negative_int(value: Any) -> int:
+    value = int(value)
+    if value < 0:
+        raise ValueError(value)
+    return value
+
+def _positive_float(value: Any) -> float:
+    value = float(value)
+    if value <= 0:
+        raise ValueError(value)
+    return value
+
+def _bandwidth(value: Any) -> int:
+    """带宽上限: 字节/秒,支持K/M/G后缀,0或空表示不限速"""
+    value = parse_size(value) or 0
+    if value < 0:
+        raise ValueError(value)
+    return value
+
+# 可在运行时调整的配置项: 配置名 -> 校验/转换函数
+TUNABLE_SETTINGS: Dict[str, Callable[[Any], Any]] = {
+    'max_concurrent_downloads': _positive_int,  # 下载槽位数
+    'prefetch_depth': _non_negative_int,        # 预解析队列中即将执行的任务数
+    'bandwidth_limit': _bandwidth,              # 所有下载共用的带宽上限
+    'max_retries': _non_negative_int,           # 传输中断后的最大重试次数
+    'retry_backoff': _positive_float,           # 重试间隔基数(秒),按2的幂增长
+    'resolve_cache_size': _positive_int         # 解析缓存的条目数上限
+}
+
+class RuntimeConfig:
+    """
+    运行时可调整的服务器配置(TUNABLE_SETTINGS)
+    通过PATCH /config或修改配置文件生效,不需要重启,也不中断正在下载的任务:
+    槽位调低时正在下载的任务继续完成,只是不再领取新任务;带宽与重试策略对进行中的下载立即生效
+    """
+
+    def __init__(self, task_manager: TaskManager, download_service):
+        self.logger = get_logger(__name__)
+        self.download_service = download_service
+        downloader = download_service.downloader
+        self._appliers: Dict[str, Callable[[Any], None]] = {
+            'max_concurrent_downloads': task_manager.set_max_concurrent_downloads,
+            'prefetch_depth': lambda value: setattr(download_service.resolver, 'prefetch_depth', value),
+            'bandwidth_limit': downloader.set_bandwidth_limit,
+            'max_retries': lambda value: setattr(downloader, 'max_retries', value),
+            'retry_backoff': lambda value: setattr(downloader, 'retry_backoff', value),
+            'resolve_cache_size': download_service.video_service.cache.set_capacity
+        }
+        self._values: Dict[str, Any] = {}
+        self._file_values: Dict[str, Any] = {}  # 最近一次从配置文件读到的值,只有文件中修改过的项才重新生效
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @staticmethod
+    def parse(changes: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        校验并转换配置项
+        Raises:
+            ValueError: 包含不支持运行时调整的配置项或值不正确
+        """
+        unknown = [key for key in changes if key not in TUNABLE_SETTINGS]
+        if unknown:
+            raise ValueError(f"不支持运行时调整的配置项: {', '.join(unknown)},可选: {', '.join(TUNABLE_SETTINGS)}")
+        parsed = {}
+        for key, value in changes.items():
+            try:
+                parsed[key] = TUNABLE_SETTINGS[key](value)
+            except (TypeError, ValueError):
+                raise ValueError(f"配置项{key}的值不正确: {value}")
+        return parsed
+
+    def get(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._values)
+
+    def _call_in_loop(self, func: Callable[[], Any]) -> Any:
+        """
+        在下载调度的事件循环中执行func并等待结果
+        带宽/缓存/预解析深度由事件循环中的下载与解析使用,文件监视线程与Flask请求线程的调整交给事件循环执行
+        """
+        loop = self.download_service.loop
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if loop is None or not loop.is_running() or current is loop:
+            return func()
+        future: Future = Future()
+
+        def run():
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+
+        loop.call_soon_threadsafe(run)
+        return future.result(APPLY_TIMEOUT)
+
+    def _apply(self, parsed: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            changed = {key: value for key, value in parsed.items() if self._values.get(key) != value}
+            for key, value in changed.items():
+                self._appliers[key](value)
+                self._values[key] = value
+        return changed
+
+    def update(self, changes: Dict[str, Any], source: str = "API") -> Dict[str, Any]:
+        """
+        调整配置,全部配置项校验通过后才一起生效
+        Returns:
+            实际发生变化的配置项
+        """
+        parsed = self.parse(changes)
+        changed = self._call_in_loop(lambda: self._apply(parsed))
+        if changed:
+            self.logger.info(f"配置已更新({source}): {changed}")
+        return changed
+
+    def load(self, config: Dict[str, Any]) -> None:
+        """启动时应用合并后的配置(模板默认值+配置文件)"""
+        values = {key: config[key] for key in TUNABLE_SETTINGS if key in config}
+        self.update(values, source="启动")
+        self._file_values = self.parse(values)
+
+    def reload_file(self, config_manager: UnifiedConfigManager) -> Dict[str, Any]:
+        """重新读取配置文件,只应用文件中修改过的项(不覆盖之后通过API调整且文件中未修改的项)"""
+        file_config = config_manager.read_file()
+        values = self.parse({key: file_config[key] for key in TUNABLE_SETTINGS if key in file_config})
+        modified = {key: value for key, value in values.items() if self._file_values.get(key) != value}
+        changed = self.update(modified, source="配置文件")
+        self._file_values.update(values)
+        return changed
+
+    def watch(self, config_manager: UnifiedConfigManager, interval: float = CONFIG_POLL_INTERVAL) -> None:
+        """在后台线程中按修改时间检查配置文件,修改后自动重新加载"""
+        def mtime() -> Optional[int]:
+            try:
+                return os.stat(config_manager.config_path).st_mtime_ns
+            except OSError:
+                return None
+
+        def run():
+            last = mtime()
+            while not self._stop_event.wait(interval):
+                current = mtime()
+                if current == last:
+                    continue
+                last = current
+                try:
+                    self.reload_file(config_manager)
+                except Exception as e:
+                    # 文件写到一半或值不正确时保留当前配置,下次修改后再试
+                    self.logger.error(f"重新加载配置文件失败: {str(e)}")
+
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=run, daemon=True)
+        self._watcher.start()
+        self.logger.info(f"开始监视配置文件: {config_manager.config_path}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
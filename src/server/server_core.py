@@ -1,13 +1,14 @@
 import click
 import os
 import sys
+from aiohttp import web
 from bilibili_api import select_client
 from pathlib import Path
 
 from src.common.param_helps.server_help import *
 from src.common.param_helps.shared_help import *
 from src.common.logger import configure_logging,get_logger
-from src.server.app_factory import ApplicationFactory  
+from src.server.app_factory import ApplicationFactory, SERVER_MODES
 from src.service import config_manager
 from src.common.utils import find_project_root
 
@@ -21,7 +22,9 @@ DEFAULT_CONFIG_PATH = PROJECT_ROOT / "configs" / "server" / "default_config.yaml
 @click.option('--port', default=None, help=portHelp)
 @click.option('--config', default=None,help=configHelp)
 @click.option('--log-dir',default=None,help=logDirHelp)
-def run_server(host, port, config, log_level, log_dir):
+@click.option('--local-worker/--no-local-worker', default=None, help=localWorkerHelp)
+@click.option('--server-mode', default=None, type=click.Choice(SERVER_MODES), help=serverModeHelp)
+def run_server(host, port, config, log_level, log_dir, local_worker, server_mode):
     """启动下载服务器"""
     #这里设置的是默认日志目录
     configure_logging(
@@ -39,7 +42,9 @@ def run_server(host, port, config, log_level, log_dir):
     app_factory = ApplicationFactory(config_path=config or DEFAULT_CONFIG_PATH,
                                     log_dir=log_dir,
                                     host=host,
-                                    port=port)
+                                    port=port,
+                                    local_worker=local_worker,
+                                    server_mode=server_mode)
     #获取最终配置
     final_config = app_factory.config
     host = app_factory.config['host']
@@ -53,9 +58,17 @@ def run_server(host, port, config, log_level, log_dir):
     )
     logger.info(f"服务器配置文件加载成功，日志保存在 {final_log_dir}中")
 
-    app = app_factory.create_app()
-    app.run(host=host, port=port)
-    logger.info(f"服务器启动于 {host}:{port}")
+    if final_config['server_mode'] == 'flask':
+        app = app_factory.create_app()
+        logger.info(f"服务器(Flask)启动于 {host}:{port}")
+        try:
+            app.run(host=host, port=port)
+        finally:
+            app_factory.shutdown()
+    else:
+        # aiohttp在收到SIGINT/SIGTERM时依次执行on_shutdown,中断下载并保存检查点
+        logger.info(f"服务器(aiohttp)启动于 {host}:{port}")
+        web.run_app(app_factory.create_aio_app(), host=host, port=int(port), print=None)
 
 if __name__ == "__main__":
     run_server()
\ No newline at end of file
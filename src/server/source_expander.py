@@ -0,0 +1,135 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bilibili_api import user, favorite_list, channel_series
+from src.common.models import DownloadTask, ExpansionJob, TaskStatus
+from src.common.logger import get_logger
+from src.service.task_manager import TaskManager
+from src.service.rate_limiter import api_guard
+
+SOURCE_TYPES = ('favorite', 'season', 'uploader')
+# 按时间由新到旧返回的来源;合集按UP主编排的顺序返回,不保证新视频在前
+NEWEST_FIRST_SOURCES = ('favorite', 'uploader')
+DEFAULT_PAGE_CONCURRENCY = 4  # 同一来源并发获取的页数
+UPLOADER_PAGE_SIZE = 30
+SEASON_PAGE_SIZE = 30
+FAVORITE_PAGE_SIZE = 20       # 收藏夹接口固定每页20条
+
+@dataclass
+class SourcePage:
+    """来源的一页列表"""
+    items: List[Tuple[str, int]]  # (bvid, 时间戳),时间戳用于增量同步
+    total: int                    # 来源声明的视频总数
+    page_size: int
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-self.total // self.page_size))
+
+async def fetch_source_page(source_type: str, source_id: str, mid: Optional[str], pn: int) -> SourcePage:
+    """
+    获取来源的第pn页(从1开始),受全局API限流保护
+    收藏夹与UP主投稿按时间由新到旧排列,合集按编排顺序排列(见NEWEST_FIRST_SOURCES)
+    Args:
+        source_type: favorite(收藏夹ID) / season(合集ID,需要mid) / uploader(UP主mid)
+    """
+    if source_type == 'uploader':
+        result = await api_guard.call('listing', user.User(uid=int(source_id)).get_videos, pn=pn, ps=UPLOADER_PAGE_SIZE)
+        items = [(v['bvid'], v.get('created', 0)) for v in (result.get('list') or {}).get('vlist') or []]
+        return SourcePage(items, result['page']['count'], UPLOADER_PAGE_SIZE)
+    if source_type == 'favorite':
+        result = await api_guard.call('listing', favorite_list.get_video_favorite_list_content, media_id=int(source_id), page=pn)
+        # type为2的条目是视频,其他(音频等)跳过
+        items = [(m['bvid'], m.get('fav_time', 0)) for m in result.get('medias') or [] if m.get('type') == 2]
+        return SourcePage(items, result['info']['media_count'], FAVORITE_PAGE_SIZE)
+    if source_type == 'season':
+        if not mid:
+            raise ValueError("合集需要提供所属UP主的mid")
+        series = channel_series.ChannelSeries(uid=int(mid), type_=channel_series.ChannelSeriesType.SEASON, id_=int(source_id))
+        result = await api_guard.call('listing', series.get_videos, sort=channel_series.ChannelOrder.CHANGE, pn=pn, ps=SEASON_PAGE_SIZE)
+        items = [(a['bvid'], a.get('pubdate', 0)) for a in result.get('archives') or []]
+        return SourcePage(items, result['page']['total'], SEASON_PAGE_SIZE)
+    raise ValueError(f"未知的来源类型: {source_type},可选: {SOURCE_TYPES}")
+
+class SourceExpander:
+    """
+    批量来源展开服务
+    在独立的事件循环中分页获取收藏夹/合集/UP主投稿,每获取到一页就把其中的视频加入下载队列,
+    不必等待整个列表获取完成
+    """
+
+    def __init__(self, task_manager: TaskManager, page_concurrency: int = DEFAULT_PAGE_CONCURRENCY):
+        self.logger = get_logger(__name__)
+        self.task_manager = task_manager
+        self.page_concurrency = page_concurrency
+        self._jobs: Dict[str, ExpansionJob] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread = None
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        """
+        启动展开服务
+        Args:
+            loop: 共用的事件循环(异步服务器模式),为空时在独立线程中运行自己的事件循环
+        """
+        if loop:
+            self.loop = loop
+        else:
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self._thread.start()
+        self.logger.info("来源展开服务启动成功")
+
+    def submit(self, job: ExpansionJob) -> str:
+        """提交展开任务(线程安全),返回任务ID"""
+        if job.source_type not in SOURCE_TYPES:
+            raise ValueError(f"未知的来源类型: {job.source_type},可选: {SOURCE_TYPES}")
+        self._jobs[job.job_id] = job
+        asyncio.run_coroutine_threadsafe(self.expand(job), self.loop)
+        self.logger.info(f"添加展开任务: {job.source_type}:{job.source_id} -> {job.job_id}")
+        return job.job_id
+
+    def get_job(self, job_id: str) -> Optional[ExpansionJob]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[ExpansionJob]:
+        return list(self._jobs.values())
+
+    def _enqueue(self, job: ExpansionJob, page: SourcePage, seen: set) -> None:
+        """把一页中的新视频加入下载队列"""
+        tasks = []
+        for bvid, _ in page.items:
+            if bvid in seen:
+                continue
+            seen.add(bvid)
+            tasks.append(DownloadTask(input=bvid, video_config=job.video_config, download_config=job.download_config))
+        job.task_ids.extend(self.task_manager.add_tasks(tasks))
+        job.queued += len(tasks)
+        job.pages_fetched += 1
+
+    async def expand(self, job: ExpansionJob) -> None:
+        """展开来源: 先取第一页得到总页数,其余页按并发上限获取,逐页入队"""
+        seen = set()
+        try:
+            first = await fetch_source_page(job.source_type, job.source_id, job.mid, 1)
+            job.total = first.total
+            self._enqueue(job, first, seen)
+
+            pending = iter(range(2, first.page_count + 1))
+
+            async def page_worker():
+                for pn in pending:
+                    page = await fetch_source_page(job.source_type, job.source_id, job.mid, pn)
+                    self._enqueue(job, page, seen)
+
+            await asyncio.gather(*[page_worker() for _ in range(min(self.page_concurrency, first.page_count - 1))])
+            job.status = TaskStatus.COMPLETED
+            self.logger.info(f"展开任务完成: {job.job_id},共加入{job.queued}个视频")
+        except Exception as e:
+            job.status = TaskStatus.FAILED
+            job.error_message = str(e)
+            self.logger.error(f"展开任务{job.job_id}失败: {str(e)}")
+        finally:
+            job.completed_at = datetime.now()
@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime, timedelta
+from time import time
+from typing import Dict, List, Optional, Set, Tuple
+from src.common.models import DownloadTask, Subscription
+from src.common.logger import get_logger
+from src.service.task_manager import TaskManager
+from src.service.subscription_store import SubscriptionStore
+from src.server.source_expander import SourceExpander, SOURCE_TYPES, NEWEST_FIRST_SOURCES, fetch_source_page
+
+DEFAULT_POLL_INTERVAL = 30     # 检查到期订阅的间隔(秒)
+DEFAULT_SYNC_CONCURRENCY = 4   # 同时同步的订阅数
+ERROR_RETRY_SECONDS = 300      # 同步失败后的重试间隔(不超过订阅的同步间隔)
+
+class SubscriptionService:
+    """
+    订阅同步调度
+    运行在来源展开服务的事件循环中;来源列表按时间由新到旧排列,
+    同步时从第一页开始读取,遇到水位线即停止,来源没有更新时只需要一次API调用;
+    合集按编排顺序排列,第一页的总数与首尾条目和上次同步相同时视为没有更新
+    """
+
+    def __init__(self, task_manager: TaskManager, store: SubscriptionStore, expander: SourceExpander,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 concurrency: int = DEFAULT_SYNC_CONCURRENCY):
+        self.logger = get_logger(__name__)
+        self.task_manager = task_manager
+        self.store = store
+        self.expander = expander
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency
+        self._syncing: Set[str] = set()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._retry_at: Dict[str, float] = {}
+
+    def start(self):
+        """在展开服务的事件循环中启动调度"""
+        asyncio.run_coroutine_threadsafe(self.run(), self.expander.loop)
+        self.logger.info("订阅同步服务启动成功")
+
+    def subscribe(self, sub: Subscription) -> str:
+        """添加订阅并立即进行首次同步"""
+        if sub.source_type not in SOURCE_TYPES:
+            raise ValueError(f"未知的来源类型: {sub.source_type},可选: {SOURCE_TYPES}")
+        if sub.source_type == 'season' and not sub.mid:
+            raise ValueError("合集需要提供所属UP主的mid")
+        self.store.add(sub)
+        self.sync_now(sub.sub_id)
+        self.logger.info(f"添加订阅: {sub.source_type}:{sub.source_id} -> {sub.sub_id}")
+        return sub.sub_id
+
+    def unsubscribe(self, sub_id: str) -> bool:
+        self._retry_at.pop(sub_id, None)
+        return self.store.remove(sub_id)
+
+    def sync_now(self, sub_id: str) -> bool:
+        """立即同步指定订阅(线程安全),订阅不存在时返回False"""
+        if not self.store.get(sub_id):
+            return False
+        asyncio.run_coroutine_threadsafe(self.sync(sub_id), self.expander.loop)
+        return True
+
+    def _is_due(self, sub: Subscription, now: datetime) -> bool:
+        if sub.sub_id in self._syncing:
+            return False
+        retry_at = self._retry_at.get(sub.sub_id)
+        if retry_at is not None:
+            return retry_at <= time()
+        return sub.last_sync_at is None or sub.last_sync_at + timedelta(seconds=sub.interval) <= now
+
+    async def _collect(self, sub: Subscription) -> Tuple[List[str], Optional[Tuple[str, int]], Optional[str]]:
+        """
+        读取水位线之后的新条目
+        Returns:
+            (由新到旧的新视频BV号列表, 来源当前最新的条目, 合集列表的摘要)
+        """
+        if sub.source_type not in NEWEST_FIRST_SOURCES:
+            return await self._collect_unordered(sub)
+        first_sync = sub.last_sync_at is None
+        new_items: List[str] = []
+        newest = None
+        pn = 1
+        while True:
+            page = await fetch_source_page(sub.source_type, sub.source_id, sub.mid, pn)
+            if pn == 1:
+                newest = page.items[0] if page.items else None
+                if first_sync and not sub.backfill:
+                    # 首次同步只记录水位线
+                    return [], newest, None
+            for bvid, ts in page.items:
+                if not first_sync and (bvid == sub.watermark_bvid or ts < sub.watermark_ts):
+                    return new_items, newest, None
+                new_items.append(bvid)
+            if not page.items or pn >= page.page_count:
+                return new_items, newest, None
+            pn += 1
+
+    async def _collect_unordered(self, sub: Subscription) -> Tuple[List[str], Optional[Tuple[str, int]], Optional[str]]:
+        """
+        不保证新视频在前的来源(合集): 读取全部条目,按发布时间与水位线比较
+        第一页的总数与首尾条目和上次同步相同时不再翻页,合集没有更新时只需要一次API调用
+        """
+        first_sync = sub.last_sync_at is None
+        page = await fetch_source_page(sub.source_type, sub.source_id, sub.mid, 1)
+        listing = f"{page.total}:{page.items[0][0] if page.items else ''}:{page.items[-1][0] if page.items else ''}"
+        if not first_sync and listing == sub.watermark_listing:
+            return [], None, listing
+        items: List[Tuple[str, int]] = list(page.items)
+        pn = 1
+        while page.items and pn < page.page_count:
+            pn += 1
+            page = await fetch_source_page(sub.source_type, sub.source_id, sub.mid, pn)
+            items.extend(page.items)
+        items.sort(key=lambda item: item[1], reverse=True)
+        newest = items[0] if items else None
+        if first_sync:
+            return ([bvid for bvid, _ in items] if sub.backfill else []), newest, listing
+        return [bvid for bvid, ts in items if ts > sub.watermark_ts and bvid != sub.watermark_bvid], newest, listing
+
+    async def sync(self, sub_id: str) -> int:
+        """同步一个订阅,返回新加入队列的视频数;同一订阅不会并发同步"""
+        if sub_id in self._syncing:
+            return 0
+        self._syncing.add(sub_id)
+        try:
+            async with self._semaphore:
+                # 排队期间水位线可能已更新,以索引中的最新记录为准
+                sub = self.store.get(sub_id)
+                return await self._sync(sub) if sub else 0
+        finally:
+            self._syncing.discard(sub_id)
+
+    async def _sync(self, sub: Subscription) -> int:
+        try:
+            new_items, newest, listing = await self._collect(sub)
+            seen = set()
+            tasks = []
+            # 由旧到新加入队列,较早发布的视频先下载
+            for bvid in reversed(new_items):
+                if bvid in seen:
+                    continue
+                seen.add(bvid)
+                tasks.append(DownloadTask(input=bvid, video_config=sub.video_config, download_config=sub.download_config))
+            self.task_manager.add_tasks(tasks)
+            if newest:
+                sub.watermark_bvid, sub.watermark_ts = newest
+            if listing:
+                sub.watermark_listing = listing
+            sub.queued += len(seen)
+            sub.last_sync_at = datetime.now()
+            sub.last_error = None
+            self._retry_at.pop(sub.sub_id, None)
+            if seen:
+                self.logger.info(f"订阅{sub.source_type}:{sub.source_id}有{len(seen)}个新视频")
+            return len(seen)
+        except Exception as e:
+            sub.last_error = str(e)
+            self._retry_at[sub.sub_id] = time() + min(sub.interval, ERROR_RETRY_SECONDS)
+            self.logger.error(f"同步订阅{sub.sub_id}失败: {str(e)}")
+            return 0
+        finally:
+            # 同步期间被取消的订阅不会写回(UPDATE不到记录)
+            self.store.record_sync(sub)
+
+    async def run(self) -> None:
+        """调度主循环: 定期同步到期的订阅"""
+        while True:
+            try:
+                now = datetime.now()
+                for sub in self.store.list():
+                    if self._is_due(sub, now):
+                        asyncio.create_task(self.sync(sub.sub_id))
+            except Exception as e:
+                self.logger.error(f"订阅调度出错: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
@@ -1,61 +1,250 @@
-import logging
+from typing import Dict, List, Optional, Tuple
 from bilibili_api import video
-from src.common.utils import config2reality
+from src.common.utils import config2reality, parse_size
 from src.common.logger import get_logger
 from src.common.models import VideoConfig
+from src.service.resolve_cache import ResolveCache
+from src.service.rate_limiter import api_guard
+
+# 画质、音质由低到高的顺序(VideoQuality/AudioQuality枚举名)
+VIDEO_QUALITY_ORDER = ['_360P', '_480P', '_720P', '_1080P', 'AI_REPAIR', '_1080P_PLUS', '_1080P_60', '_4K', 'HDR', 'DOLBY', '_8K']
+AUDIO_QUALITY_ORDER = ['_64K', '_132K', '_192K', 'DOLBY', 'HI_RES']
+# 编码替换时的优先顺序(VideoCodecs枚举名)
+CODEC_ORDER = ['AVC', 'HEV', 'AV1']
+# 降级阶梯可用的步骤: 同编码较低画质 / 替换编码 / 较高画质 / 最佳画质
+FALLBACK_RUNGS = ['lower', 'codec', 'higher', 'best']
 
 class VideoService:
     """处理视频相关的服务"""
-    def __init__(self):
+    def __init__(self, cache: ResolveCache = None):
         self.logger = get_logger(__name__)
+        self.cache = cache or ResolveCache()
         self.logger.info("VideoService初始化成功")
-    async def select_stream(self,detecter:video.VideoDownloadURLDataDetecter, video_config:VideoConfig):
-        """选择视频和音频流"""
+
+    async def get_download_url_data(self, bvid: str, page_index: int = 0) -> dict:
+        """获取播放链接数据,按签名链接的过期时间缓存"""
+        return await self.cache.get_or_load(
+            ('playurl', bvid, page_index),
+            lambda: api_guard.call('playurl', video.Video(bvid=bvid).get_download_url, page_index),
+            self.cache.playurl_ttl_for
+        )
+
+    async def get_video_info(self, bvid: str) -> dict:
+        """获取视频信息,缓存时间较长"""
+        return await self.cache.get_or_load(
+            ('info', bvid),
+            lambda: api_guard.call('info', video.Video(bvid=bvid).get_info),
+            lambda _: self.cache.info_ttl
+        )
+
+    def invalidate_playurl(self, bvid: str) -> None:
+        """下载失败时丢弃该视频缓存的播放链接,重试时重新解析"""
+        self.cache.invalidate(lambda key: key[0] == 'playurl' and key[1] == bvid)
+    async def select_stream(self,detecter:video.VideoDownloadURLDataDetecter, video_config:VideoConfig,
+                            download_url_data: dict = None):
+        """
+        选择视频和音频流
+        精确匹配失败时按video_config.fallback配置的降级阶梯查找,
+        只有显式配置了best才会退回最佳画质;
+        设置了max_bitrate/max_bytes时改为在预算内选择画质最高的组合
+        """
         #将用户输入的配置转化为实际的配置
         videoQuality = config2reality(video_config.video_quality)
         audioQuality = config2reality(video_config.audio_quality)
         codec = config2reality(video_config.codec)
-        self.logger.debug(f"用户设置的视频画质:{videoQuality}")
-        self.logger.debug(f"用户设置的音频画质:{audioQuality}")
-        self.logger.debug(f"用户设置的编码:{codec}")
+        ladder = parse_fallback(video_config.fallback)
+        self.logger.debug(f"用户设置的视频画质:{videoQuality} 编码:{codec} 音质:{audioQuality} 降级阶梯:{ladder}")
 
         streamsList = detecter.detect_all()
-        streamsListSize = len(streamsList)
-        videoIndex=audioIndex=None
-        self.logger.debug(streamsList)
-
         if (detecter.check_flv_mp4_stream()):
-            logging.info('Flv/mp4流,无需选择')
-            videoUrl = streamsList[0].url
-            return videoUrl, None
-        else:
-            #遍历流链接列表
-            for i in range(streamsListSize):
-                if type(streamsList[i]).__name__ == 'VideoStreamDownloadURL':
-                    #当前为视频流链接类
-                    self.logger.debug(f"当前视频流画质:{streamsList[i].video_quality.name}")
-                    self.logger.debug(f"当前视频流解码器:{streamsList[i].video_codecs.name}")
-                    if (streamsList[i].video_quality.name == videoQuality) and (streamsList[i].video_codecs.name == codec):
-                        videoIndex = i
-                elif type(streamsList[i]).__name__ == 'AudioStreamDownloadURL':
-                    #当前为音频流链接类
-                    self.logger.debug(f"当前音频流画质:{streamsList[i].audio_quality.name}")
-                    if streamsList[i].audio_quality.name == audioQuality:
-                        audioIndex = i
-            self.logger.debug(f"视频流索引:{videoIndex}")
-            self.logger.debug(f"音频流索引:{audioIndex}")
-            if (videoIndex != None) and (audioIndex != None):
-                videoUrl = streamsList[videoIndex].url
-                audioUrl = streamsList[audioIndex].url
+            self.logger.info('Flv/mp4流,无需选择')
+            return streamsList[0].url, None
+
+        index = StreamIndex(streamsList, download_url_data)
+        max_bitrate = parse_size(video_config.max_bitrate, base=1000)
+        max_bytes = parse_size(video_config.max_bytes)
+        if video_config.audio_only == 'True':
+            # 仅音频: 不选择视频流,没有符合画质/编码要求的视频流也可以下载
+            if max_bitrate or max_bytes:
+                audioStream = index.find_audio_within_budget(max_bitrate, max_bytes)
+            else:
+                audioStream = index.find_audio(audioQuality)
+            if audioStream is None:
+                raise ValueError("没有可用的音频流")
+            if audioStream.audio_quality.name != audioQuality:
+                self.logger.warning(f"音频流{audioQuality}不存在，使用{audioStream.audio_quality.name}")
+            return None, audioStream.url
+        if max_bitrate or max_bytes:
+            videoStream, audioStream = index.find_within_budget(codec, max_bitrate, max_bytes)
+            self.logger.info(
+                f"按预算选流(码率<={max_bitrate}bps, 体积<={max_bytes}字节): "
+                f"{videoStream.video_quality.name}/{videoStream.video_codecs.name} "
+                f"{audioStream.audio_quality.name if audioStream else '无音频'},"
+                f"预计{index.estimate_bytes(videoStream, audioStream)}字节")
+            return videoStream.url, audioStream.url if audioStream else None
+
+        videoStream = index.find_video(videoQuality, codec, ladder)
+        audioStream = index.find_audio(audioQuality)
+        if videoStream is None or (audioStream is None and index.audio):
+            if 'best' not in ladder:
+                raise ValueError(
+                    f"没有符合要求的视频流: {video_config.video_quality}/{video_config.codec},"
+                    f"可选: {index.describe()}。如需自动使用最佳画质,请在fallback中加入best")
+            self.logger.warning("设置的清晰度/编码/音质超过了原视频，按配置以最佳画质下载")
+            best = detecter.detect_best_streams()
+            return best[0].url, best[1].url if len(best) > 1 and best[1] else None
+
+        if (videoStream.video_quality.name, videoStream.video_codecs.name) != (videoQuality, codec):
+            self.logger.warning(f"视频流{videoQuality}/{codec}不存在，"
+                                f"降级为{videoStream.video_quality.name}/{videoStream.video_codecs.name}")
+        if audioStream and audioStream.audio_quality.name != audioQuality:
+            self.logger.warning(f"音频流{audioQuality}不存在，使用{audioStream.audio_quality.name}")
+        self.logger.debug(f"视频流链接:{videoStream.url}")
+        self.logger.debug(f"音频流链接:{audioStream.url if audioStream else None}")
+        return videoStream.url, audioStream.url if audioStream else None
+
+def parse_fallback(fallback: str) -> List[str]:
+    """解析降级阶梯配置,如 lower,codec,higher"""
+    rungs = [rung.strip().lower() for rung in (fallback or '').split(',') if rung.strip()]
+    unknown = [rung for rung in rungs if rung not in FALLBACK_RUNGS]
+    if unknown:
+        raise ValueError(f"未知的降级方式: {unknown},可选: {FALLBACK_RUNGS}")
+    return rungs
+
+def _rank(order: List[str], name: str, value) -> tuple:
+    """按预设顺序排序,未知的枚举排在所有已知项之前(不会被当作最佳画质),彼此按枚举值排序"""
+    return (order.index(name), 0) if name in order else (-1, value)
+
+class StreamIndex:
+    """
+    按(画质, 编码)与音质索引的流
+    画质与音质按从低到高排序,用于查找最接近的替代流
+    """
+
+    def __init__(self, streams: list, download_url_data: dict = None):
+        self.bandwidth, self.duration = self._parse_bandwidth(download_url_data or {})
+        self.video: Dict[Tuple[str, str], video.VideoStreamDownloadURL] = {}
+        self.audio: Dict[str, video.AudioStreamDownloadURL] = {}
+        video_rank: Dict[str, tuple] = {}
+        audio_rank: Dict[str, tuple] = {}
+        for stream in streams:
+            if isinstance(stream, video.VideoStreamDownloadURL):
+                key = (stream.video_quality.name, stream.video_codecs.name)
+                self.video.setdefault(key, stream)
+                video_rank[key[0]] = _rank(VIDEO_QUALITY_ORDER, key[0], stream.video_quality.value)
+            elif isinstance(stream, video.AudioStreamDownloadURL):
+                self.audio.setdefault(stream.audio_quality.name, stream)
+                audio_rank[stream.audio_quality.name] = _rank(AUDIO_QUALITY_ORDER, stream.audio_quality.name, stream.audio_quality.value)
+        self.video_qualities = sorted(video_rank, key=video_rank.get)
+        self.audio_qualities = sorted(audio_rank, key=audio_rank.get)
+        self._video_rank = video_rank
+
+    def _split(self, quality: str) -> Tuple[List[str], List[str]]:
+        """将已有画质分为低于(由近到远)与高于(由近到远)请求画质的两部分"""
+        target = _rank(VIDEO_QUALITY_ORDER, quality, 0)
+        lower = [q for q in reversed(self.video_qualities) if self._video_rank[q] < target]
+        higher = [q for q in self.video_qualities if self._video_rank[q] > target]
+        return lower, higher
+
+    def find_video(self, quality: str, codec: str, ladder: List[str]) -> Optional[video.VideoStreamDownloadURL]:
+        """按降级阶梯查找视频流: 精确匹配 -> 阶梯中的各项"""
+        if (quality, codec) in self.video:
+            return self.video[(quality, codec)]
+        lower, higher = self._split(quality)
+        codecs = [codec] + [c for c in CODEC_ORDER if c != codec]
+        for rung in ladder:
+            if rung == 'lower':
+                candidates = [(q, codec) for q in lower]
+            elif rung == 'codec':
+                candidates = [(q, c) for q in [quality] + lower for c in codecs[1:]]
+            elif rung == 'higher':
+                candidates = [(q, c) for q in higher for c in codecs]
             else:
-                self.logger.warning("设置的清晰度/编码/音质超过了原视频，自动以最佳画质下载")
-                streamsList = detecter.detect_best_streams()
-                print(streamsList)
-                self.logger.debug(f"获取最清晰流链接成功")
-                videoUrl = streamsList[0].url
-                self.logger.debug(f"v!")
-                audioUrl = streamsList[1].url
-                self.logger.debug(f"a!")
-            self.logger.debug(f"视频流链接:{videoUrl}")
-            self.logger.debug(f"音频流链接:{audioUrl}")
-            return videoUrl, audioUrl
\ No newline at end of file
+                continue
+            for key in candidates:
+                if key in self.video:
+                    return self.video[key]
+        return None
+
+    def find_audio(self, quality: str) -> Optional[video.AudioStreamDownloadURL]:
+        """查找音频流: 精确匹配 -> 最接近的较低音质 -> 最接近的较高音质"""
+        if quality in self.audio:
+            return self.audio[quality]
+        target = _rank(AUDIO_QUALITY_ORDER, quality, 0)
+        ranked = [(_rank(AUDIO_QUALITY_ORDER, q, self.audio[q].audio_quality.value), q) for q in self.audio_qualities]
+        lower = [q for r, q in reversed(ranked) if r < target]
+        higher = [q for r, q in ranked if r > target]
+        candidates = lower + higher
+        return self.audio[candidates[0]] if candidates else None
+
+    @staticmethod
+    def _parse_bandwidth(download_url_data: dict) -> Tuple[Dict[str, int], float]:
+        """从DASH数据中读取每条流声明的码率(bps,按链接索引)与视频时长(秒)"""
+        dash = download_url_data.get('dash') or {}
+        entries = list(dash.get('video') or []) + list(dash.get('audio') or [])
+        for extra in ('dolby', 'flac'):
+            extra_audio = (dash.get(extra) or {}).get('audio')
+            if isinstance(extra_audio, dict):
+                entries.append(extra_audio)
+            elif extra_audio:
+                entries.extend(extra_audio)
+        bandwidth = {}
+        for entry in entries:
+            url = entry.get('baseUrl') or entry.get('base_url')
+            if url:
+                bandwidth[url] = int(entry.get('bandwidth') or 0)
+        duration = dash.get('duration') or (download_url_data.get('timelength') or 0) / 1000
+        return bandwidth, float(duration)
+
+    def bitrate(self, *streams) -> int:
+        """流的总码率(bps),未声明码率的流按0计算"""
+        return sum(self.bandwidth.get(stream.url, 0) for stream in streams if stream)
+
+    def estimate_bytes(self, *streams) -> int:
+        """按 码率 x 时长 估算流的总字节数"""
+        return int(self.bitrate(*streams) * self.duration / 8)
+
+    def _fits(self, max_bitrate: Optional[int], max_bytes: Optional[int], *streams) -> bool:
+        if max_bitrate and self.bitrate(*streams) > max_bitrate:
+            return False
+        if max_bytes and self.estimate_bytes(*streams) > max_bytes:
+            return False
+        return True
+
+    def find_audio_within_budget(self, max_bitrate: Optional[int],
+                                 max_bytes: Optional[int]) -> Optional[video.AudioStreamDownloadURL]:
+        """仅音频模式: 在预算内选择音质最高的音频流,都超出预算时退回码率最低的音频流"""
+        audios = [self.audio[q] for q in reversed(self.audio_qualities)]
+        for audioStream in audios:
+            if self._fits(max_bitrate, max_bytes, audioStream):
+                return audioStream
+        if not audios:
+            return None
+        get_logger(__name__).warning("所有音频流都超出预算,使用码率最低的音频流")
+        return min(audios, key=self.bitrate)
+
+    def find_within_budget(self, codec: str, max_bitrate: Optional[int], max_bytes: Optional[int]):
+        """
+        在预算内选择画质最高的视频+音频组合
+        同画质下优先使用指定编码,视频画质确定后再选预算内最高的音质;
+        任何组合都超出预算时退回体积最小的组合
+        """
+        def fits(videoStream, audioStream) -> bool:
+            return self._fits(max_bitrate, max_bytes, videoStream, audioStream)
+
+        codecs = [codec] + [c for c in CODEC_ORDER if c != codec]
+        audios = [self.audio[q] for q in reversed(self.audio_qualities)] or [None]
+        videos = [self.video[(q, c)] for q in reversed(self.video_qualities) for c in codecs if (q, c) in self.video]
+        for videoStream in videos:
+            for audioStream in audios:
+                if fits(videoStream, audioStream):
+                    return videoStream, audioStream
+        if not videos:
+            raise ValueError("没有可用的视频流")
+        smallest = min(((v, a) for v in videos for a in audios), key=lambda pair: self.bitrate(*pair))
+        get_logger(__name__).warning("所有视频流都超出预算,使用体积最小的组合")
+        return smallest
+
+    def describe(self) -> str:
+        """可选流的简要说明,用于错误信息"""
+        return ', '.join(f"{q}/{c}" for q in self.video_qualities for c in CODEC_ORDER if (q, c) in self.video)
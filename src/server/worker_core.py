@@ -0,0 +1,55 @@
+import click
+import socket
+import os
+from bilibili_api import select_client
+from pathlib import Path
+
+from src.common.param_helps.server_help import *
+from src.common.param_helps.shared_help import *
+from src.common.logger import configure_logging,get_logger
+from src.server.download_service import DownloadService
+from src.service.remote_task_manager import RemoteTaskManager
+from src.service.task_manager import DEFAULT_LEASE_SECONDS
+from src.common.utils import find_project_root
+
+PROJECT_ROOT = find_project_root()
+DEFAULT_LOG_DIR = PROJECT_ROOT / "logs"/ "worker"
+
+@click.command()
+@click.option('--log-level', default='INFO', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']), help=loglevelHelp)
+@click.option('--coordinator-url', default='http://127.0.0.1:5000', help=coordinatorUrlHelp)
+@click.option('--worker-id', default=None, help=workerIdHelp)
+@click.option('--max-concurrent', default=3, type=int, help=maxConcurrentHelp)
+@click.option('--lease-seconds', default=DEFAULT_LEASE_SECONDS, type=float, help=leaseSecondsHelp)
+@click.option('--log-dir',default=None,help=logDirHelp)
+def run_worker(log_level, coordinator_url, worker_id, max_concurrent, lease_seconds, log_dir):
+    """启动下载工作节点,从协调服务器领取任务"""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    log_dir = Path(log_dir) if log_dir else DEFAULT_LOG_DIR
+    configure_logging(
+        log_path=log_dir / f"worker-{worker_id}.log",
+        log_level=log_level,
+        rotate_size=10
+    )
+    logger = get_logger()
+    select_client("aiohttp")
+    logger.info(f"工作节点{worker_id}连接协调服务器{coordinator_url}")
+
+    task_manager = RemoteTaskManager(
+        coordinator_url,
+        worker_id,
+        max_concurrent_downloads=max_concurrent,
+        lease_seconds=lease_seconds
+    )
+    download_service = DownloadService(task_manager)
+    task_manager.lease_lost_callback = download_service.abort_task
+    task_manager.start_heartbeat()
+    try:
+        download_service._download_worker()
+    except KeyboardInterrupt:
+        logger.info(f"工作节点{worker_id}退出,未完成的任务将在租约到期后由其他节点接手")
+    finally:
+        task_manager.close()
+
+if __name__ == "__main__":
+    run_worker()
@@ -32,6 +32,16 @@ class UnifiedConfigManager:
         self.config = self._postprocess(merged)
         return self.config
 
+    def read_file(self) -> Dict:
+        """重新读取配置文件(不修改当前配置),文件不存在时返回空字典,格式错误时抛出异常"""
+        if not self.config_path.exists():
+            return {}
+        with open(self.config_path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+        if not isinstance(data, dict):
+            raise ValueError(f"配置文件格式不正确: {self.config_path}")
+        return data
+
     def _init_config_path(self, config_path: Optional[str]) -> Path:
         """
         初始化配置文件路径，确保配置文件所在目录存在。
@@ -5,12 +5,29 @@ from bilibili_api import Credential,sync,Geetest,login_v2,GeetestType,select_cli
 from typing import Optional
 import questionary
 import asyncio
+from questionary import Validator, ValidationError
 
-from src.common.utils import CountryCodeValidator
 from src.common.logger import get_logger
+from src.service.rate_limiter import api_guard
 
 select_client("aiohttp")
 
+class CountryCodeValidator(Validator):
+    def validate(self, document):
+        code = document.text
+        # 业务逻辑验证
+        try:
+            if not login_v2.have_code(code):
+                raise ValidationError(
+                    message="无效的国家代码", 
+                    cursor_position=len(code)
+                )
+        except ValueError:  # 如果验证失败抛出异常
+            raise ValidationError(
+                message="非法代码格式",
+                cursor_position=len(code)
+            )
+
 class CookieManager:
     def __init__(self,config_dir:str = "config") -> None:
         """
@@ -74,7 +91,7 @@ class CookieManager:
             
             # 创建凭证对象并验证有效性
             credential = Credential(cookies=cookies)
-            if sync(credential.check_refresh()):
+            if sync(api_guard.call('credential', credential.check_refresh)):
                 self.logger.info(f"加载cookies成功: {alias}.yaml")
             else:
                 self.logger.warning("cookies已过期,需要重新登陆")
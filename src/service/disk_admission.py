@@ -0,0 +1,108 @@
+import os
+import shutil
+from threading import Lock
+from typing import Dict, List, Optional
+from src.common.logger import get_logger
+
+DEFAULT_MIN_FREE_BYTES = 512 * 1024 * 1024  # 每个文件系统保留的最小剩余空间
+
+class DiskReservations:
+    """
+    按文件系统记录下载任务的磁盘空间预留
+    DASH任务在混流时临时m4s文件与输出文件同时存在,峰值占用约为流大小的2倍:
+    缓存目录所在文件系统预留一份,下载目录所在文件系统再预留一份(同一文件系统时合计2倍)
+    """
+
+    def __init__(self, min_free_bytes: int = DEFAULT_MIN_FREE_BYTES):
+        self.logger = get_logger(__name__)
+        self.min_free_bytes = min_free_bytes
+        self._lock = Lock()
+        # task_id -> {fs_key: {"path": 目录, "bytes": 预留字节数, "files": 落在该文件系统上的文件}}
+        self._reservations: Dict[str, Dict[int, Dict]] = {}
+
+    @staticmethod
+    def _existing_dir(path: str) -> str:
+        """返回路径自身或最近的已存在上级目录"""
+        path = os.path.abspath(path)
+        while not os.path.exists(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        return path
+
+    def _fs_key(self, path: str) -> int:
+        return os.stat(self._existing_dir(path)).st_dev
+
+    def _plan(self, cache_dir: str, download_dir: str, stream_bytes: int,
+              temp_files: List[str], output_file: Optional[str]) -> Dict[int, Dict]:
+        """计算任务在各文件系统上需要的空间"""
+        plan: Dict[int, Dict] = {}
+        for directory, files in ((cache_dir, temp_files), (download_dir, [output_file] if output_file else [])):
+            entry = plan.setdefault(self._fs_key(directory), {"path": self._existing_dir(directory), "bytes": 0, "files": []})
+            entry["bytes"] += stream_bytes
+            entry["files"].extend(files)
+        return plan
+
+    @staticmethod
+    def _outstanding(entry: Dict) -> int:
+        """预留中尚未写入磁盘的部分(已写入的字节已经体现在剩余空间里)"""
+        written = sum(os.path.getsize(f) for f in entry["files"] if os.path.exists(f))
+        return max(0, entry["bytes"] - written)
+
+    def _reserved_on(self, fs_key: int) -> int:
+        return sum(self._outstanding(plan[fs_key])
+                   for plan in self._reservations.values() if fs_key in plan)
+
+    def reserve(self, task_id: str, cache_dir: str, download_dir: str, stream_bytes: int,
+                temp_files: List[str] = (), output_file: Optional[str] = None) -> bool:
+        """
+        为任务预留磁盘空间
+        Args:
+            task_id: 任务ID
+            cache_dir: 临时文件所在目录
+            download_dir: 输出文件所在目录
+            stream_bytes: 所选音视频流的总字节数
+            temp_files: 临时文件路径,用于扣除已写入的部分
+            output_file: 输出文件路径
+        Returns:
+            bool: 空间足够并已预留返回True
+        """
+        try:
+            plan = self._plan(cache_dir, download_dir, stream_bytes, list(temp_files), output_file)
+        except OSError as e:
+            self.logger.error(f"计算磁盘预留失败: {str(e)}")
+            return True  # 无法判断时不阻塞任务
+        with self._lock:
+            self._reservations.pop(task_id, None)
+            for fs_key, entry in plan.items():
+                free = shutil.disk_usage(entry["path"]).free
+                available = free - self._reserved_on(fs_key) - self.min_free_bytes
+                if self._outstanding(entry) > available:
+                    self.logger.info(
+                        f"磁盘空间不足,任务{task_id}暂缓执行: {entry['path']} "
+                        f"需要{self._outstanding(entry)}字节,可用{max(available, 0)}字节")
+                    return False
+            self._reservations[task_id] = plan
+            return True
+
+    def release(self, task_id: str) -> None:
+        """释放任务的磁盘预留"""
+        with self._lock:
+            self._reservations.pop(task_id, None)
+
+    def snapshot(self) -> List[Dict]:
+        """当前各文件系统的预留情况"""
+        with self._lock:
+            filesystems: Dict[int, Dict] = {}
+            for task_id, plan in self._reservations.items():
+                for fs_key, entry in plan.items():
+                    fs = filesystems.setdefault(fs_key, {"path": entry["path"], "reserved_bytes": 0, "tasks": {}})
+                    outstanding = self._outstanding(entry)
+                    fs["reserved_bytes"] += outstanding
+                    fs["tasks"][task_id] = outstanding
+            for fs in filesystems.values():
+                usage = shutil.disk_usage(fs["path"])
+                fs["free_bytes"] = usage.free
+                fs["total_bytes"] = usage.total
+            return list(filesystems.values())
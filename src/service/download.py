@@ -2,121 +2,261 @@ import os
 import json
 import aiohttp
 import asyncio
+from dataclasses import dataclass
+from time import monotonic
 from tqdm import tqdm
-from typing import Callable, Dict, Optional
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
 from bilibili_api import HEADERS
 
 from src.common.logger import get_logger
+from src.service.metrics import metrics
+from src.service.rate_limiter import TokenBucket
+DEFAULT_POOL_SIZE = 32  # 连接池最大连接数
+DEFAULT_MAX_RETRIES = 3  # 传输中断后的最大重试次数
+RETRY_BACKOFF = 1.0      # 重试间隔基数(秒),按2的幂增长
+PROGRESS_SUFFIX = '.progress'  # 续传记录保存在<文件路径>.progress,每个文件一个,多个工作节点互不覆盖
+PROGRESS_SAVE_INTERVAL = 1.0   # 下载过程中续传记录的保存间隔(秒)
+
+@dataclass
+class TransferStats:
+    """单个文件的传输统计,由Downloader.download填写"""
+    host: Optional[str] = None
+    bytes: int = 0            # 本次传输的字节数(不含续传前已下载的部分)
+    duration: float = 0.0     # 传输耗时(秒,不含重试等待)
+    peak_bps: float = 0.0     # 按秒统计的峰值速率
+    retries: int = 0
+
+    @property
+    def avg_bps(self) -> float:
+        return self.bytes / self.duration if self.duration > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "bytes": self.bytes,
+            "duration": round(self.duration, 3),
+            "avg_bps": round(self.avg_bps),
+            "peak_bps": round(max(self.peak_bps, self.avg_bps)),
+            "retries": self.retries
+        }
+
+class DownloadError(Exception):
+    """下载流失败(已重试)"""
+
+class IncompleteDownloadError(Exception):
+    """连接提前结束,文件没有下载完整"""
+
+# 可以通过断点续传重试的错误
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, IncompleteDownloadError)
+
 class Downloader:
-    def __init__(self, save_dir: str = "."):
+    def __init__(self, save_dir: str = ".", pool_size: int = DEFAULT_POOL_SIZE,
+                 max_retries: int = DEFAULT_MAX_RETRIES, retry_backoff: float = RETRY_BACKOFF):
         self.logger = get_logger(__name__)
         self.save_dir = save_dir
-        self.progress_file = os.path.join(save_dir, ".download_progress.json")
-        self._load_progress()
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.bandwidth: Optional[TokenBucket] = None  # 所有下载共用的带宽上限,为空时不限速
+        metrics.connection_pool_size.set(pool_size)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
 
-    def _load_progress(self) -> None:
-        """加载已保存的下载进度"""
-        self.progress: Dict[str, Dict] = {}
-        if os.path.exists(self.progress_file):
-            try:
-                with open(self.progress_file, 'r', encoding='utf-8') as f:
-                    self.progress = json.load(f)
-            except Exception as e:
-                self.logger.error(f"加载下载进度文件失败: {str(e)}")
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的连接池会话,同一事件循环中的所有下载(包括多P子任务)复用连接"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+            )
+            self._session_loop = loop
+        return self._session
+
+    def set_bandwidth_limit(self, bytes_per_second: int) -> None:
+        """设置总下载带宽(字节/秒),0表示不限速;正在进行的下载从下一个数据块起按新上限限速"""
+        if bytes_per_second <= 0:
+            self.bandwidth = None
+        elif self.bandwidth is None:
+            self.bandwidth = TokenBucket(bytes_per_second, bytes_per_second)
+        else:
+            self.bandwidth.configure(bytes_per_second, bytes_per_second)
+
+    async def close(self) -> None:
+        """关闭连接池"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    @staticmethod
+    def _progress_path(file_path: str) -> str:
+        return file_path + PROGRESS_SUFFIX
+
+    def _load_progress(self, file_path: str) -> Optional[Dict]:
+        """读取文件的续传记录"""
+        try:
+            with open(self._progress_path(file_path), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.error(f"加载下载进度文件失败: {str(e)}")
+            return None
 
-    def _save_progress(self) -> None:
-        """保存下载进度到文件"""
+    def _save_progress(self, file_path: str, record: Dict) -> None:
+        """保存文件的续传记录(先写临时文件再替换,中断时不会留下不完整的记录)"""
+        path = self._progress_path(file_path)
         try:
-            with open(self.progress_file, 'w', encoding='utf-8') as f:
-                json.dump(self.progress, f, ensure_ascii=False, indent=2)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
         except Exception as e:
             self.logger.error(f"保存下载进度文件失败: {str(e)}")
 
-    async def _get_file_size(self, url: str) -> Optional[int]:
+    def _clear_progress(self, file_path: str) -> None:
+        try:
+            os.remove(self._progress_path(file_path))
+        except FileNotFoundError:
+            pass
+
+    async def get_file_size(self, url: str) -> Optional[int]:
         """获取远程文件大小"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.head(url, headers=HEADERS) as response:
-                    return int(response.headers.get('content-length', 0))
+            session = await self._get_session()
+            async with session.head(url, headers=HEADERS) as response:
+                return int(response.headers.get('content-length', 0))
         except Exception as e:
             self.logger.error(f"获取文件大小失败: {str(e)}")
             return None
 
     async def download(self, url: str, file_path: str, 
                   chunk_size: int = 1024*1024,
-                  progress_callback: Optional[Callable[[float], None]] = None) -> tuple[bool, Optional[str]]:
-        """异步下载文件，支持断点续传
+                  progress_callback: Optional[Callable[[float], None]] = None,
+                  stats: Optional[TransferStats] = None) -> tuple[bool, Optional[str]]:
+        """异步下载文件，支持断点续传,传输中断时从已下载的位置重试
         
         Args:
             url: 下载链接
             file_path: 保存路径
             chunk_size: 分块大小，默认1MB
             progress_callback: 进度回调函数，参数为下载进度百分比
+            stats: 传输统计,传入时由下载过程填写
             
         Returns:
             tuple[bool, Optional[str]]: (是否成功, 错误信息)
         """
+        stats = stats if stats is not None else TransferStats()
+        stats.host = urlparse(url).hostname
+        for attempt in range(self.max_retries + 1):
+            try:
+                success, error_msg = await self._download(url, file_path, chunk_size, progress_callback, stats)
+                if not success:
+                    metrics.download_errors.inc(error='FileSizeUnavailable')
+                return success, error_msg
+            except RETRYABLE_ERRORS as e:
+                error = e
+                if attempt == self.max_retries or (isinstance(e, aiohttp.ClientResponseError) and e.status < 500):
+                    # 4xx(如签名链接过期)重试无意义,交给上层重新解析
+                    break
+                delay = self.retry_backoff * 2 ** attempt
+                metrics.retries.inc(error=type(e).__name__)
+                stats.retries += 1
+                self.logger.warning(f"下载中断({type(e).__name__}: {str(e)}),{delay}秒后第{attempt + 1}次重试")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                error = e
+                break
+        metrics.download_errors.inc(error=type(error).__name__)
+        self.logger.error(f"下载失败: {str(error)}")
+        return False, str(error) or type(error).__name__
+
+    async def _download(self, url: str, file_path: str, chunk_size: int,
+                         progress_callback: Optional[Callable[[float], None]],
+                         stats: TransferStats) -> tuple[bool, Optional[str]]:
+        """下载一次,可重试的错误以异常抛出"""
+        # 获取文件信息
+        file_size = await self.get_file_size(url)
+        if not file_size:
+            return False, "获取文件大小失败"
+
+        # 检查是否有未完成的下载
+        # 进度按文件路径记录,签名链接刷新后仍可续传;缓存目录位于共享存储时,任务被其他工作节点接手后也可续传
+        # 本地没有续传记录(或文件大小已变化)时从头下载,不信任来历不明的临时文件
+        downloaded_size = 0
+        record = self._load_progress(file_path)
+        if record and record.get('file_size') == file_size:
+            if os.path.exists(file_path):
+                downloaded_size = os.path.getsize(file_path)
+                if downloaded_size >= file_size:
+                    return True, None
+
+        # 设置请求头，支持断点续传
+        headers = HEADERS.copy()
+        if downloaded_size > 0:
+            headers['Range'] = f'bytes={downloaded_size}-'
+
+        # 指标在热循环外绑定标签
+        bytes_counter = metrics.bytes_downloaded.labels(host=stats.host or '')
+        throughput = metrics.throughput
+
+        # 开始下载(复用共享连接池)
+        session = await self._get_session()
+        metrics.active_connections.inc()
+        started = window_start = monotonic()
+        window_bytes = 0
         try:
-            # 获取文件信息
-            file_size = await self._get_file_size(url)
-            if not file_size:
-                return False, "获取文件大小失败"
-
-            # 检查是否有未完成的下载
-            downloaded_size = 0
-            if url in self.progress:
-                if os.path.exists(file_path):
-                    downloaded_size = os.path.getsize(file_path)
-                    if downloaded_size >= file_size:
-                        return True, None
-
-            # 设置请求头，支持断点续传
-            headers = HEADERS.copy()
-            if downloaded_size > 0:
-                headers['Range'] = f'bytes={downloaded_size}-'
-
-            # 开始下载
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    mode = 'ab' if downloaded_size > 0 else 'wb'
-                    
-                    # 更新进度信息
-                    self.progress[url] = {
-                        'file_path': file_path,
-                        'file_size': file_size,
-                        'downloaded_size': downloaded_size
-                    }
-                    self._save_progress()
-
-                    # 使用tqdm显示下载进度
-                    with tqdm(total=file_size, initial=downloaded_size,
-                             unit='iB', unit_scale=True) as pbar:
-                        with open(file_path, mode) as f:
-                            async for chunk in response.content.iter_chunked(chunk_size):
-                                if chunk:
-                                    f.write(chunk)
-                                    downloaded_size += len(chunk)
-                                    current_progress = downloaded_size / file_size * 100  # 计算百分比
-                                    self.logger.debug(f"下载进度: {current_progress:.2f}%")
-                                    if progress_callback:
-                                        progress_callback(current_progress)
-                                        
-                                    pbar.update(len(chunk))
+            async with session.get(url, headers=headers) as response:
+                response.raise_for_status()
+                mode = 'ab' if downloaded_size > 0 else 'wb'
+
+                # 更新进度信息
+                record = {
+                    'url': url,
+                    'file_size': file_size,
+                    'downloaded_size': downloaded_size
+                }
+                self._save_progress(file_path, record)
+                last_save = monotonic()
+
+                # 使用tqdm显示下载进度
+                with tqdm(total=file_size, initial=downloaded_size,
+                         unit='iB', unit_scale=True) as pbar:
+                    with open(file_path, mode) as f:
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            if chunk:
+                                f.write(chunk)
+                                downloaded_size += len(chunk)
+                                bytes_counter.inc(len(chunk))
+                                throughput.add(len(chunk))
+                                stats.bytes += len(chunk)
+                                window_bytes += len(chunk)
+                                now = monotonic()
+                                if now - window_start >= 1:
+                                    stats.peak_bps = max(stats.peak_bps, window_bytes / (now - window_start))
+                                    window_start, window_bytes = now, 0
+                                current_progress = downloaded_size / file_size * 100  # 计算百分比
+                                self.logger.debug(f"下载进度: {current_progress:.2f}%")
+                                if progress_callback:
+                                    progress_callback(current_progress)
                                     
-                                    # 定期保存进度
-                                    self.progress[url]['downloaded_size'] = downloaded_size
-                                    self._save_progress()
-
-            # 下载完成后清理进度信息
-            if downloaded_size >= file_size:
-                if url in self.progress:
-                    del self.progress[url]
-                    self._save_progress()
-                return True, None
-            else:
-                return False, "下载未完成"
+                                pbar.update(len(chunk))
 
-        except Exception as e:
-            error_msg = str(e)
-            self.logger.error(f"下载失败: {error_msg}")
-            return False, error_msg
\ No newline at end of file
+                                bandwidth = self.bandwidth
+                                if bandwidth is not None:
+                                    wait = bandwidth.reserve(len(chunk))
+                                    if wait > 0:
+                                        await asyncio.sleep(wait)
+                                
+                                # 定期保存进度(续传从文件实际大小继续,记录只需大致最新)
+                                record['downloaded_size'] = downloaded_size
+                                if now - last_save >= PROGRESS_SAVE_INTERVAL:
+                                    self._save_progress(file_path, record)
+                                    last_save = now
+        finally:
+            metrics.active_connections.dec()
+            stats.duration += monotonic() - started
+
+        # 下载完成后清理进度信息
+        if downloaded_size < file_size:
+            raise IncompleteDownloadError(f"下载未完成({downloaded_size}/{file_size}字节)")
+        self._clear_progress(file_path)
+        return True, None
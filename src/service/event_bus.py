@@ -0,0 +1,151 @@
+import asyncio
+import json
+from collections import deque
+from dataclasses import dataclass
+from threading import Condition
+from time import monotonic
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+DEFAULT_BUFFER_SIZE = 10000       # 环形缓冲区保留的事件数
+DEFAULT_PROGRESS_INTERVAL = 0.5   # 同一任务的进度事件最小间隔(秒)
+
+@dataclass
+class TaskEvent:
+    event_id: int
+    event: str               # created / status / progress
+    task_id: str
+    data: Dict[str, Any]
+
+def format_sse(event_id: Optional[str], event: str, data: Dict[str, Any]) -> str:
+    """格式化为一条SSE消息,event_id为None时不改变客户端记录的Last-Event-ID"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class EventBus:
+    """
+    任务事件总线
+    事件按递增ID保存在环形缓冲区中,断线重连的客户端凭Last-Event-ID补发错过的事件;
+    同步(Flask线程)与异步(aiohttp事件循环)订阅方都可以等待新事件
+    事件ID在进程内从1开始计数,推送给客户端时加上epoch前缀("<epoch>-<n>"),服务器重启后旧ID不会被误认
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
+                 epoch: str = ""):
+        self.progress_interval = progress_interval
+        self.epoch = epoch
+        self._events: "deque[TaskEvent]" = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._progress_at: Dict[str, float] = {}
+        self._cond = Condition()
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def format_id(self, event_id: int) -> str:
+        """推送给客户端的事件ID"""
+        return f"{self.epoch}-{event_id}"
+
+    def parse_id(self, value: str) -> Optional[int]:
+        """
+        解析客户端的Last-Event-ID,不属于当前事件序列(服务器已重启或ID超前)时返回None
+        Raises:
+            ValueError: 格式不正确
+        """
+        epoch, _, event_id = value.rpartition('-')
+        event_id = int(event_id)
+        if epoch != self.epoch or event_id > self._last_id:
+            return None
+        return event_id
+
+    def publish(self, event: str, task_id: str, data: Dict[str, Any]) -> Optional[int]:
+        """
+        发布事件,返回事件ID
+        进度事件按任务限流,间隔不足progress_interval时丢弃并返回None(随后的状态事件会带上最新进度)
+        """
+        now = monotonic()
+        with self._cond:
+            if event == 'progress':
+                if now - self._progress_at.get(task_id, 0) < self.progress_interval:
+                    return None
+                self._progress_at[task_id] = now
+            else:
+                self._progress_at.pop(task_id, None)
+            self._last_id += 1
+            self._events.append(TaskEvent(self._last_id, event, task_id, data))
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(waiter.set)
+        return self._last_id
+
+    def since(self, last_id: int, task_ids: Optional[Set[str]] = None) -> Tuple[List[TaskEvent], bool, int]:
+        """
+        获取last_id之后的事件
+        Returns:
+            (事件列表, 是否有事件已被环形缓冲区丢弃, 当前最新事件ID)
+        """
+        with self._cond:
+            if last_id >= self._last_id:
+                return [], False, self._last_id
+            truncated = bool(self._events) and self._events[0].event_id > last_id + 1
+            events = [e for e in self._events if e.event_id > last_id
+                      and (task_ids is None or e.task_id in task_ids)]
+            return events, truncated, self._last_id
+
+    def wait(self, last_id: int, timeout: float) -> bool:
+        """阻塞等待last_id之后的新事件,返回是否有新事件"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._last_id > last_id, timeout)
+
+    async def wait_async(self, last_id: int, timeout: float) -> bool:
+        """在事件循环中等待last_id之后的新事件,返回是否有新事件"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            if self._last_id > last_id:
+                return True
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+
+class EventSubscription:
+    """一个SSE连接的订阅状态,由Web框架适配层驱动"""
+
+    KEEPALIVE_INTERVAL = 15  # 没有事件时发送注释行保持连接
+
+    def __init__(self, bus: EventBus, last_event_id: Optional[str] = None, task_ids: Optional[Set[str]] = None):
+        """
+        Raises:
+            ValueError: Last-Event-ID格式不正确
+        """
+        self.bus = bus
+        self.task_ids = task_ids
+        # 没有Last-Event-ID时只推送之后的新事件;
+        # Last-Event-ID来自重启前的服务器时无法定位错过的事件,先发送resync再推送新事件
+        last_id = bus.parse_id(last_event_id) if last_event_id else bus.last_id
+        self._resync = last_id is None
+        self.last_id = bus.last_id if last_id is None else last_id
+
+    def fetch(self) -> List[str]:
+        """
+        取出新事件并格式化为SSE消息
+        有事件已被丢弃或Last-Event-ID不属于当前服务器实例时先发送resync,客户端应重新拉取任务列表
+        """
+        events, truncated, head = self.bus.since(self.last_id, self.task_ids)
+        messages = []
+        if self._resync:
+            messages.append(format_sse(None, 'resync', {"reason": "服务器已重启,请重新获取任务状态"}))
+            self._resync = False
+        elif truncated:
+            messages.append(format_sse(None, 'resync', {"reason": "事件缓冲区已覆盖,请重新获取任务状态"}))
+        messages.extend(format_sse(self.bus.format_id(e.event_id), e.event, e.data) for e in events)
+        self.last_id = head
+        return messages
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Iterator, Optional, Tuple
+
+CHUNK_SIZE = 256 * 1024
+POLL_INTERVAL = 0.2      # 等待新数据写入的轮询间隔(秒)
+STALL_TIMEOUT = 60       # 文件超过该秒数没有增长时结束响应
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个Range请求头
+    Returns:
+        (起点, 终点(含)),没有Range或包含多个区间时返回None(按完整文件响应)
+    Raises:
+        ValueError: 区间无法满足
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    try:
+        if not start:
+            # bytes=-N: 最后N个字节
+            length = int(end)
+            if length <= 0:
+                raise ValueError(header)
+            return max(0, size - length), size - 1
+        first = int(start)
+        last = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        raise ValueError(f"非法的Range: {header}")
+    if first >= size or last < first:
+        raise ValueError(f"Range超出文件大小: {header}")
+    return first, last
+
+class GrowingFile:
+    """
+    正在写入的文件的一个区间
+    读到尚未写入的位置时等待数据到达;下载结束(is_alive返回False)且没有新数据,
+    或超过stall_timeout没有增长时结束。
+    文件在打开后被删除(混流完成后清理临时文件)不影响继续读取
+    """
+
+    def __init__(self, path: str, start: int, end: int, is_alive: Callable[[], bool],
+                 poll_interval: float = POLL_INTERVAL, stall_timeout: float = STALL_TIMEOUT):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.is_alive = is_alive
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+        self._file = None
+        self._position = start
+        self._last_growth = time.monotonic()
+
+    def _read(self) -> Optional[bytes]:
+        """读取已写入的数据;暂无新数据返回b'',应结束响应时返回None"""
+        if self._position > self.end:
+            return None
+        # 先判断下载是否仍在进行再读取,保证结束前写入的数据都能读到
+        waiting = self._waiting()
+        if self._file is None:
+            try:
+                self._file = open(self.path, 'rb')
+            except FileNotFoundError:
+                # 下载尚未写入第一个数据块
+                return b'' if waiting else None
+            self._file.seek(self._position)
+        data = self._file.read(min(CHUNK_SIZE, self.end + 1 - self._position))
+        if data:
+            self._position += len(data)
+            self._last_growth = time.monotonic()
+            return data
+        return b'' if waiting else None
+
+    def _waiting(self) -> bool:
+        """是否继续等待新数据"""
+        return self.is_alive() and time.monotonic() - self._last_growth < self.stall_timeout
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def chunks(self) -> Iterator[bytes]:
+        """同步读取(Flask请求线程)"""
+        try:
+            while True:
+                data = self._read()
+                if data is None:
+                    return
+                if data:
+                    yield data
+                else:
+                    time.sleep(self.poll_interval)
+        finally:
+            self.close()
+
+    async def achunks(self) -> AsyncIterator[bytes]:
+        """异步读取(aiohttp事件循环)"""
+        try:
+            while True:
+                data = self._read()
+                if data is None:
+                    return
+                if data:
+                    yield data
+                else:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            self.close()
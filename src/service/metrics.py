@@ -0,0 +1,199 @@
+from bisect import bisect_left
+from collections import deque
+from threading import Lock
+from time import monotonic
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# 阶段耗时直方图的桶上界(秒)
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+THROUGHPUT_WINDOW = 10  # 计算下载速率的滑动窗口(秒)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames: Sequence[str], key: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Bound:
+    """绑定了标签值的指标,热循环中先绑定再更新,避免每次组装标签"""
+
+    __slots__ = ('_metric', '_key')
+
+    def __init__(self, metric: "Counter", key: Tuple[str, ...]):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1) -> None:
+        self._metric._add(self._key, amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._metric._add(self._key, -amount)
+
+    def set(self, value: float) -> None:
+        self._metric._set(self._key, value)
+
+    def observe(self, value: float) -> None:
+        self._metric._observe(self._key, value)
+
+class Counter:
+    """单调递增计数器"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = Lock()
+
+    def labels(self, **labels) -> _Bound:
+        return _Bound(self, tuple(str(labels.get(name, '')) for name in self.labelnames))
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        self.labels(**labels).inc(amount)
+
+    def _add(self, key: Tuple[str, ...], amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0)]
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Gauge(Counter):
+    """可增可减的瞬时值"""
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        self.labels(**labels).set(value)
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.labels(**labels).dec(amount)
+
+    def _set(self, key: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def replace(self, values: Dict[Tuple[str, ...], float]) -> None:
+        """整体替换全部标签的值(用于抓取时重新统计的指标)"""
+        with self._lock:
+            self._values = dict(values)
+
+class Histogram(Counter):
+    """按桶统计的分布"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._hist: Dict[Tuple[str, ...], List[float]] = {}  # 各桶计数..., 总和
+
+    def observe(self, value: float, **labels) -> None:
+        self.labels(**labels).observe(value)
+
+    def _observe(self, key: Tuple[str, ...], value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            hist = self._hist.get(key)
+            if hist is None:
+                hist = self._hist[key] = [0] * (len(self.buckets) + 2)
+            hist[index] += 1
+            hist[-1] += value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(key, list(hist)) for key, hist in self._hist.items()]
+        for key, hist in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), hist):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(hist[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+class RateWindow:
+    """按秒分桶的滑动窗口,计算最近一段时间的平均速率"""
+
+    def __init__(self, seconds: int = THROUGHPUT_WINDOW):
+        self.seconds = seconds
+        self._buckets: "deque[List[float]]" = deque(maxlen=seconds + 1)  # [秒, 数量]
+        self._lock = Lock()
+
+    def add(self, amount: float) -> None:
+        second = int(monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += amount
+            else:
+                self._buckets.append([second, amount])
+
+    def rate(self) -> float:
+        # 当前这一秒尚未结束,只统计之前完整的秒
+        now = int(monotonic())
+        with self._lock:
+            total = sum(amount for second, amount in self._buckets if now - self.seconds <= second < now)
+        return total / self.seconds
+
+class Metrics:
+    """下载引擎指标,以Prometheus文本格式导出"""
+
+    def __init__(self):
+        self._metrics: List[Counter] = []
+        self.throughput = RateWindow()
+        self.bytes_downloaded = self._register(Counter(
+            'btool_download_bytes_total', '已下载的字节数', ('host',)))
+        self.bytes_per_second = self._register(Gauge(
+            'btool_download_bytes_per_second', f'最近{THROUGHPUT_WINDOW}秒的平均下载速率'))
+        self.active_connections = self._register(Gauge(
+            'btool_download_active_connections', '正在传输数据的连接数'))
+        self.connection_pool_size = self._register(Gauge(
+            'btool_download_connection_pool_size', '连接池最大连接数'))
+        self.tasks = self._register(Gauge(
+            'btool_tasks', '各状态的任务数', ('status',)))
+        self.slots_used = self._register(Gauge(
+            'btool_download_slots_used', '本地下载占用的槽位数'))
+        self.slots_total = self._register(Gauge(
+            'btool_download_slots_total', '本地下载的最大并发数'))
+        self.leased_tasks = self._register(Gauge(
+            'btool_leased_tasks', '被工作节点领取的任务数'))
+        self.stage_duration = self._register(Histogram(
+            'btool_stage_duration_seconds', '各阶段耗时', ('stage',)))
+        self.retries = self._register(Counter(
+            'btool_download_retries_total', '下载重试次数', ('error',)))
+        self.download_errors = self._register(Counter(
+            'btool_download_errors_total', '重试后仍失败的下载次数', ('error',)))
+        self.task_failures = self._register(Counter(
+            'btool_task_failures_total', '失败的任务数', ('error',)))
+        self.loop_lag = self._register(Gauge(
+            'btool_event_loop_lag_seconds', '下载调度事件循环的延迟'))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """导出为Prometheus文本格式"""
+        self.bytes_per_second.set(self.throughput.rate())
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
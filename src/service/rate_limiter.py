@@ -0,0 +1,208 @@
+import asyncio
+from threading import Lock
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from src.common.logger import get_logger
+
+# 各接口的令牌桶预算: (每秒令牌数, 桶容量)
+DEFAULT_BUDGETS: Dict[str, Tuple[float, float]] = {
+    'playurl': (2.0, 4),      # Video.get_download_url
+    'info': (2.0, 4),         # Video.get_info
+    'listing': (1.0, 3),      # 收藏夹/合集/投稿列表分页
+    'credential': (0.2, 1),   # Credential.check_refresh
+    'default': (1.0, 2)
+}
+RISK_CONTROL_CODES = (-352, -412)  # B站风控返回码
+RISK_CONTROL_STATUS = 412          # 风控时的HTTP状态码
+
+def is_risk_control(error: Exception) -> bool:
+    """判断异常是否为B站风控(HTTP 412 / 返回码-352)"""
+    return (getattr(error, 'code', None) in RISK_CONTROL_CODES
+            or getattr(error, 'status', None) == RISK_CONTROL_STATUS)
+
+class TokenBucket:
+    """令牌桶,不依赖事件循环,可在多个线程/事件循环之间共享"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        预订令牌(允许透支),返回调用方需要等待的秒数,0表示可以立即执行
+        透支的部分按速率排队,保证并发调用方依次放行
+        """
+        with self._lock:
+            self._refill(monotonic())
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def configure(self, rate: float, capacity: float) -> None:
+        """调整速率与容量"""
+        with self._lock:
+            self._refill(monotonic())
+            self.rate = rate
+            self.capacity = capacity
+            self._tokens = min(self._tokens, capacity)
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(monotonic())
+            return self._tokens
+
+class CircuitBreaker:
+    """
+    风控熔断器
+    出现412/-352时断开并指数退避,退避结束后只放行一个探测请求,成功后恢复
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, base_backoff: float = 30, max_backoff: float = 600, probe_interval: float = 1.0):
+        self.logger = get_logger(__name__)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.probe_interval = probe_interval
+        self.state = self.CLOSED
+        self.trips = 0              # 连续触发次数
+        self.total_trips = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._lock = Lock()
+
+    def wait_time(self) -> float:
+        """当前需要等待的秒数,0表示放行"""
+        with self._lock:
+            now = monotonic()
+            if self.state == self.CLOSED:
+                return 0.0
+            if self.state == self.OPEN:
+                if now < self._open_until:
+                    return self._open_until - now
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return self.probe_interval
+            self._probing = True
+            return 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                self.logger.info("API风控解除,恢复解析")
+            self.state = self.CLOSED
+            self.trips = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """非风控错误,探测请求失败时放行下一个探测"""
+        with self._lock:
+            self._probing = False
+
+    def trip(self) -> float:
+        """触发风控,返回退避秒数"""
+        with self._lock:
+            self.trips += 1
+            self.total_trips += 1
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.trips - 1))
+            self._open_until = monotonic() + backoff
+            self.state = self.OPEN
+            self._probing = False
+            self.logger.warning(f"触发B站风控,暂停API调用{backoff:.0f}秒")
+            return backoff
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_trips": self.trips,
+                "total_trips": self.total_trips,
+                "retry_in": max(0.0, self._open_until - monotonic()) if self.state == self.OPEN else 0.0
+            }
+
+class ApiGuard:
+    """
+    进程内共享的B站API调用保护
+    每个接口一个令牌桶,所有接口共用一个风控熔断器;
+    下载数据流不经过这里,熔断期间已解析的下载不受影响
+    """
+
+    def __init__(self, budgets: Dict[str, Tuple[float, float]] = None, max_retries: int = 3):
+        self.max_retries = max_retries  # 风控后退避重试的次数
+        self.breaker = CircuitBreaker()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = Lock()
+        self.configure(budgets or DEFAULT_BUDGETS)
+
+    def configure(self, budgets: Dict[str, Tuple[float, float]]) -> None:
+        """设置或调整各接口的预算"""
+        with self._lock:
+            for endpoint, (rate, capacity) in budgets.items():
+                if endpoint in self._buckets:
+                    self._buckets[endpoint].configure(float(rate), float(capacity))
+                else:
+                    self._buckets[endpoint] = TokenBucket(float(rate), float(capacity))
+
+    def _bucket(self, endpoint: str) -> TokenBucket:
+        return self._buckets.get(endpoint) or self._buckets['default']
+
+    def _count(self, endpoint: str, field: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"calls": 0, "throttled": 0, "risk_control": 0, "errors": 0})
+            stats[field] += 1
+
+    async def call(self, endpoint: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        在限流与熔断保护下调用API
+        Args:
+            endpoint: 接口名,用于选择令牌桶
+            func: 返回协程的API函数
+        """
+        for attempt in range(self.max_retries + 1):
+            while (wait := self.breaker.wait_time()) > 0:
+                await asyncio.sleep(min(wait, 5.0))
+            wait = self._bucket(endpoint).reserve()
+            if wait > 0:
+                self._count(endpoint, "throttled")
+                await asyncio.sleep(wait)
+            self._count(endpoint, "calls")
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if is_risk_control(e):
+                    self._count(endpoint, "risk_control")
+                    self.breaker.trip()
+                    if attempt < self.max_retries:
+                        continue
+                else:
+                    self._count(endpoint, "errors")
+                    self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict:
+        """限流器与熔断器的当前状态"""
+        with self._lock:
+            endpoints = {}
+            for endpoint in {**self._buckets, **self._stats}:
+                bucket = self._bucket(endpoint)
+                endpoints[endpoint] = {
+                    "rate": bucket.rate,
+                    "capacity": bucket.capacity,
+                    "tokens": round(bucket.tokens, 2),
+                    **self._stats.get(endpoint, {})
+                }
+        return {"breaker": self.breaker.stats(), "endpoints": endpoints}
+
+api_guard = ApiGuard()  # 进程内共享实例
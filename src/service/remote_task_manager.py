@@ -0,0 +1,215 @@
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+from src.common.models import DownloadTask, VideoConfig, DownloadConfig, TaskStatus
+from src.common.logger import get_logger
+from src.service.task_manager import DEFAULT_LEASE_SECONDS
+from src.service.disk_admission import DiskReservations
+
+class RemoteTaskManager:
+    """
+    远程任务管理器
+    通过协调服务器(API服务器)的租约接口领取任务,接口与TaskManager保持一致,
+    可以直接交给DownloadService使用
+    进度、传输统计与任务结果由后台上报线程按顺序发送,调用方(下载调度的事件循环)不等待网络请求
+    """
+
+    def __init__(self, coordinator_url: str, worker_id: str,
+                 max_concurrent_downloads: int = 3,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 progress_interval: float = 1.0):
+        self.logger = get_logger(__name__)
+        self.base_url = coordinator_url.rstrip('/')
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.progress_interval = progress_interval  # 进度上报最小间隔(秒)
+        self._max_concurrent_downloads = max_concurrent_downloads
+        self._session = requests.Session()
+        self._reporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")  # 单线程,保证上报顺序
+        self._lock = threading.Lock()
+        self._running_tasks: Dict[str, DownloadTask] = {}
+        self._last_report: Dict[str, float] = {}
+        self._lost_tasks = set()
+        self.lease_lost_callback: Optional[Callable[[str], None]] = None  # 租约被收回时调用,参数为任务ID
+        self._stop_event = threading.Event()
+        self._heartbeat_thread = None
+        self._claim_backoff_until = 0.0  # 归还任务后暂停领取,避免反复领取放不下的任务
+        self.disk = DiskReservations()
+
+    def _post(self, path: str, payload: Dict) -> Optional[Dict]:
+        """向协调服务器发送请求,失败时返回None"""
+        payload = {"worker_id": self.worker_id, "lease_seconds": self.lease_seconds, **payload}
+        try:
+            response = self._session.post(f"{self.base_url}{path}", json=payload, timeout=10)
+            result = response.json()
+            if result.get("status") != "success":
+                self.logger.warning(f"协调服务器拒绝请求{path}: {result.get('message')}")
+                return None
+            return result
+        except Exception as e:
+            self.logger.error(f"请求协调服务器失败{path}: {str(e)}")
+            return None
+
+    def _report(self, path: str, payload: Dict) -> None:
+        """交给上报线程发送,不等待结果"""
+        try:
+            self._reporter.submit(self._post, path, payload)
+        except RuntimeError:
+            # 已关闭(节点退出),未完成的任务在租约到期后由其他节点接手
+            self.logger.warning(f"上报线程已停止,丢弃请求{path}")
+
+    def start_heartbeat(self):
+        """启动心跳线程,按租约时长的三分之一周期续约"""
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._heartbeat_thread.start()
+        self.logger.info(f"工作节点{self.worker_id}心跳线程启动成功")
+
+    def stop_heartbeat(self):
+        """停止心跳线程"""
+        self._stop_event.set()
+
+    def close(self):
+        """停止心跳并发送完尚未发出的上报"""
+        self.stop_heartbeat()
+        self._reporter.shutdown(wait=True)
+
+    def _heartbeat_loop(self):
+        while not self._stop_event.wait(self.lease_seconds / 3):
+            with self._lock:
+                task_ids = list(self._running_tasks.keys())
+            if not task_ids:
+                continue
+            result = self._post('/workers/heartbeat', {"task_ids": task_ids})
+            if result and result.get("lost"):
+                with self._lock:
+                    lost = [task_id for task_id in result["lost"] if task_id not in self._lost_tasks]
+                    self._lost_tasks.update(lost)
+                for task_id in lost:
+                    self.logger.warning(f"任务租约已被收回,中断下载: {task_id}")
+                    if self.lease_lost_callback:
+                        self.lease_lost_callback(task_id)
+
+    def get_max_concurrent_downloads(self) -> int:
+        """获取当前最大并发下载数"""
+        return self._max_concurrent_downloads
+
+    def set_max_concurrent_downloads(self, max_downloads: int):
+        """设置最大并发下载数"""
+        self._max_concurrent_downloads = max_downloads
+
+    def get_next_task(self) -> Optional[DownloadTask]:
+        """向协调服务器领取下一个任务(阻塞,DownloadService在线程池中调用)"""
+        with self._lock:
+            if len(self._running_tasks) >= self._max_concurrent_downloads:
+                return None
+        if monotonic() < self._claim_backoff_until:
+            return None
+        result = self._post('/workers/claim', {})
+        if not result or not result.get("task"):
+            return None
+        data = result["task"]
+        task = DownloadTask(
+            input=data['input'],
+            video_config=VideoConfig(**data['video_config']),
+            download_config=DownloadConfig(**data['download_config']),
+            task_id=data['task_id'],
+            priority=data.get('priority', 0),
+            status=TaskStatus.DOWNLOADING,
+            progress=data.get('progress', 0.0),
+            worker_id=self.worker_id,
+            pages=data.get('pages'),
+            page_index=data.get('page_index', 0),
+            parent_id=data.get('parent_id')
+        )
+        with self._lock:
+            self._running_tasks[task.task_id] = task
+        self.logger.info(f"领取任务成功: {task.task_id}")
+        return task
+
+    def is_lost(self, task_id: str) -> bool:
+        """任务租约是否已被协调服务器收回"""
+        return task_id in self._lost_tasks
+
+    def update_task(self, task_id: str, **kwargs) -> bool:
+        """上报任务进度与状态,仅进度变化时按间隔节流"""
+        if self.is_lost(task_id):
+            return False
+        now = monotonic()
+        if 'status' not in kwargs and now - self._last_report.get(task_id, 0) < self.progress_interval:
+            return True
+        self._last_report[task_id] = now
+        self._report(f'/workers/tasks/{task_id}/progress', kwargs)
+        return True
+
+    def record_transfer(self, task_id: str, kind: str, stats: Dict) -> bool:
+        """随进度接口上报一条流的传输统计"""
+        if self.is_lost(task_id):
+            return False
+        self._report(f'/workers/tasks/{task_id}/progress', {"transfer": {"kind": kind, "stats": stats}})
+        return True
+
+    def peek_pending(self, limit: int) -> List[DownloadTask]:
+        """工作节点看不到协调服务器的队列,不参与预解析"""
+        return []
+
+    def get_task(self, task_id: str) -> Optional[DownloadTask]:
+        """获取本节点正在执行的任务"""
+        return self._running_tasks.get(task_id)
+
+    def set_task_estimate(self, task_id: str, stream_bytes: int, temp_files: List[str], output_path: str) -> bool:
+        return task_id in self._running_tasks
+
+    def set_stream_files(self, task_id: str, stream_files: Dict[str, Dict]) -> bool:
+        """流文件在工作节点上,协调服务器无法提供边下边播"""
+        return task_id in self._running_tasks
+
+    def add_child_tasks(self, parent_id: str, page_indices: List[int]) -> List[str]:
+        """由协调服务器展开多P任务,子任务重新进入共享队列(阻塞,DownloadService在线程池中调用)"""
+        with self._lock:
+            self._running_tasks.pop(parent_id, None)
+            self._last_report.pop(parent_id, None)
+        result = self._post(f'/workers/tasks/{parent_id}/pages', {"page_indices": page_indices})
+        if not result:
+            raise RuntimeError(f"展开多P任务失败: {parent_id}")
+        return result["child_ids"]
+
+    def reserve_disk_space(self, task_id: str, stream_bytes: int, temp_files: List[str], output_path: str) -> bool:
+        """在本节点的文件系统上为任务预留磁盘空间"""
+        with self._lock:
+            task = self._running_tasks.get(task_id)
+        if not task:
+            return False
+        return self.disk.reserve(task_id, task.download_config.cache_dir,
+                                 task.download_config.download_dir,
+                                 stream_bytes, temp_files, output_path)
+
+    def hold_task(self, task_id: str, backoff_seconds: float = 10.0):
+        """本节点放不下该任务,归还给协调服务器重新排队"""
+        with self._lock:
+            self._running_tasks.pop(task_id, None)
+            self._last_report.pop(task_id, None)
+        self._claim_backoff_until = monotonic() + backoff_seconds
+        self._report(f'/workers/tasks/{task_id}/release', {})
+
+    def complete_task(self, task_id: str, success: bool, error_message: str = None):
+        """提交任务结果并释放本地槽位"""
+        self.disk.release(task_id)
+        with self._lock:
+            self._running_tasks.pop(task_id, None)
+            self._last_report.pop(task_id, None)
+            lost = task_id in self._lost_tasks
+            self._lost_tasks.discard(task_id)
+        if lost:
+            self.logger.warning(f"任务租约已失效,放弃提交结果: {task_id}")
+            return
+        self._report(f'/workers/tasks/{task_id}/complete', {
+            "success": success,
+            "error_message": error_message
+        })
+
+    def list_tasks(self) -> List[DownloadTask]:
+        """获取本节点正在执行的任务"""
+        with self._lock:
+            return list(self._running_tasks.values())
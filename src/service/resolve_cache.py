@@ -0,0 +1,146 @@
+import asyncio
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+from src.common.logger import get_logger
+
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_INFO_TTL = 6 * 3600     # 视频信息变化很少,缓存6小时
+DEFAULT_PLAYURL_TTL = 1800      # 链接中没有deadline时的默认有效期
+DEFAULT_EXPIRY_MARGIN = 120     # 距签名链接过期不足该秒数时视为失效
+
+def playurl_deadline(download_url_data: Dict) -> Optional[float]:
+    """从get_download_url返回的数据中解析签名链接的过期时间(upos链接的deadline参数)"""
+    urls = []
+    dash = download_url_data.get('dash')
+    if dash:
+        for stream in (dash.get('video') or []) + (dash.get('audio') or []):
+            urls.append(stream.get('baseUrl') or stream.get('base_url'))
+    for durl in download_url_data.get('durl') or []:
+        urls.append(durl.get('url'))
+    deadlines = []
+    for url in filter(None, urls):
+        value = parse_qs(urlparse(url).query).get('deadline')
+        if value and value[0].isdigit():
+            deadlines.append(float(value[0]))
+    return min(deadlines) if deadlines else None
+
+class ResolveCache:
+    """
+    视频信息与播放链接的解析缓存
+    两类条目共用同一个按容量淘汰的LRU,每个条目有独立的过期时间;
+    并发请求同一条目时只会发出一次API调用
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 info_ttl: float = DEFAULT_INFO_TTL,
+                 playurl_ttl: float = DEFAULT_PLAYURL_TTL,
+                 expiry_margin: float = DEFAULT_EXPIRY_MARGIN):
+        self.logger = get_logger(__name__)
+        self.max_entries = max_entries
+        self.info_ttl = info_ttl
+        self.playurl_ttl = playurl_ttl
+        self.expiry_margin = expiry_margin
+        self._lock = Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, key: Hashable, field: str) -> None:
+        kind = key[0] if isinstance(key, tuple) else 'default'
+        stats = self._stats.setdefault(kind, {"hits": 0, "misses": 0, "evictions": 0})
+        stats[field] += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取未过期的条目,并将其移到LRU队尾"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time():
+                self._entries.move_to_end(key)
+                self._count(key, "hits")
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self._count(key, "misses")
+            return None
+
+    def put(self, key: Hashable, value: Any, ttl: float) -> None:
+        """写入条目,超出容量时淘汰最久未使用的条目"""
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time() + ttl, value)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            self._count(key, "evictions")
+
+    def set_capacity(self, max_entries: int) -> None:
+        """调整缓存容量"""
+        with self._lock:
+            self.max_entries = max_entries
+            self._evict()
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """条目剩余有效秒数,不存在时返回None(不计入命中统计)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] - time() if entry else None
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除满足条件的条目,返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def playurl_ttl_for(self, download_url_data: Dict) -> float:
+        """根据签名链接的deadline计算播放链接条目的有效期"""
+        deadline = playurl_deadline(download_url_data)
+        if deadline is None:
+            return self.playurl_ttl
+        return min(self.playurl_ttl, deadline - time() - self.expiry_margin)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          ttl: Callable[[Any], float]) -> Any:
+        """
+        读取缓存,未命中时调用loader加载并写入
+        Args:
+            key: 缓存键
+            loader: 加载数据的协程函数
+            ttl: 根据加载结果计算有效期的函数
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        inflight = self._inflight.get(key)
+        if inflight:
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            self.put(key, value, ttl(value))
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 避免无人等待时告警
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict:
+        """命中率等统计信息"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "by_kind": {kind: dict(stats) for kind, stats in self._stats.items()}
+            }
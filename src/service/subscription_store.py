@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+from threading import Lock
+from typing import List, Optional
+from src.common.models import Subscription, VideoConfig, DownloadConfig
+from src.common.logger import get_logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    sub_id TEXT PRIMARY KEY,
+    source_type TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    mid TEXT,
+    video_config TEXT NOT NULL,
+    download_config TEXT NOT NULL,
+    interval INTEGER NOT NULL,
+    backfill INTEGER NOT NULL,
+    watermark_ts INTEGER NOT NULL DEFAULT 0,
+    watermark_bvid TEXT,
+    watermark_listing TEXT,
+    queued INTEGER NOT NULL DEFAULT 0,
+    last_sync_at TEXT,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    UNIQUE (source_type, source_id)
+)
+"""
+# 建表之后新增的列: 列名 -> 类型,打开旧的索引文件时补上
+_ADDED_COLUMNS = {'watermark_listing': 'TEXT'}
+
+def _to_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+class SubscriptionStore:
+    """
+    订阅与水位线的本地索引(SQLite)
+    服务器重启后订阅和各来源的同步进度不会丢失
+    """
+
+    def __init__(self, db_path: str):
+        self.logger = get_logger(__name__)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute(_SCHEMA)
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(subscriptions)")}
+            for name, kind in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE subscriptions ADD COLUMN {name} {kind}")
+        self.logger.info(f"订阅索引: {db_path}")
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> Subscription:
+        return Subscription(
+            source_type=row['source_type'],
+            source_id=row['source_id'],
+            mid=row['mid'],
+            video_config=VideoConfig(**json.loads(row['video_config'])),
+            download_config=DownloadConfig(**json.loads(row['download_config'])),
+            interval=row['interval'],
+            backfill=bool(row['backfill']),
+            sub_id=row['sub_id'],
+            watermark_ts=row['watermark_ts'],
+            watermark_bvid=row['watermark_bvid'],
+            watermark_listing=row['watermark_listing'],
+            queued=row['queued'],
+            last_sync_at=_to_datetime(row['last_sync_at']),
+            last_error=row['last_error'],
+            created_at=_to_datetime(row['created_at'])
+        )
+
+    def add(self, sub: Subscription) -> str:
+        """添加订阅,同一来源重复订阅时抛出ValueError"""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO subscriptions (sub_id, source_type, source_id, mid, video_config, download_config,"
+                    " interval, backfill, watermark_ts, watermark_bvid, queued, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (sub.sub_id, sub.source_type, sub.source_id, sub.mid,
+                     json.dumps(vars(sub.video_config)), json.dumps(vars(sub.download_config)),
+                     sub.interval, int(sub.backfill), sub.watermark_ts, sub.watermark_bvid, sub.queued,
+                     sub.created_at.isoformat())
+                )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"已订阅该来源: {sub.source_type}:{sub.source_id}")
+        return sub.sub_id
+
+    def remove(self, sub_id: str) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM subscriptions WHERE sub_id = ?", (sub_id,)).rowcount > 0
+
+    def get(self, sub_id: str) -> Optional[Subscription]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM subscriptions WHERE sub_id = ?", (sub_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def list(self) -> List[Subscription]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM subscriptions ORDER BY created_at").fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def record_sync(self, sub: Subscription) -> None:
+        """保存一次同步的结果: 水位线、累计入队数与错误信息"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE subscriptions SET watermark_ts = ?, watermark_bvid = ?, watermark_listing = ?, queued = ?,"
+                " last_sync_at = ?, last_error = ? WHERE sub_id = ?",
+                (sub.watermark_ts, sub.watermark_bvid, sub.watermark_listing, sub.queued,
+                 sub.last_sync_at.isoformat() if sub.last_sync_at else None, sub.last_error, sub.sub_id)
+            )
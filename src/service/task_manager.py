@@ -1,19 +1,94 @@
+import bisect
+import heapq
+import json
 import logging
-from typing import Dict, List, Optional
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from queue import PriorityQueue
 from threading import Lock
-from src.common.models import DownloadTask, TaskStatus  # 已经修改为相对导入
+from src.common.models import DownloadTask, TaskStatus, task_to_dict, task_from_dict  # 已经修改为相对导入
 from src.common.logger import get_logger
-from datetime import datetime
+from src.service.disk_admission import DiskReservations
+from src.service.event_bus import EventBus
+from datetime import datetime, timedelta
+
+DEFAULT_LEASE_SECONDS = 30  # 工作节点租约默认时长(秒)
+TERMINAL_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+
+class TaskHeldError(Exception):
+    """任务因资源不足被退回队列等待,不应视为失败"""
 
 class TaskManager:
     def __init__(self):
         self.logger = get_logger(__name__)
         self._tasks: Dict[str, DownloadTask] = {}
+        self._order: List[Tuple[float, str]] = []  # 按(创建时间, 任务ID)排序的索引,用于分页定位
         self._queue = PriorityQueue()
         self._lock = Lock()
         self._running_tasks: Dict[str, DownloadTask] = {}
+        self._leased_tasks: Dict[str, DownloadTask] = {}  # 被远程工作节点领取的任务
         self._max_concurrent_downloads = 3  # 默认最大并发下载数
+        self.disk = DiskReservations()
+        self.epoch = f"{time.time_ns():x}"  # 区分服务器实例,重启后旧的变更版本号与事件ID失效
+        self.events = EventBus(epoch=self.epoch)  # 任务状态/进度事件,供SSE推送
+        self._version = 0  # 全局变更版本号,任一任务变化都会递增
+        # 变更日志: 任务ID -> 最近一次变更的版本号,按版本号递增排列;
+        # 每个任务只保留一条,频繁的进度更新不会挤掉其它任务的变更
+        self._changelog: "OrderedDict[str, int]" = OrderedDict()
+
+    @staticmethod
+    def _order_key(task: DownloadTask) -> Tuple[float, str]:
+        return task.created_at.timestamp(), task.task_id
+
+    def _index(self, task: DownloadTask) -> None:
+        """加入排序索引(调用方需持有锁),新任务通常按创建时间递增,直接追加到末尾"""
+        key = self._order_key(task)
+        if not self._order or key > self._order[-1]:
+            self._order.append(key)
+        else:
+            bisect.insort(self._order, key)
+
+    @staticmethod
+    def _record_stage(task: DownloadTask) -> None:
+        """状态变化时结束上一阶段并开始新阶段,结束状态只结束上一阶段(调用方需持有锁)"""
+        if task.stages and task.stages[-1]['stage'] == task.status.name:
+            return
+        now = datetime.now()
+        if task.stages and task.stages[-1]['ended_at'] is None:
+            stage = task.stages[-1]
+            stage['ended_at'] = now.isoformat()
+            stage['duration'] = round((now - datetime.fromisoformat(stage['started_at'])).total_seconds(), 3)
+        if task.status not in TERMINAL_STATUSES:
+            task.stages.append({"stage": task.status.name, "started_at": now.isoformat(),
+                                "ended_at": None, "duration": None})
+
+    @property
+    def version(self) -> int:
+        """当前全局变更版本号"""
+        return self._version
+
+    def _touch(self, task: DownloadTask, event: Optional[str] = None) -> None:
+        """任务发生变化后递增版本号、记录变更日志并发布事件(调用方需持有锁)"""
+        self._version += 1
+        task.version = self._version
+        self._changelog[task.task_id] = self._version
+        self._changelog.move_to_end(task.task_id)
+        if event is None:
+            return
+        if event != 'progress':
+            self._record_stage(task)
+        self.events.publish(event, task.task_id, {
+            "task_id": task.task_id,
+            "input": task.input,
+            "status": task.status.value,
+            "progress": task.progress,
+            "estimated_bytes": task.estimated_bytes,
+            "parent_id": task.parent_id,
+            "error_message": task.error_message,
+            "version": task.version
+        })
 
     def set_max_concurrent_downloads(self, max_downloads: int):
         """设置最大并发下载数"""
@@ -29,10 +104,119 @@ class TaskManager:
         """添加新的下载任务"""
         with self._lock:
             self._tasks[task.task_id] = task
+            self._index(task)
             self._queue.put((-task.priority, task.created_at.timestamp(), task.task_id))
+            self._touch(task, 'created')
             self.logger.info(f"添加新任务: {task.task_id}")
             return task.task_id
 
+    def add_tasks(self, tasks: List[DownloadTask]) -> List[str]:
+        """批量添加下载任务,只获取一次锁"""
+        with self._lock:
+            for task in tasks:
+                self._tasks[task.task_id] = task
+                self._index(task)
+                self._queue.put((-task.priority, task.created_at.timestamp(), task.task_id))
+                self._touch(task, 'created')
+            if tasks:
+                self.logger.info(f"批量添加{len(tasks)}个任务")
+            return [task.task_id for task in tasks]
+
+    def checkpoint(self, path: str) -> int:
+        """
+        将未结束的任务写入检查点文件,返回写入的任务数
+        未结束多P父任务的已结束子任务一并写入,恢复后父任务仍能汇总进度
+        """
+        with self._lock:
+            tasks = [task for task in self._tasks.values()
+                     if task.status not in TERMINAL_STATUSES
+                     or (task.parent_id and self._tasks[task.parent_id].status not in TERMINAL_STATUSES)]
+            data = [task_to_dict(task) for task in tasks]
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        self.logger.info(f"已保存{len(data)}个任务到检查点: {path}")
+        return len(data)
+
+    def restore(self, path: str) -> int:
+        """
+        从检查点恢复任务,返回恢复的任务数
+        中断时正在执行的任务重新排队,会从缓存目录中的临时文件续传;检查点读取后删除
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with self._lock:
+            for item in data:
+                task = task_from_dict(item)
+                task.worker_id = None
+                task.lease_expires_at = None
+                self._tasks[task.task_id] = task
+                self._index(task)
+                self._touch(task)  # 检查点中的版本号属于上一个服务器实例,重新编号
+                if task.status in TERMINAL_STATUSES or task.status == TaskStatus.PAUSED:
+                    continue
+                if task.child_ids:
+                    # 多P父任务由子任务汇总结果,不进入队列
+                    task.status = TaskStatus.DOWNLOADING
+                    continue
+                task.status = TaskStatus.PENDING
+                self._record_stage(task)  # 结束中断前的阶段,重新开始排队
+                self._queue.put((-task.priority, task.created_at.timestamp(), task.task_id))
+        os.remove(path)
+        self.logger.info(f"从检查点恢复{len(data)}个任务")
+        return len(data)
+
+    def changes_since(self, since: Optional[int]) -> Tuple[List[DownloadTask], int, bool]:
+        """
+        获取版本号since之后变化过的任务
+        Returns:
+            (任务列表(按最近变更顺序), 当前版本号, 是否为全量快照)
+            since为空或不属于本服务器实例时返回全部任务
+        """
+        with self._lock:
+            if since is None or since > self._version:
+                return list(self._tasks.values()), self._version, True
+            changed = []
+            for task_id, version in reversed(self._changelog.items()):
+                if version <= since:
+                    break
+                changed.append(task_id)
+            tasks = [self._tasks[task_id] for task_id in reversed(changed) if task_id in self._tasks]
+            return tasks, self._version, False
+
+    def record_transfer(self, task_id: str, kind: str, stats: Dict[str, object]) -> bool:
+        """
+        记录任务一条流(video/audio)的传输统计
+        Args:
+            stats: TransferStats.to_dict()的结果
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if not task:
+                return False
+            task.transfers[kind] = dict(stats)
+            task.cdn_host = stats.get('host') or task.cdn_host
+            task.retries = sum(int(t.get('retries', 0)) for t in task.transfers.values())
+            self._touch(task)
+            return True
+
+    def queue_stats(self) -> Dict[str, object]:
+        """各状态任务数与下载槽位占用,供指标导出"""
+        with self._lock:
+            by_status = {status: 0 for status in TaskStatus}
+            for task in self._tasks.values():
+                by_status[task.status] += 1
+            return {
+                "by_status": by_status,
+                "running": len(self._running_tasks),
+                "leased": len(self._leased_tasks),
+                "max_concurrent": self._max_concurrent_downloads
+            }
+
     def get_task(self, task_id: str) -> Optional[DownloadTask]:
         """获取指定任务的信息"""
         return self._tasks.get(task_id)
@@ -41,13 +225,44 @@ class TaskManager:
         """获取所有任务的列表"""
         return list(self._tasks.values())
 
+    def iter_tasks(self, after: Optional[str] = None) -> Iterator[DownloadTask]:
+        """
+        按创建顺序遍历任务
+        Args:
+            after: 从该任务之后开始(分页游标),按(创建时间, 任务ID)二分定位
+        Raises:
+            KeyError: after指定的任务不存在
+        """
+        order = self._order
+        start = bisect.bisect_right(order, self._order_key(self._tasks[after])) if after else 0
+        # 新任务追加在索引末尾,遍历过程中添加的任务同样会被遍历到
+        for i in range(start, len(order)):
+            task = self._tasks.get(order[i][1])
+            if task:
+                yield task
+
     def cancel_task(self, task_id: str) -> bool:
-        """取消指定的任务"""
+        """取消指定的任务,多P父任务会一并取消尚未开始的子任务"""
         with self._lock:
             task = self._tasks.get(task_id)
-            if task and task.status in [TaskStatus.PENDING, TaskStatus.PAUSED]:
+            if task and task.child_ids and task.status == TaskStatus.DOWNLOADING:
+                for child_id in task.child_ids:
+                    child = self._tasks[child_id]
+                    if child.status in [TaskStatus.PENDING, TaskStatus.PAUSED]:
+                        child.completed_at = datetime.now()
+                        child.status = TaskStatus.CANCELLED
+                        self._touch(child, 'status')
+                task.completed_at = datetime.now()
                 task.status = TaskStatus.CANCELLED
+                self._touch(task, 'status')
+                self.logger.info(f"多P任务已取消: {task_id}")
+                return True
+            if task and task.status in [TaskStatus.PENDING, TaskStatus.PAUSED]:
                 task.completed_at = datetime.now()
+                task.status = TaskStatus.CANCELLED
+                self._touch(task, 'status')
+                if task.parent_id:
+                    self._refresh_parent(task.parent_id)
                 self.logger.info(f"任务已取消: {task_id}")
                 return True
             return False
@@ -58,6 +273,7 @@ class TaskManager:
             task = self._tasks.get(task_id)
             if task and task.status == TaskStatus.PENDING:
                 task.status = TaskStatus.PAUSED
+                self._touch(task, 'status')
                 self.logger.info(f"任务已暂停: {task_id}")
                 return True
             return False
@@ -69,43 +285,321 @@ class TaskManager:
             if task and task.status == TaskStatus.PAUSED:
                 task.status = TaskStatus.PENDING
                 self._queue.put((-task.priority, task.created_at.timestamp(), task.task_id))
+                self._touch(task, 'status')
                 self.logger.info(f"任务已恢复: {task_id}")
                 return True
             return False
 
     def get_next_task(self) -> Optional[DownloadTask]:
         """获取下一个要执行的任务"""
+        # 本地调度每轮都会调用,没有工作节点领取任务时过期的租约同样会重新排队
+        self.requeue_expired_leases()
         try:
             with self._lock:
                 if len(self._running_tasks) >= self._max_concurrent_downloads:
                     self.logger.info("已达到最大并发下载数，无法获取下一个任务。")
                     return None
                     
-                while not self._queue.empty():
-                    _, _, task_id = self._queue.get()
-                    task = self._tasks.get(task_id)
-                    
-                    if task and task.status == TaskStatus.PENDING:
-                        task.status = TaskStatus.DOWNLOADING
-                        task.started_at = datetime.now()
-                        self._running_tasks[task_id] = task
-                        return task
-                return None
+                task = self._pop_pending_task(admit=self._admit)
+                if task:
+                    self._running_tasks[task.task_id] = task
+                return task
         except Exception as e:
             logging.error(f"获取下一个任务时出错: {str(e)}")
             return None
 
+    def _pop_pending_task(self, admit: Callable[[DownloadTask], bool] = None) -> Optional[DownloadTask]:
+        """
+        从队列中取出下一个等待中的任务并标记为下载中(调用方需持有锁)
+        Args:
+            admit: 准入检查,未通过的任务留在队列中等待
+        """
+        held = []
+        try:
+            while not self._queue.empty():
+                entry = self._queue.get()
+                task = self._tasks.get(entry[2])
+
+                if task and task.status == TaskStatus.PENDING:
+                    if admit and not admit(task):
+                        held.append(entry)
+                        continue
+                    task.status = TaskStatus.DOWNLOADING
+                    task.started_at = datetime.now()
+                    self._touch(task, 'status')
+                    return task
+            return None
+        finally:
+            for entry in held:
+                self._queue.put(entry)
+
+    def _admit(self, task: DownloadTask) -> bool:
+        return self._admit_page_budget(task) and self._admit_disk_space(task)
+
+    def _admit_page_budget(self, task: DownloadTask) -> bool:
+        """分P子任务在父任务的并发预算(DownloadConfig.threads)内执行"""
+        if not task.parent_id:
+            return True
+        parent = self._tasks.get(task.parent_id)
+        if not parent:
+            return True
+        active = sum(1 for t in list(self._running_tasks.values()) + list(self._leased_tasks.values())
+                     if t.parent_id == task.parent_id)
+        return active < max(1, int(parent.download_config.threads))
+
+    def add_child_tasks(self, parent_id: str, page_indices: List[int]) -> List[str]:
+        """
+        将多P视频的父任务展开为分P子任务
+        父任务释放下载槽位(或租约),其进度与状态由子任务汇总
+        Returns:
+            List[str]: 子任务ID
+        """
+        with self._lock:
+            parent = self._tasks.get(parent_id)
+            if not parent:
+                return []
+            self._running_tasks.pop(parent_id, None)
+            self._leased_tasks.pop(parent_id, None)
+            self.disk.release(parent_id)
+            parent.worker_id = None
+            parent.lease_expires_at = None
+            parent.status = TaskStatus.DOWNLOADING
+            self._touch(parent, 'status')
+            for page_index in page_indices:
+                child = DownloadTask(
+                    input=parent.input,
+                    video_config=parent.video_config,
+                    download_config=parent.download_config,
+                    priority=parent.priority,
+                    page_index=page_index,
+                    parent_id=parent_id
+                )
+                self._tasks[child.task_id] = child
+                self._index(child)
+                parent.child_ids.append(child.task_id)
+                self._queue.put((-child.priority, child.created_at.timestamp(), child.task_id))
+                self._touch(child, 'created')
+            self.logger.info(f"任务{parent_id}展开为{len(page_indices)}个分P子任务")
+            return list(parent.child_ids)
+
+    def expand_leased_task(self, task_id: str, worker_id: str, page_indices: List[int]) -> Optional[List[str]]:
+        """工作节点展开其持有的多P任务,租约不属于该节点时返回None"""
+        task = self._leased_tasks.get(task_id)
+        if not task or task.worker_id != worker_id:
+            return None
+        return self.add_child_tasks(task_id, page_indices)
+
+    def get_children(self, task_id: str) -> List[DownloadTask]:
+        """获取父任务的分P子任务"""
+        task = self._tasks.get(task_id)
+        if not task:
+            return []
+        return [self._tasks[child_id] for child_id in task.child_ids if child_id in self._tasks]
+
+    def _refresh_parent(self, parent_id: str) -> None:
+        """根据子任务汇总父任务的进度,全部子任务结束后结束父任务(调用方需持有锁)"""
+        parent = self._tasks.get(parent_id)
+        if not parent or not parent.child_ids:
+            return
+        children = [self._tasks[child_id] for child_id in parent.child_ids]
+        parent.progress = round(sum(child.progress for child in children) / len(children), 2)
+        parent.last_updated = datetime.now()
+        if parent.status in TERMINAL_STATUSES or any(child.status not in TERMINAL_STATUSES for child in children):
+            self._touch(parent, 'progress')
+            return
+        failed = [child for child in children if child.status == TaskStatus.FAILED]
+        parent.completed_at = datetime.now()
+        if failed:
+            parent.error_message = f"{len(failed)}/{len(children)}个分P下载失败"
+        # 结束状态最后写入,读取方看到结束状态时其余字段已是最终值
+        parent.status = TaskStatus.FAILED if failed else TaskStatus.COMPLETED
+        self._touch(parent, 'status')
+        self.logger.info(f"多P任务{'失败' if failed else '完成'}: {parent_id}")
+
+    def _admit_disk_space(self, task: DownloadTask) -> bool:
+        """已知大小的任务需要预留到磁盘空间才能开始,未解析的任务在解析后再预留"""
+        if task.estimated_bytes <= 0:
+            return True
+        return self.disk.reserve(
+            task.task_id,
+            task.download_config.cache_dir,
+            task.download_config.download_dir,
+            task.estimated_bytes,
+            task.temp_files,
+            task.output_path
+        )
+
+    def set_task_estimate(self, task_id: str, stream_bytes: int, temp_files: List[str], output_path: str) -> bool:
+        """记录任务解析出的流大小与文件路径,供磁盘空间准入使用"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if not task:
+                return False
+            task.estimated_bytes = stream_bytes
+            task.temp_files = list(temp_files)
+            task.output_path = output_path
+            self._touch(task)
+            return True
+
+    def set_stream_files(self, task_id: str, stream_files: Dict[str, Dict[str, object]]) -> bool:
+        """
+        记录任务正在下载的流文件,供边下边播接口读取
+        Args:
+            stream_files: {video/audio: {"path": 临时文件路径, "size": 流的总字节数}}
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if not task:
+                return False
+            task.stream_files = {kind: dict(info) for kind, info in stream_files.items()}
+            self._touch(task)
+            return True
+
+    def reserve_disk_space(self, task_id: str, stream_bytes: int, temp_files: List[str], output_path: str) -> bool:
+        """
+        根据解析出的流大小为任务预留磁盘空间
+        Returns:
+            bool: 是否预留成功,失败时调用方应通过hold_task将任务退回队列
+        """
+        if not self.set_task_estimate(task_id, stream_bytes, temp_files, output_path):
+            return False
+        return self._admit_disk_space(self._tasks[task_id])
+
+    def peek_pending(self, limit: int) -> List[DownloadTask]:
+        """按优先级查看队列中即将执行的等待任务(不出队)"""
+        with self._lock:
+            entries = heapq.nsmallest(
+                limit,
+                (entry for entry in self._queue.queue
+                 if (task := self._tasks.get(entry[2])) and task.status == TaskStatus.PENDING)
+            )
+        seen = set()
+        tasks = []
+        for _, _, task_id in entries:
+            if task_id not in seen:
+                seen.add(task_id)
+                tasks.append(self._tasks[task_id])
+        return tasks
+
+    def hold_task(self, task_id: str):
+        """将已开始的任务退回队列等待(例如磁盘空间不足)"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if not task:
+                return
+            self._running_tasks.pop(task_id, None)
+            task.status = TaskStatus.PENDING
+            task.started_at = None
+            self._queue.put((-task.priority, task.created_at.timestamp(), task.task_id))
+            self._touch(task, 'status')
+            self.logger.info(f"任务退回队列等待: {task_id}")
+
+    def release_lease(self, task_id: str, worker_id: str) -> bool:
+        """工作节点主动归还任务,任务重新排队"""
+        with self._lock:
+            task = self._leased_tasks.get(task_id)
+            if not task or task.worker_id != worker_id:
+                return False
+            del self._leased_tasks[task_id]
+            task.worker_id = None
+            task.lease_expires_at = None
+        self.hold_task(task_id)
+        return True
+
+    def claim_task(self, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[DownloadTask]:
+        """
+        工作节点领取任务并获得租约
+        Args:
+            worker_id: 工作节点ID
+            lease_seconds: 租约时长,工作节点需在到期前续约
+        Returns:
+            DownloadTask: 领取到的任务,队列为空时返回None
+        """
+        self.requeue_expired_leases()
+        with self._lock:
+            task = self._pop_pending_task(admit=self._admit_page_budget)
+            if not task:
+                return None
+            task.worker_id = worker_id
+            task.lease_expires_at = datetime.now() + timedelta(seconds=lease_seconds)
+            self._leased_tasks[task.task_id] = task
+            self.logger.info(f"工作节点{worker_id}领取任务: {task.task_id}")
+            return task
+
+    def renew_lease(self, task_id: str, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """续约单个任务,任务已不属于该工作节点时返回False"""
+        with self._lock:
+            task = self._leased_tasks.get(task_id)
+            if not task or task.worker_id != worker_id:
+                return False
+            task.lease_expires_at = datetime.now() + timedelta(seconds=lease_seconds)
+            return True
+
+    def heartbeat(self, worker_id: str, task_ids: List[str], lease_seconds: float = DEFAULT_LEASE_SECONDS) -> List[str]:
+        """
+        工作节点心跳,为其持有的全部任务续约
+        Returns:
+            List[str]: 已失去租约的任务ID(工作节点应放弃这些任务)
+        """
+        self.requeue_expired_leases()
+        lost = [task_id for task_id in task_ids
+                if not self.renew_lease(task_id, worker_id, lease_seconds)]
+        if lost:
+            self.logger.warning(f"工作节点{worker_id}已失去任务租约: {lost}")
+        return lost
+
+    def requeue_expired_leases(self) -> List[str]:
+        """将租约过期的任务重新放回队列,由其他工作节点接手"""
+        if not self._leased_tasks:
+            return []
+        now = datetime.now()
+        requeued = []
+        with self._lock:
+            for task_id, task in list(self._leased_tasks.items()):
+                if task.lease_expires_at and task.lease_expires_at < now:
+                    self.logger.warning(f"工作节点{task.worker_id}的任务租约已过期,重新排队: {task_id}")
+                    del self._leased_tasks[task_id]
+                    task.status = TaskStatus.PENDING
+                    task.worker_id = None
+                    task.lease_expires_at = None
+                    self._queue.put((-task.priority, task.created_at.timestamp(), task.task_id))
+                    self._touch(task, 'status')
+                    requeued.append(task_id)
+        return requeued
+
+    def report_progress(self, task_id: str, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS, **kwargs) -> bool:
+        """工作节点上报进度,同时续约"""
+        if not self.renew_lease(task_id, worker_id, lease_seconds):
+            return False
+        return self.update_task(task_id, **kwargs)
+
+    def complete_leased_task(self, task_id: str, worker_id: str, success: bool, error_message: str = None) -> bool:
+        """工作节点提交任务结果,租约不属于该节点时拒绝"""
+        with self._lock:
+            task = self._leased_tasks.get(task_id)
+            if not task or task.worker_id != worker_id:
+                self.logger.warning(f"拒绝工作节点{worker_id}提交的任务结果: {task_id}")
+                return False
+            del self._leased_tasks[task_id]
+            task.lease_expires_at = None
+        self.complete_task(task_id, success, error_message)
+        return True
+
     def complete_task(self, task_id: str, success: bool, error_message: str = None):
         """标记任务为完成状态"""
         with self._lock:
             task = self._tasks.get(task_id)
             if task:
-                task.status = TaskStatus.COMPLETED if success else TaskStatus.FAILED
                 task.completed_at = datetime.now()
                 task.error_message = error_message
                 task.progress = 100.0 if success else task.progress  # 保留失败任务的进度
+                task.status = TaskStatus.COMPLETED if success else TaskStatus.FAILED
+                self._touch(task, 'status')
                 if task_id in self._running_tasks:
                     del self._running_tasks[task_id]
+                self.disk.release(task_id)
+                if task.parent_id:
+                    self._refresh_parent(task.parent_id)
                 logging.info(f"任务{'完成' if success else '失败'}: {task_id}")
 
     def validate_task_update(self,task: DownloadTask, **kwargs):
@@ -152,15 +646,18 @@ class TaskManager:
                 self.logger.warning(f"任务{task_id}更新失败!,参数:{kwargs}")
                 return False
 
-            for key, value in kwargs.items():
-                # 目前只完成了进度与状态的更新
-                if key == 'progress':
-                    task.progress = round(value, 2)
-                elif key == 'status':
-                    task.status = TaskStatus[value]
+            # 目前只完成了进度与状态的更新,状态最后写入
+            if 'progress' in kwargs:
+                task.progress = round(kwargs['progress'], 2)
             task.last_updated = datetime.now()
+            if 'status' in kwargs:
+                task.status = TaskStatus[kwargs['status']]
+            self._touch(task, 'status' if 'status' in kwargs else 'progress')
+            if task.parent_id:
+                self._refresh_parent(task.parent_id)
 
             if task_id in self._running_tasks:
                 self._running_tasks[task_id] = task
             
-            self.logger.debug(f"任务{task_id}更新成功!,参数:{kwargs}")
\ No newline at end of file
+            self.logger.debug(f"任务{task_id}更新成功!,参数:{kwargs}")
+            return True
@@ -0,0 +1,78 @@
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+import click
+
+# 客户端命令不应在导入时加载的模块(只有下载/登录等用到它们的代码路径才导入)
+HEAVY_MODULES = ('bilibili_api', 'ffmpeg', 'aiohttp', 'questionary', 'tqdm')
+DEFAULT_TARGETS = ('client.cli',)
+DEFAULT_RUNS = 5
+DEFAULT_BUDGET_MS = 400
+
+def _import_env() -> Dict[str, str]:
+    """与安装后的入口一致: 项目根目录(src.*)与src目录(client.*)都在导入路径上"""
+    src_dir = Path(__file__).resolve().parent.parent
+    paths = [str(src_dir.parent), str(src_dir), os.environ.get('PYTHONPATH', '')]
+    return {**os.environ, 'PYTHONPATH': os.pathsep.join(p for p in paths if p)}
+
+def measure_import(module: str) -> Tuple[float, Dict[str, int]]:
+    """
+    在新的解释器中导入模块
+    Returns:
+        (导入耗时(毫秒), {模块名: 累计耗时(微秒)})
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, env=_import_env())
+    if result.returncode != 0:
+        raise RuntimeError(f"导入{module}失败: {result.stderr.strip().splitlines()[-1]}")
+    modules: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name == ' site':
+            # 之前的都是解释器启动时(site及.pth文件)导入的模块,与被测模块无关
+            modules.clear()
+            continue
+        modules[name.strip()] = int(cumulative)
+    return modules.get(module, 0) / 1000, modules
+
+def _heaviest(modules: Dict[str, int], limit: int = 10) -> List[Tuple[str, int]]:
+    """累计耗时最多的顶层包"""
+    packages: Dict[str, int] = {}
+    for name, cumulative in modules.items():
+        top = name.split('.')[0]
+        packages[top] = max(packages.get(top, 0), cumulative)
+    return sorted(packages.items(), key=lambda item: -item[1])[:limit]
+
+@click.command()
+@click.argument('targets', nargs=-1)
+@click.option('--runs', default=DEFAULT_RUNS, type=int, help="每个模块导入的次数,取中位数")
+@click.option('--budget-ms', default=DEFAULT_BUDGET_MS, type=float, help="导入耗时上限(毫秒),超出时返回非0")
+def main(targets, runs, budget_ms):
+    """测量客户端模块的导入耗时,导入了重量级模块或超出耗时上限时返回非0,用于发现启动变慢"""
+    failed = False
+    for module in targets or DEFAULT_TARGETS:
+        timings, modules = [], {}
+        for _ in range(max(1, runs)):
+            elapsed, modules = measure_import(module)
+            timings.append(elapsed)
+        median = statistics.median(timings)
+        click.echo(f"{module}: 中位数{median:.1f}ms (最快{min(timings):.1f}ms, {len(timings)}次)")
+        for name, cumulative in _heaviest(modules):
+            click.echo(f"  {name:<24}{cumulative / 1000:8.1f}ms")
+        heavy = [name for name in HEAVY_MODULES if name in modules]
+        if heavy:
+            click.echo(f"  错误: 导入时加载了{', '.join(heavy)}", err=True)
+            failed = True
+        if median > budget_ms:
+            click.echo(f"  错误: 超出耗时上限{budget_ms:.0f}ms", err=True)
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()